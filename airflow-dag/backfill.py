@@ -0,0 +1,251 @@
+"""Rebuild a table from zero in resumable primary-key chunks.
+
+A backfill is planned once: the key range (0, MAX(primary key)] is split into chunks of
+chunk_keys keys, and the watermark the incremental DAG should continue from is captured
+before any chunk runs. Each chunk replaces its key range in Snowflake (DELETE + load) and
+marks itself done in INGESTION_BACKFILL_CHUNKS in the same transaction, so a chunk commits
+exactly once and a re-run only loads the chunks that are not marked. The watermark is
+advanced when every chunk is done, never behind the one an incremental load already committed.
+The incremental DAG must not load the table while a backfill is open (see check_no_backfill).
+"""
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from ingestion_config import TableConfig
+from ingestion_metrics import LoadMetrics
+from postgres_extract import build_extract_query, split_key_range, stream_chunks
+from postgres_to_snowflake import (
+    get_last_change, make_writer, read_committed, reference_bounds, reference_snapshot_key, resolve_schema,
+    transaction, watermark_table,
+)
+from schema_registry import TableSchema
+from watermarks import WatermarkStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_KEYS = 100_000
+# Chunks loaded at the same time; also the most backfill queries running on Postgres at once
+DEFAULT_CONCURRENCY = 4
+
+
+class BackfillCheckpointTable:
+    """Chunks of each backfill that are committed in Snowflake."""
+
+    def __init__(self, table_name: str = 'INGESTION_BACKFILL_CHUNKS'):
+        self.table_name = table_name
+
+    def create_if_missing(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} ("
+            f"TABLE_NAME VARCHAR, BACKFILL_ID VARCHAR, LOWER_KEY NUMBER, UPPER_KEY NUMBER, ROW_COUNT NUMBER, "
+            f"LOADED_AT TIMESTAMP_NTZ)"
+        )
+
+    def done(self, cursor, table_name: str, backfill_id: str) -> Set[int]:
+        """Lower keys of the chunks already committed."""
+        cursor.execute(
+            f"SELECT LOWER_KEY FROM {self.table_name} WHERE TABLE_NAME = %s AND BACKFILL_ID = %s",
+            (table_name, backfill_id),
+        )
+        return {int(row[0]) for row in cursor.fetchall()}
+
+    def mark_done(self, cursor, table_name: str, backfill_id: str, key_range: Dict[str, int], row_count: int):
+        """Record a chunk as loaded. Call inside the chunk's transaction."""
+        cursor.execute(
+            f"INSERT INTO {self.table_name} (TABLE_NAME, BACKFILL_ID, LOWER_KEY, UPPER_KEY, ROW_COUNT, LOADED_AT) "
+            f"VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+            (table_name, backfill_id, key_range['lower'], key_range['upper'], row_count),
+        )
+
+
+checkpoint_table = BackfillCheckpointTable()
+
+
+class SourceThrottle:
+    """Keep a backfill from overloading the source Postgres.
+
+    Before a chunk starts, wait until at most max_active_queries queries are active in
+    pg_stat_activity. While a chunk streams, hold extraction to max_rows_per_second.
+    """
+
+    def __init__(self, max_active_queries: Optional[int] = None, max_rows_per_second: Optional[float] = None,
+                 poll_seconds: float = 5.0, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.max_active_queries = max_active_queries
+        self.max_rows_per_second = max_rows_per_second
+        self.poll_seconds = poll_seconds
+        self.clock = clock
+        self.sleep = sleep
+
+    def active_queries(self, pg_conn) -> int:
+        with pg_conn.cursor() as pg_cursor:
+            pg_cursor.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE state = 'active'")
+            return pg_cursor.fetchone()[0]
+
+    def wait_for_capacity(self, pg_conn):
+        if self.max_active_queries is None:
+            return
+        while True:
+            active = self.active_queries(pg_conn)
+            if active <= self.max_active_queries:
+                return
+            logger.info(f"{active} active queries on the source (limit {self.max_active_queries}), waiting")
+            self.sleep(self.poll_seconds)
+
+    def pace(self, chunks: Iterable[List[Sequence[Any]]]) -> Iterator[List[Sequence[Any]]]:
+        if self.max_rows_per_second is None:
+            yield from chunks
+            return
+        started = self.clock()
+        rows = 0
+        for chunk in chunks:
+            yield chunk
+            rows += len(chunk)
+            ahead = rows / self.max_rows_per_second - (self.clock() - started)
+            if ahead > 0:
+                self.sleep(ahead)
+
+
+def plan_key(table: TableConfig) -> str:
+    return f'backfill_{table.name}'
+
+
+def check_no_backfill(store: WatermarkStore, table: TableConfig):
+    """Fail while a backfill of table is planned and not finished.
+
+    Its chunks delete and reload key ranges the incremental load may be writing to, and the
+    watermark it hands over at the end would not account for that load.
+    """
+    plan = store.get(plan_key(table))
+    if plan is not None and not plan['finished']:
+        raise RuntimeError(
+            f"Backfill {plan['backfill_id']} of {table.name} is not finished; let it finish (or re-run it) "
+            f"before loading the table incrementally"
+        )
+
+
+def latest(*watermarks: Any) -> Any:
+    """The furthest of the watermarks given (keys, or (change timestamp, id) pairs), ignoring None."""
+    return max((watermark for watermark in watermarks if watermark is not None), default=None)
+
+
+def chunk_ranges(plan: Dict[str, Any]) -> List[Dict[str, int]]:
+    return split_key_range(0, plan['upper'], -(-plan['upper'] // plan['chunk_keys']) or 1)
+
+
+def plan_backfill(pg_conn, sf_conn, table: TableConfig, store: WatermarkStore,
+                  chunk_keys: int = DEFAULT_CHUNK_KEYS, restart: bool = False) -> List[Dict[str, Any]]:
+    """Return the chunks still to load, planning a new backfill unless one can be resumed.
+
+    The plan is kept in store. It holds the key range, the chunk size and the watermarks
+    captured before loading. Rows inserted or changed after that point are left to the
+    incremental DAG.
+    """
+    plan = store.get(plan_key(table))
+    if plan is None or restart:
+        with pg_conn.cursor() as pg_cursor:
+            pg_cursor.execute(f"SELECT MAX({table.primary_key}) FROM {table.name}")
+            upper = pg_cursor.fetchone()[0] or 0
+        _, reference_snapshot = reference_bounds(pg_conn, table, store)
+        plan = {
+            'backfill_id': uuid.uuid4().hex[:12],
+            'upper': upper,
+            'chunk_keys': chunk_keys,
+            'watermark': get_last_change(pg_conn, table) if table.cdc_mode == 'updated_at' else upper,
+            'reference_snapshot': reference_snapshot,
+            'finished': False,
+        }
+        store.set(plan_key(table), plan)
+        logger.info(f"Planned backfill {plan['backfill_id']} of {table.name} keys (0, {upper}]")
+    elif plan['finished']:
+        logger.info(f"Backfill {plan['backfill_id']} of {table.name} already finished; pass restart to run another")
+        return []
+
+    key_ranges = chunk_ranges(plan)
+    with sf_conn.cursor() as sf_cursor:
+        checkpoint_table.create_if_missing(sf_cursor)
+        done = checkpoint_table.done(sf_cursor, table.name, plan['backfill_id'])
+    pending = [
+        {'backfill_id': plan['backfill_id'], **key_range}
+        for key_range in key_ranges if key_range['lower'] not in done
+    ]
+    logger.info(f"Backfill {plan['backfill_id']} of {table.name}: {len(pending)} of {len(key_ranges)} chunks to load")
+    return pending
+
+
+def load_chunk(pg_conn, sf_conn, table: TableConfig, chunk: Dict[str, Any], schema: Optional[TableSchema] = None,
+               throttle: Optional[SourceThrottle] = None, metrics: Optional[LoadMetrics] = None) -> int:
+    """Replace the chunk's key range in Snowflake with the source rows, once.
+
+    A retry after the chunk committed finds it marked done and loads nothing.
+    """
+    throttle = throttle or SourceThrottle()
+    metrics = metrics if metrics is not None else LoadMetrics(table.name, task='backfill_chunk')
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    writer = make_writer(table, schema, metrics)
+    backfill_id, lower, upper = chunk['backfill_id'], chunk['lower'], chunk['upper']
+
+    throttle.wait_for_capacity(pg_conn)
+    with sf_conn.cursor() as sf_cursor:
+        checkpoint_table.create_if_missing(sf_cursor)
+        with transaction(sf_cursor, metrics):
+            if lower in checkpoint_table.done(sf_cursor, table.name, backfill_id):
+                logger.info(f"Chunk ({lower}, {upper}] of {table.name} was already loaded")
+                return 0
+
+            with metrics.phase('load'):
+                sf_cursor.execute(
+                    f"DELETE FROM {table.name} WHERE {table.primary_key} > %s AND {table.primary_key} <= %s",
+                    (lower, upper),
+                )
+            query = build_extract_query(table, columns, lower, upper)
+            chunks = throttle.pace(metrics.extracted(
+                stream_chunks(pg_conn, query, table.chunk_size, cursor_name=f'backfill_{table.name}_{lower}_{upper}')
+            ))
+            row_count = writer.write(sf_cursor, table.name, columns, chunks)
+            checkpoint_table.mark_done(sf_cursor, table.name, backfill_id, chunk, row_count)
+
+    logger.info(f"Backfilled {row_count} rows of {table.name} in ({lower}, {upper}]")
+    return row_count
+
+
+def finish_backfill(sf_conn, table: TableConfig, store: WatermarkStore) -> Any:
+    """Advance the watermark to the one captured at planning, once every chunk is loaded.
+
+    A watermark committed past it (an incremental load that ran after planning) is kept, and so
+    is a later reference snapshot, so the incremental DAG never goes back over rows it loaded.
+    """
+    plan = store.get(plan_key(table))
+    if plan is None:
+        raise ValueError(f"No backfill planned for {table.name}")
+    if plan['finished']:
+        return plan['watermark']
+
+    chunk_count = len(chunk_ranges(plan))
+    with sf_conn.cursor() as sf_cursor:
+        done = checkpoint_table.done(sf_cursor, table.name, plan['backfill_id'])
+        if len(done) < chunk_count:
+            raise RuntimeError(
+                f"Backfill {plan['backfill_id']} of {table.name} has {chunk_count - len(done)} chunks left; "
+                f"re-run it to resume"
+            )
+        watermark_table.create_if_missing(sf_cursor)
+        with transaction(sf_cursor):
+            watermark = latest(plan['watermark'], read_committed(sf_cursor, table))
+            watermark_table.advance(sf_cursor, table.name, watermark)
+            snapshot = plan['reference_snapshot']
+            if snapshot is not None:
+                committed_snapshot = watermark_table.read(sf_cursor, reference_snapshot_key(table))
+                if isinstance(committed_snapshot, type(snapshot)):
+                    snapshot = latest(snapshot, committed_snapshot)
+                watermark_table.advance(sf_cursor, reference_snapshot_key(table), snapshot)
+
+    store.set(table.name, watermark)
+    if snapshot is not None:
+        store.set(reference_snapshot_key(table), snapshot)
+    store.set(plan_key(table), {**plan, 'finished': True})
+    logger.info(f"Backfill {plan['backfill_id']} of {table.name} finished, watermark {watermark}")
+    return watermark
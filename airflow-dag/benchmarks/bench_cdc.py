@@ -0,0 +1,124 @@
+"""Change capture on data_atualizacao: apply a large batch of updates with a staged MERGE.
+
+Usage (from airflow-dag/):
+    python -m benchmarks.bench_cdc --scale 1 --update-fraction 0.3
+
+Loads clientes (only the customers with a sale, as in TABLES) and vendas once in 'updated_at'
+mode, updates a fraction of the sales and inserts new ones, runs the load again and checks that
+the target matches the source row for row (exiting non-zero otherwise). One of the updated sales
+moves to an existing customer that had no sale yet, so the second load must add that customer
+although the watermark of clientes is past them. With --partitions N, both tables go through
+plan_partitions, stage_partition and commit_partitions as in the DAG, instead of a single load.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+from benchmarks.local_hooks import LocalPostgresConnection, LocalSnowflakeConnection
+from ingestion_config import ReferenceFilter, TableConfig
+from watermarks import InMemoryWatermarkStore
+import postgres_to_snowflake
+
+
+def timed_load(pg_conn, sf_conn, table: TableConfig, watermarks: InMemoryWatermarkStore, run_key: str):
+    started = time.perf_counter()
+    watermark = watermarks.get(table.name)
+    if table.partitions > 1:
+        staged = [
+            postgres_to_snowflake.stage_partition(pg_conn, sf_conn, table, key_range, run_key)
+            for key_range in postgres_to_snowflake.plan_partitions(pg_conn, table, watermark, watermarks)
+        ]
+        rows = postgres_to_snowflake.commit_partitions(pg_conn, sf_conn, table, run_key, staged, watermarks)
+    else:
+        rows = postgres_to_snowflake.load_incremental_data(pg_conn, sf_conn, table, watermark, watermarks)
+    return rows, time.perf_counter() - started
+
+
+def apply_source_changes(pg_conn, update_fraction: float, new_rows: int, seed: int = 7) -> int:
+    rng = random.Random(seed)
+    total = pg_conn.sqlite.execute('SELECT MAX(id_vendas) FROM vendas').fetchone()[0]
+    updated_ids = rng.sample(range(1, total + 1), int(total * update_fraction))
+    # The first sale of an existing customer: a sale of a customer with other sales moves to one without any
+    moved_sale, new_buyer = pg_conn.sqlite.execute(
+        'SELECT MIN(v.id_vendas), (SELECT MIN(c.id_clientes) FROM clientes c WHERE NOT EXISTS '
+        '(SELECT 1 FROM vendas r WHERE r.id_clientes = c.id_clientes)) '
+        'FROM vendas v WHERE v.id_clientes IN (SELECT id_clientes FROM vendas GROUP BY id_clientes HAVING COUNT(*) > 1)'
+    ).fetchone()
+    pg_conn.sqlite.execute('BEGIN')
+    pg_conn.sqlite.executemany(
+        "UPDATE vendas SET valor_pago = ROUND(valor_pago * 0.97, 2), data_atualizacao = ? WHERE id_vendas = ?",
+        ((f'2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}', id_venda) for i, id_venda in enumerate(updated_ids)),
+    )
+    pg_conn.sqlite.execute(
+        "UPDATE vendas SET id_clientes = ?, data_atualizacao = '2025-01-01 01:00:00' WHERE id_vendas = ?",
+        (new_buyer, moved_sale),
+    )
+    pg_conn.sqlite.executemany(
+        'INSERT INTO vendas VALUES (?, 1, 1, 1, 1, 50000.00, ?, ?, NULL)',
+        ((total + i, '2025-01-02 10:00:00', '2025-01-02 10:00:00') for i in range(1, new_rows + 1)),
+    )
+    pg_conn.sqlite.execute('COMMIT')
+    return len(updated_ids)
+
+
+def table_checksum(sqlite_conn) -> list:
+    """Checksums of vendas and of the customers referenced by a sale, which the target must hold exactly."""
+    return sqlite_conn.execute(
+        'SELECT COUNT(*), SUM(id_vendas), ROUND(SUM(valor_pago), 2), MAX(data_atualizacao) FROM vendas'
+    ).fetchall() + sqlite_conn.execute(
+        'SELECT COUNT(*), SUM(id_clientes) FROM clientes c '
+        'WHERE EXISTS (SELECT 1 FROM vendas v WHERE v.id_clientes = c.id_clientes)'
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--update-fraction', type=float, default=0.3)
+    parser.add_argument('--new-rows', type=int, default=1_000)
+    parser.add_argument('--load-mode', default='copy')
+    parser.add_argument('--partitions', type=int, default=1, help='key ranges staged separately (needs copy)')
+    args = parser.parse_args()
+
+    tables = [
+        TableConfig(
+            'clientes', load_mode=args.load_mode, cdc_mode='updated_at', partitions=args.partitions,
+            referenced_by=ReferenceFilter('vendas', 'id_clientes'),
+        ),
+        TableConfig('vendas', load_mode=args.load_mode, cdc_mode='updated_at', partitions=args.partitions),
+    ]
+    watermarks = InMemoryWatermarkStore()
+    with tempfile.TemporaryDirectory() as work_dir:
+        with LocalPostgresConnection(os.path.join(work_dir, 'source.db')) as pg_conn, \
+                LocalSnowflakeConnection(os.path.join(work_dir, 'target.db'), os.path.join(work_dir, 'stages')) as sf_conn:
+            datagen.populate(pg_conn.sqlite, args.scale, tables=[table.name for table in tables])
+            pg_conn.refresh_catalog()
+            datagen.create_schema(sf_conn.sqlite, [table.name for table in tables])
+
+            for table in tables:
+                rows, seconds = timed_load(pg_conn, sf_conn, table, watermarks, 'initial')
+                print(f"{table.name:<9} initial load: {rows} rows in {seconds:.2f}s ({rows / seconds:.0f} rows/s)")
+
+            updated = apply_source_changes(pg_conn, args.update_fraction, args.new_rows)
+            print(f"{updated} sales updated, {args.new_rows} new")
+            for table in tables:
+                rows, seconds = timed_load(pg_conn, sf_conn, table, watermarks, 'changes')
+                print(f"{table.name:<9} change load:  {rows} rows in {seconds:.2f}s "
+                      f"({rows / seconds:.0f} rows/s), watermark {watermarks.get(table.name)}")
+
+            for table in tables:
+                rows, seconds = timed_load(pg_conn, sf_conn, table, watermarks, 'no_op')
+                print(f"{table.name:<9} no-op load:   {rows} rows in {seconds:.3f}s")
+
+            source, target = table_checksum(pg_conn.sqlite), table_checksum(sf_conn.sqlite)
+            print(f"source {source}\ntarget {target}\n{'MATCH' if source == target else 'MISMATCH'}")
+            if source != target:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""End-to-end load of every NovaDrive table through the postgres_to_snowflake task functions.
+
+Usage (from airflow-dag/):
+    python -m benchmarks.bench_load --scales 0.5 1 --save baseline.json
+    # after a change to the load path
+    python -m benchmarks.bench_load --scales 0.5 1 --compare baseline.json
+
+For each scale factor the source is generated once, then loaded twice: an initial load into an
+empty target, and an incremental load after benchmarks.datagen.grow() has added and updated a
+fraction of the rows. Each table runs in its own worker process, as it would in its own Airflow
+task, in the DAG's dependency order. The schema check and watermarks go through the same
+functions as the DAG, with their state kept in a JSON file instead of Airflow Variables.
+
+Reported per table: rows loaded, seconds, rows/s, the peak RSS of the worker process, the
+round trips made to the Postgres and Snowflake stand-ins, and the seconds spent in each load
+phase (see ingestion_metrics). After the incremental load, every table in 'updated_at' mode must
+hold the source's latest version of each row it loaded, and every row referencing a table loaded
+with referenced_by (e.g. each sale's customer) must be in the target, or the run fails. With --compare, the
+run exits with status 1 when a table loads a different row count, makes more round trips, gets
+slower than --tolerance (only for loads that take at least --min-seconds) or uses more memory
+than --tolerance allows.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks import datagen
+from benchmarks.local_hooks import LocalPostgresConnection, LocalSnowflakeConnection
+from ingestion_config import TABLES, get_table_config
+from ingestion_metrics import PHASES, LoadMetrics
+from schema_registry import SchemaRegistry
+from scheduling import topological_order
+from watermarks import WatermarkStore
+import postgres_to_snowflake
+
+RUNS = ('initial', 'incremental')
+
+
+class JsonFileStore(WatermarkStore):
+    """Key-value store shared by the worker processes, standing in for Airflow Variables."""
+
+    def __init__(self, path: str, prefix: str = ''):
+        self.path = path
+        self.prefix = prefix
+
+    def _read(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def get(self, table_name: str) -> Optional[Any]:
+        return self._read().get(f'{self.prefix}{table_name}')
+
+    def set(self, table_name: str, value: Any):
+        values = self._read()
+        values[f'{self.prefix}{table_name}'] = value
+        with open(self.path, 'w') as f:
+            json.dump(values, f)
+
+
+class Workspace:
+    def __init__(self, work_dir: str):
+        self.source = os.path.join(work_dir, 'source.db')
+        self.target = os.path.join(work_dir, 'target.db')
+        self.stage_dir = os.path.join(work_dir, 'stages')
+        state = os.path.join(work_dir, 'state.json')
+        self.watermarks = JsonFileStore(state, prefix='watermark_')
+        self.schemas = SchemaRegistry(JsonFileStore(state, prefix='schema_'))
+
+    def connect_snowflake(self) -> LocalSnowflakeConnection:
+        return LocalSnowflakeConnection(self.target, self.stage_dir)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def load_table(workspace: Workspace, table_name: str, run_key: str) -> Dict[str, Any]:
+    """Run one table's tasks the way the DAG chains them and measure the run."""
+    table = get_table_config(table_name)
+    watermark = postgres_to_snowflake.get_watermark(workspace.watermarks, table, workspace.connect_snowflake)
+    schema = workspace.schemas.get(table_name)
+    metrics = LoadMetrics(table_name)
+    started = time.perf_counter()
+    with LocalPostgresConnection(workspace.source) as pg_conn, workspace.connect_snowflake() as sf_conn:
+        if table.partitions > 1:
+            key_ranges = postgres_to_snowflake.plan_partitions(pg_conn, table, watermark, workspace.watermarks)
+            staged = [
+                postgres_to_snowflake.stage_partition(pg_conn, sf_conn, table, key_range, run_key, schema, metrics)
+                for key_range in key_ranges
+            ]
+            rows = postgres_to_snowflake.commit_partitions(
+                pg_conn, sf_conn, table, run_key, staged, workspace.watermarks, schema, metrics
+            )
+        else:
+            rows = postgres_to_snowflake.load_incremental_data(
+                pg_conn, sf_conn, table, watermark, workspace.watermarks, schema=schema, metrics=metrics
+            )
+        seconds = time.perf_counter() - started
+        return {
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_s': rows / seconds if seconds else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+            'pg_round_trips': pg_conn.round_trips,
+            'sf_round_trips': sf_conn.round_trips,
+            'bytes': metrics.bytes,
+            'phases': metrics.to_dict()['seconds'],
+        }
+
+
+def run_worker(work_dir: str, table_name: str, run_key: str) -> Dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_load', '--worker', table_name,
+         '--work-dir', work_dir, '--run-key', run_key],
+        capture_output=True, text=True,
+    )
+    if completed.returncode:
+        raise RuntimeError(f"Worker for {table_name} failed:\n{completed.stderr}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def stale_rows(workspace: Workspace, table_name: str) -> int:
+    """Rows of the target whose change timestamp differs from the source's, i.e. updates that never arrived."""
+    table = get_table_config(table_name)
+    with LocalPostgresConnection(workspace.source) as pg_conn:
+        pg_conn.sqlite.execute('ATTACH DATABASE ? AS target', (workspace.target,))
+        return pg_conn.sqlite.execute(
+            f"SELECT COUNT(*) FROM {table.name} s JOIN target.{table.name} t USING ({table.primary_key}) "
+            f"WHERE COALESCE(s.{table.updated_at_column}, s.{table.created_at_column}) "
+            f"IS NOT COALESCE(t.{table.updated_at_column}, t.{table.created_at_column})"
+        ).fetchone()[0]
+
+
+def missing_references(workspace: Workspace, table_name: str) -> int:
+    """Rows of the referencing table in the target whose referenced row (e.g. a sale's customer) is missing."""
+    table = get_table_config(table_name)
+    reference = table.referenced_by
+    with workspace.connect_snowflake() as sf_conn:
+        return sf_conn.sqlite.execute(
+            f"SELECT COUNT(*) FROM {reference.table} r WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {table.name} t WHERE t.{table.primary_key} = r.{reference.column})"
+        ).fetchone()[0]
+
+
+def run_scale(scale: float, fraction: float) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        workspace = Workspace(work_dir)
+        with LocalPostgresConnection(workspace.source) as pg_conn:
+            datagen.populate(pg_conn.sqlite, scale)
+            pg_conn.refresh_catalog()
+        with workspace.connect_snowflake() as sf_conn:
+            datagen.create_schema(sf_conn.sqlite)
+
+        for phase in RUNS:
+            if phase == 'incremental':
+                with LocalPostgresConnection(workspace.source) as pg_conn:
+                    datagen.grow(pg_conn.sqlite, scale, fraction)
+            with LocalPostgresConnection(workspace.source) as pg_conn:
+                postgres_to_snowflake.sync_schemas(pg_conn, workspace.connect_snowflake, workspace.schemas, TABLES)
+            for table in topological_order(TABLES):
+                result = run_worker(work_dir, table.name, run_key=phase)
+                results.append({'scale': scale, 'phase': phase, 'table': table.name, **result})
+                print_result(results[-1])
+
+        stale = {table.name: stale_rows(workspace, table.name) for table in TABLES if table.cdc_mode == 'updated_at'}
+        if any(stale.values()):
+            raise RuntimeError(f"Updates missing from the target at scale {scale}: {stale}")
+        missing = {table.name: missing_references(workspace, table.name) for table in TABLES if table.referenced_by}
+        if any(missing.values()):
+            raise RuntimeError(f"Referenced rows missing from the target at scale {scale}: {missing}")
+    return results
+
+
+def print_header():
+    print(f"{'scale':>6} {'phase':<12} {'table':<16} {'rows':>9} {'seconds':>8} {'rows/s':>9} "
+          f"{'RSS MB':>7} {'pg trips':>9} {'sf trips':>9}  " + ' '.join(f'{phase:>9}' for phase in PHASES))
+
+
+def print_result(result: Dict[str, Any]):
+    print(f"{result['scale']:>6} {result['phase']:<12} {result['table']:<16} {result['rows']:>9} "
+          f"{result['seconds']:>8.2f} {result['rows_per_s']:>9.0f} {result['peak_rss_mb']:>7.1f} "
+          f"{result['pg_round_trips']:>9} {result['sf_round_trips']:>9}  "
+          + ' '.join(f"{result['phases'][phase]:>9.3f}" for phase in PHASES))
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float, min_seconds: float) -> List[str]:
+    """Describe every result that regressed against the baseline run of the same scale, phase and table."""
+    previous = {(r['scale'], r['phase'], r['table']): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['scale'], result['phase'], result['table']))
+        if before is None:
+            continue
+        label = f"{result['table']} ({result['phase']}, scale {result['scale']})"
+        if result['rows'] != before['rows']:
+            regressions.append(f"{label}: loaded {result['rows']} rows, baseline {before['rows']}")
+        for key in ('pg_round_trips', 'sf_round_trips'):
+            if result[key] > before[key]:
+                regressions.append(f"{label}: {key} {before[key]} -> {result[key]}")
+        if max(result['seconds'], before['seconds']) >= min_seconds \
+                and result['rows_per_s'] < before['rows_per_s'] * (1 - tolerance):
+            regressions.append(f"{label}: rows/s {before['rows_per_s']:.0f} -> {result['rows_per_s']:.0f}")
+        if result['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{label}: peak RSS {before['peak_rss_mb']:.1f} -> {result['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 1.0])
+    parser.add_argument('--fraction', type=float, default=0.05,
+                        help='share of rows added and updated before the incremental load')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file written by --save')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--min-seconds', type=float, default=0.2)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--run-key', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(load_table(Workspace(args.work_dir), args.worker, args.run_key)))
+        return
+
+    print_header()
+    results = [result for scale in args.scales for result in run_scale(scale, args.fraction)]
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
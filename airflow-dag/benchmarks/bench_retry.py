@@ -0,0 +1,105 @@
+"""Partitioned loads retried after their watermark Variable fell behind Snowflake.
+
+Usage (from airflow-dag/):
+    python -m benchmarks.bench_retry --scale 0.2 --partitions 4 --lag 0.2
+    python -m benchmarks.bench_retry --cdc-mode updated_at
+
+Loads vendas through plan_partitions / stage_partition / commit_partitions, then moves the
+watermark Variable back by a fraction of the loaded keys while INGESTION_WATERMARKS keeps the
+committed position, as when a worker dies between COMMIT and Variable.set and the run is retried.
+In 'updated_at' mode the Variable goes back to the (change timestamp, key) of an earlier row.
+New rows are added, some existing ones updated, and the table is loaded again from the stale
+Variable. The retry is planned and staged twice under the same run id, as when its tasks are
+cleared and re-planned: the files of the abandoned plan stay on the stage and must not be loaded. Exits non-zero unless
+the target matches the source row for row, without duplicates.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from dataclasses import replace
+
+from benchmarks import datagen
+from benchmarks.local_hooks import LocalPostgresConnection, LocalSnowflakeConnection
+from ingestion_config import TableConfig
+from watermarks import InMemoryWatermarkStore
+import postgres_to_snowflake
+
+
+def stage_plan(pg_conn, sf_conn, table: TableConfig, watermarks: InMemoryWatermarkStore, run_key: str) -> list:
+    key_ranges = postgres_to_snowflake.plan_partitions(pg_conn, table, watermarks.get(table.name), watermarks)
+    return [
+        postgres_to_snowflake.stage_partition(pg_conn, sf_conn, table, key_range, run_key)
+        for key_range in key_ranges
+    ]
+
+
+def partitioned_load(pg_conn, sf_conn, table: TableConfig, watermarks: InMemoryWatermarkStore, run_key: str) -> int:
+    staged = stage_plan(pg_conn, sf_conn, table, watermarks, run_key)
+    return postgres_to_snowflake.commit_partitions(pg_conn, sf_conn, table, run_key, staged, watermarks)
+
+
+def stale_watermark(pg_conn, table: TableConfig, committed, lag: float):
+    """The watermark of the row a `lag` fraction of the loaded rows before the committed one."""
+    if table.cdc_mode == 'id':
+        return int(committed * (1 - lag))
+    change_timestamp = f'COALESCE({table.updated_at_column}, {table.created_at_column})'
+    loaded = pg_conn.sqlite.execute(f'SELECT COUNT(*) FROM {table.name}').fetchone()[0]
+    timestamp, key = pg_conn.sqlite.execute(
+        f'SELECT {change_timestamp}, {table.primary_key} FROM {table.name} '
+        f'ORDER BY {change_timestamp}, {table.primary_key} LIMIT 1 OFFSET ?',
+        (int(loaded * (1 - lag)),),
+    ).fetchone()
+    return [postgres_to_snowflake.json_timestamp(timestamp), key]
+
+
+def table_checksum(sqlite_conn, table: TableConfig) -> list:
+    # 'id' mode only captures new rows, so the updates made by datagen.grow are not compared there
+    updated = f', MAX({table.updated_at_column})' if table.cdc_mode == 'updated_at' else ''
+    return sqlite_conn.execute(
+        f'SELECT COUNT(*), COUNT(DISTINCT id_vendas), SUM(id_vendas), ROUND(SUM(valor_pago), 2){updated} FROM vendas'
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.2)
+    parser.add_argument('--partitions', type=int, default=4)
+    parser.add_argument('--lag', type=float, default=0.2, help='fraction of the loaded keys the Variable falls behind')
+    parser.add_argument('--growth', type=float, default=0.1, help='fraction of new rows added before the retry')
+    parser.add_argument('--cdc-mode', choices=('id', 'updated_at'), default='id')
+    args = parser.parse_args()
+
+    table = TableConfig('vendas', load_mode='copy', partitions=args.partitions, cdc_mode=args.cdc_mode)
+    watermarks = InMemoryWatermarkStore({table.name: 0} if args.cdc_mode == 'id' else {})
+    with tempfile.TemporaryDirectory() as work_dir:
+        with LocalPostgresConnection(os.path.join(work_dir, 'source.db')) as pg_conn, \
+                LocalSnowflakeConnection(os.path.join(work_dir, 'target.db'), os.path.join(work_dir, 'stages')) as sf_conn:
+            datagen.populate(pg_conn.sqlite, args.scale, tables=[table.name])
+            pg_conn.refresh_catalog()
+            datagen.create_schema(sf_conn.sqlite, [table.name])
+
+            rows = partitioned_load(pg_conn, sf_conn, table, watermarks, 'run_1')
+            committed = watermarks.get(table.name)
+            stale = stale_watermark(pg_conn, table, committed, args.lag)
+            watermarks.set(table.name, stale)
+            print(f"initial load: {rows} rows, committed watermark {committed}, Variable set back to {stale}")
+
+            datagen.grow(pg_conn.sqlite, args.scale, args.growth, tables=[table.name])
+            # An earlier plan of the same run split the keys differently, so its files have other names
+            abandoned = stage_plan(pg_conn, sf_conn, replace(table, partitions=table.partitions + 1), watermarks, 'run_2')
+            print(f"abandoned plan: {sum(partition['rows'] for partition in abandoned)} rows staged under run_2")
+            started = time.perf_counter()
+            rows = partitioned_load(pg_conn, sf_conn, table, watermarks, 'run_2')
+            print(f"retry load:   {rows} rows in {time.perf_counter() - started:.2f}s, "
+                  f"watermark {watermarks.get(table.name)}")
+
+            source, target = table_checksum(pg_conn.sqlite, table), table_checksum(sf_conn.sqlite, table)
+            print(f"source {source}\ntarget {target}\n{'MATCH' if source == target else 'MISMATCH'}")
+            if source != target:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
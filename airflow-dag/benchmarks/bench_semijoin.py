@@ -0,0 +1,152 @@
+"""Extraction plans for "referenced rows only" tables: INNER JOIN + DISTINCT against EXISTS.
+
+Usage (from airflow-dag/):
+    python -m benchmarks.bench_semijoin --scales 0.5 1 2 --new-fraction 0.05
+
+Two loads of clientes are measured for each scale:
+
+- initial: every customer with at least one sale (no watermark yet)
+- incremental: after new customers and new sales were added, some of them to existing customers
+  that never bought before. The DISTINCT join probes every historical sale, while "exists, new
+  sales" only probes the sales added after the previous load's snapshot. Every plan must also
+  return the existing customers below the key watermark whose first sale is new.
+
+Each plan is checked against the customers computed from the raw rows, and the run exits with
+status 1 on any mismatch. The SQLite query plans
+are printed with --explain; run EXPLAIN ANALYZE on the same SQL in Postgres for the real plans.
+SQLite has no hash semi-join, so with --no-index EXISTS becomes a nested loop over vendas;
+Postgres plans the same query as a Hash Semi Join, or uses an index on vendas (id_clientes).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks import datagen
+from benchmarks.local_hooks import LocalPostgresConnection
+from ingestion_config import ReferenceFilter, TableConfig
+from postgres_extract import build_extract_query, stream_chunks
+
+
+def plans(new_references_only: bool):
+    """(label, table) for each plan measured."""
+    def clientes(strategy: str, new_only: bool) -> TableConfig:
+        return TableConfig('clientes', referenced_by=ReferenceFilter('vendas', 'id_clientes', strategy, new_only))
+
+    yield 'distinct join', clientes('distinct_join', False)
+    yield 'exists', clientes('exists', False)
+    if new_references_only:
+        yield 'exists, new sales', clientes('exists', True)
+
+
+def expected_keys(sqlite_conn, lower: int, referenced_after) -> set:
+    """Customers above lower with a sale, plus those at or below it whose first sale is above referenced_after."""
+    first_sale = {}
+    for venda, cliente in sqlite_conn.execute(
+            'SELECT v.id_vendas, v.id_clientes FROM vendas v JOIN clientes c ON c.id_clientes = v.id_clientes'):
+        first_sale[cliente] = min(venda, first_sale.get(cliente, venda))
+    return {
+        cliente for cliente, first in first_sale.items()
+        if cliente > lower or (referenced_after is not None and first > referenced_after)
+    }
+
+
+def run_plan(pg_conn, table: TableConfig, columns, lower: int, referenced_after, referenced_upto,
+             explain: bool) -> dict:
+    query = build_extract_query(table, columns, lower, referenced_after=referenced_after,
+                                referenced_upto=referenced_upto)
+    if explain:
+        for row in pg_conn.sqlite.execute(f'EXPLAIN QUERY PLAN {query}'):
+            print(f"    {row[-1]}")
+    started = time.perf_counter()
+    keys = set()
+    for chunk in stream_chunks(pg_conn, query, 10_000, cursor_name='bench_semijoin'):
+        keys.update(row[0] for row in chunk)
+    return {'rows': len(keys), 'seconds': time.perf_counter() - started, 'keys': keys}
+
+
+def add_increment(sqlite_conn, new_fraction: float, seed: int = 11):
+    """Insert new customers and new sales, like a day of activity.
+
+    Sales go to new and existing customers; every tenth one goes to an existing customer that never
+    bought before (datagen only generates sales for ids ending in 0-6).
+    """
+    rng = random.Random(seed)
+    max_cliente = sqlite_conn.execute('SELECT MAX(id_clientes) FROM clientes').fetchone()[0]
+    max_venda = sqlite_conn.execute('SELECT MAX(id_vendas) FROM vendas').fetchone()[0]
+    never_referenced = [row[0] for row in sqlite_conn.execute(
+        'SELECT id_clientes FROM clientes c '
+        'WHERE NOT EXISTS (SELECT 1 FROM vendas v WHERE v.id_clientes = c.id_clientes)'
+    )]
+    new_clientes = max(1, int(max_cliente * new_fraction))
+    new_vendas = max(1, int(max_venda * new_fraction))
+    sqlite_conn.execute('BEGIN')
+    sqlite_conn.executemany(
+        "INSERT INTO clientes VALUES (?, 'novo cliente', 'Rua Nova', 1, '2025-01-02 10:00:00', NULL)",
+        ((max_cliente + i,) for i in range(1, new_clientes + 1)),
+    )
+    sqlite_conn.executemany(
+        "INSERT INTO vendas VALUES (?, 1, 1, 1, ?, 50000.00, '2025-01-02 10:00:00', '2025-01-02 10:00:00', NULL)",
+        (
+            (max_venda + i, rng.choice(never_referenced) if i % 10 == 0 and never_referenced
+             else rng.randint(1, max_cliente + new_clientes))
+            for i in range(1, new_vendas + 1)
+        ),
+    )
+    sqlite_conn.execute('COMMIT')
+    return max_cliente, max_venda
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 1.0, 2.0])
+    parser.add_argument('--new-fraction', type=float, default=0.05)
+    parser.add_argument('--no-index', action='store_true',
+                        help='drop the (id_clientes, id_vendas) index on vendas that EXISTS probes')
+    parser.add_argument('--explain', action='store_true')
+    args = parser.parse_args()
+
+    mismatches = 0
+    print(f"{'scale':>6} {'load':<12} {'plan':<18} {'rows':>8} {'ms':>9} {'vs join':>8}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in args.scales:
+            source_path = os.path.join(work_dir, 'source.db')
+            with LocalPostgresConnection(source_path) as pg_conn:
+                datagen.populate(pg_conn.sqlite, scale, tables=['clientes', 'vendas'])
+                if args.no_index:
+                    pg_conn.sqlite.execute('DROP INDEX vendas_id_clientes')
+                pg_conn.refresh_catalog()
+                columns = [row[1] for row in pg_conn.sqlite.execute('PRAGMA main.table_info(clientes)')]
+
+                # initial: no watermark; incremental: watermarks at the state before add_increment.
+                # The snapshot (referenced_upto) is read before each load, like reference_bounds does.
+                max_venda = pg_conn.sqlite.execute('SELECT MAX(id_vendas) FROM vendas').fetchone()[0]
+                loads = [('initial', 0, None, max_venda)]
+                lower, referenced_after = add_increment(pg_conn.sqlite, args.new_fraction)
+                max_venda = pg_conn.sqlite.execute('SELECT MAX(id_vendas) FROM vendas').fetchone()[0]
+                loads.append(('incremental', lower, referenced_after, max_venda))
+                for load, lower, referenced_after, referenced_upto in loads:
+                    expected = expected_keys(pg_conn.sqlite, lower, referenced_after)
+                    baseline = None
+                    for label, table in plans(referenced_after is not None):
+                        result = run_plan(pg_conn, table, columns, lower, referenced_after, referenced_upto,
+                                          args.explain)
+                        baseline = baseline or result
+                        status = ''
+                        if result['keys'] != expected:
+                            mismatches += 1
+                            status = (f"  MISMATCH: {len(expected - result['keys'])} missing, "
+                                      f"{len(result['keys'] - expected)} unexpected")
+                        print(
+                            f"{scale:>6} {load:<12} {label:<18} {result['rows']:>8} {result['seconds'] * 1000:>9.1f} "
+                            f"{baseline['seconds'] / result['seconds']:>7.1f}x{status}"
+                        )
+            os.remove(source_path)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Peak memory and throughput of load_incremental_data by chunk size.
+
+Usage (from airflow-dag/):
+    python -m benchmarks.bench_streaming --scales 0.1 0.5 1 --chunk-sizes 1000 10000
+
+Each scale is also loaded with a single chunk as large as the table, which is what the
+old fetchall() extraction held in memory.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks import datagen
+from benchmarks.local_hooks import LocalPostgresConnection, LocalSnowflakeConnection
+from ingestion_config import TableConfig
+import postgres_to_snowflake
+
+
+def measure(pg_conn, table: TableConfig, chunk_size: int, work_dir: str) -> dict:
+    with LocalSnowflakeConnection(os.path.join(work_dir, 'target.db'), os.path.join(work_dir, 'stages')) as sf_conn:
+        datagen.create_schema(sf_conn.sqlite, [table.name])
+        tracemalloc.start()
+        started = time.perf_counter()
+        rows = postgres_to_snowflake.load_incremental_data(pg_conn, sf_conn, table, 0, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    os.remove(os.path.join(work_dir, 'target.db'))
+    return {'rows': rows, 'seconds': elapsed, 'peak_mb': peak / 1024 ** 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.1, 0.5, 1.0])
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[1_000, 10_000])
+    parser.add_argument('--load-mode', default='copy')
+    args = parser.parse_args()
+
+    table = TableConfig('vendas', load_mode=args.load_mode)
+    print(f"{'scale':>6} {'rows':>10} {'chunk':>10} {'seconds':>9} {'rows/s':>10} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in args.scales:
+            source_path = os.path.join(work_dir, 'source.db')
+            with LocalPostgresConnection(source_path) as pg_conn:
+                counts = datagen.populate(pg_conn.sqlite, scale, tables=[table.name])
+                pg_conn.refresh_catalog()
+                for chunk_size in sorted(set(args.chunk_sizes + [counts[table.name]])):
+                    result = measure(pg_conn, table, chunk_size, work_dir)
+                    print(
+                        f"{scale:>6} {result['rows']:>10} {chunk_size:>10} {result['seconds']:>9.2f} "
+                        f"{result['rows'] / result['seconds']:>10.0f} {result['peak_mb']:>9.1f}"
+                    )
+            os.remove(source_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Synthetic NovaDrive data for the local stand-ins."""
+import random
+from datetime import datetime, timedelta
+
+SCHEMA = {
+    'veiculos': """
+        CREATE TABLE veiculos (
+            id_veiculos INTEGER PRIMARY KEY, nome VARCHAR(255), tipo VARCHAR(100), valor NUMERIC(10, 2),
+            data_atualizacao TIMESTAMP, data_inclusao TIMESTAMP
+        )""",
+    'estados': """
+        CREATE TABLE estados (
+            id_estados INTEGER PRIMARY KEY, estado VARCHAR(100), sigla CHAR(2),
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+    'cidades': """
+        CREATE TABLE cidades (
+            id_cidades INTEGER PRIMARY KEY, cidade VARCHAR(255), id_estados INTEGER,
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+    'concessionarias': """
+        CREATE TABLE concessionarias (
+            id_concessionarias INTEGER PRIMARY KEY, concessionaria VARCHAR(255), id_cidades INTEGER,
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+    'vendedores': """
+        CREATE TABLE vendedores (
+            id_vendedores INTEGER PRIMARY KEY, nome VARCHAR(255), id_concessionarias INTEGER,
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+    'clientes': """
+        CREATE TABLE clientes (
+            id_clientes INTEGER PRIMARY KEY, cliente VARCHAR(255), endereco TEXT, id_concessionarias INTEGER,
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+    'vendas': """
+        CREATE TABLE vendas (
+            id_vendas INTEGER PRIMARY KEY, id_veiculos INTEGER, id_concessionarias INTEGER, id_vendedores INTEGER,
+            id_clientes INTEGER, valor_pago NUMERIC(10, 2), data_venda TIMESTAMP,
+            data_inclusao TIMESTAMP, data_atualizacao TIMESTAMP
+        )""",
+}
+
+# Indexes the loader's source queries rely on, created by populate()
+SOURCE_INDEXES = [
+    'CREATE INDEX vendas_id_clientes ON vendas (id_clientes, id_vendas)',
+]
+
+# Row counts at scale factor 1; estados and veiculos do not grow with the scale factor
+BASE_ROWS = {
+    'veiculos': 20,
+    'estados': 27,
+    'cidades': 100,
+    'concessionarias': 30,
+    'vendedores': 200,
+    'clientes': 10_000,
+    'vendas': 100_000,
+}
+FIXED_SIZE_TABLES = {'veiculos', 'estados'}
+
+START_DATE = datetime(2022, 1, 1)
+
+
+def row_counts(scale: float) -> dict:
+    return {
+        table: rows if table in FIXED_SIZE_TABLES else max(1, int(rows * scale))
+        for table, rows in BASE_ROWS.items()
+    }
+
+
+def create_schema(sqlite_conn, tables=None):
+    for table in tables or SCHEMA:
+        sqlite_conn.execute(f'DROP TABLE IF EXISTS {table}')
+        sqlite_conn.execute(SCHEMA[table])
+
+
+def _timestamp(rng: random.Random) -> str:
+    return (START_DATE + timedelta(seconds=rng.randrange(2 * 365 * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _audit(rng: random.Random):
+    inclusao = _timestamp(rng)
+    return inclusao, inclusao if rng.random() < 0.3 else None
+
+
+def generate_rows(table: str, counts: dict, rng: random.Random, first_id: int = 1):
+    """Yield the rows of table with ids first_id..counts[table], respecting the foreign keys implied by counts."""
+    n = counts[table]
+    for i in range(first_id, n + 1):
+        inclusao, atualizacao = _audit(rng)
+        if table == 'veiculos':
+            yield (i, f'Veiculo {i}', rng.choice(['SUV Compacta', 'Sedan', 'Hatch', 'Picape']),
+                   round(rng.uniform(25_000, 150_000), 2), atualizacao, inclusao)
+        elif table == 'estados':
+            yield (i, f'Estado {i}', f'{i % 100:02d}', inclusao, atualizacao)
+        elif table == 'cidades':
+            yield (i, f'cidade {i}', rng.randint(1, counts['estados']), inclusao, atualizacao)
+        elif table == 'concessionarias':
+            yield (i, f'Concessionaria {i}', rng.randint(1, counts['cidades']), inclusao, atualizacao)
+        elif table == 'vendedores':
+            yield (i, f'vendedor {i}', rng.randint(1, counts['concessionarias']), inclusao, atualizacao)
+        elif table == 'clientes':
+            yield (i, f'cliente {i}', f' Rua {rng.randint(1, 9999)}, {i} ', rng.randint(1, counts['concessionarias']),
+                   inclusao, atualizacao)
+        elif table == 'vendas':
+            # Only customers whose id ends in 0-6 (~70%) ever buy, so the clientes semi-join filter has
+            # something to drop, new customers included
+            cliente = rng.randint(1, counts['clientes'])
+            cliente = cliente if cliente % 10 < 7 or cliente < 10 else cliente - 3
+            yield (i, rng.randint(1, counts['veiculos']), rng.randint(1, counts['concessionarias']),
+                   rng.randint(1, counts['vendedores']), cliente,
+                   round(rng.uniform(25_000, 150_000), 2), _timestamp(rng), inclusao, atualizacao)
+
+
+def populate(sqlite_conn, scale: float = 1.0, tables=None, seed: int = 42) -> dict:
+    """Create and fill the NovaDrive tables. Returns the row count of each table."""
+    counts = row_counts(scale)
+    tables = tables or list(SCHEMA)
+    rng = random.Random(seed)
+    create_schema(sqlite_conn, tables)
+    for table in tables:
+        _insert(sqlite_conn, table, generate_rows(table, counts, rng))
+    for index in SOURCE_INDEXES:
+        if index.split(' ON ')[1].split()[0] in tables:
+            sqlite_conn.execute(index)
+    return {table: counts[table] for table in tables}
+
+
+def _insert(sqlite_conn, table: str, rows):
+    column_count = len(sqlite_conn.execute(f'PRAGMA main.table_info({table})').fetchall())
+    placeholders = ', '.join(['?'] * column_count)
+    sqlite_conn.execute('BEGIN')
+    sqlite_conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', rows)
+    sqlite_conn.execute('COMMIT')
+
+
+def grow(sqlite_conn, scale: float, fraction: float, tables=None, seed: int = 43) -> dict:
+    """Simulate the activity between two loads of tables populated at scale.
+
+    Appends fraction more rows to every table that grows with the scale factor, and updates the
+    same fraction of the existing rows. Both happen at a time after every generated timestamp,
+    as they would after the previous load. Some of the new sales go to existing customers that never
+    bought before (ids ending in 7), so a referenced-rows-only load must pick up customers below its
+    watermark. Returns the number of rows inserted and updated per table.
+    """
+    counts = row_counts(scale)
+    grown = {
+        table: rows if table in FIXED_SIZE_TABLES else rows + max(1, int(rows * fraction))
+        for table, rows in counts.items()
+    }
+    rng = random.Random(seed)
+    changes = {}
+    for table in tables or list(SCHEMA):
+        _insert(sqlite_conn, table, generate_rows(table, grown, rng, first_id=counts[table] + 1))
+        sqlite_conn.execute(
+            f"UPDATE {table} SET data_inclusao = '2025-01-01 00:00:00', data_atualizacao = NULL "
+            f"WHERE id_{table} > {counts[table]}"
+        )
+        if table == 'vendas':
+            sqlite_conn.execute(
+                f"UPDATE vendas SET id_clientes = id_clientes - id_clientes % 10 + 7 "
+                f"WHERE id_vendas > {counts['vendas']} AND id_vendas % 20 = 0 "
+                f"AND id_clientes >= 10 AND id_clientes - id_clientes % 10 + 7 <= {counts['clientes']}"
+            )
+        step = max(1, round(1 / fraction))
+        updated = sqlite_conn.execute(
+            f"UPDATE {table} SET data_atualizacao = '2025-01-01 00:00:00' "
+            f"WHERE id_{table} % {step} = 0 AND id_{table} <= {counts[table]}"
+        ).rowcount
+        changes[table] = grown[table] - counts[table] + updated
+    return changes
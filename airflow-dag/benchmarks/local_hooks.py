@@ -0,0 +1,287 @@
+"""SQLite stand-ins for the Postgres and Snowflake connections used by postgres_to_snowflake.
+
+They speak just enough of each dialect for the loader to run offline, and count the round
+trips the loader makes (see LocalConnection.round_trips):
+- LocalPostgresConnection exposes information_schema.columns and pg_stat_activity, and accepts named
+  (server-side) cursors.
+- LocalSnowflakeConnection keeps a table stage per table in a local directory and implements the
+  PUT and COPY INTO statements issued by snowflake_writers.CopyWriter, plus the temporary staging
+  table and MERGE used for change capture.
+"""
+import csv
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional, Sequence
+
+from snowflake_writers import CSV_NULL
+
+PUT_PATTERN = re.compile(
+    r"^\s*PUT\s+'file://(?P<file>[^']+)'\s+@%(?P<table>\w+)(?:/(?P<path>\S*))?",
+    re.IGNORECASE,
+)
+COPY_PATTERN = re.compile(
+    r"^\s*COPY\s+INTO\s+(?P<table>\w+)\s*\((?P<columns>[^)]*)\)\s*"
+    r"FROM\s*\(SELECT\s+.*?\s+FROM\s+@%(?P<stage>\w+)(?:/(?P<path>[^\s)]*))?\)\s*"
+    r"(?:FILES\s*=\s*\((?P<files>[^)]*)\))?",
+    re.IGNORECASE | re.DOTALL,
+)
+CREATE_LIKE_PATTERN = re.compile(
+    r"^\s*CREATE\s+OR\s+REPLACE\s+TEMPORARY\s+TABLE\s+(?P<table>\w+)\s+LIKE\s+(?P<source>\w+)\s*$",
+    re.IGNORECASE,
+)
+MERGE_PATTERN = re.compile(
+    r"^\s*MERGE\s+INTO\s+(?P<table>\w+)\s+t\s+USING\s+(?P<source>\w+)\s+s\s+"
+    r"ON\s+t\.(?P<key>\w+)\s*=\s*s\.\w+\s+"
+    r"WHEN\s+MATCHED\s+THEN\s+UPDATE\s+SET\s+.*?\s+"
+    r"WHEN\s+NOT\s+MATCHED\s+THEN\s+INSERT\s*\((?P<columns>[^)]*)\)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class LocalCursor:
+    """DB-API cursor over sqlite3 that accepts the pyformat placeholders used by the real drivers."""
+
+    def __init__(self, connection: 'LocalConnection', name: Optional[str] = None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self._cursor = connection.sqlite.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, query: str, params: Optional[Sequence[Any]] = None):
+        self.connection.round_trips += 1
+        return self._execute(query, params)
+
+    def _execute(self, query: str, params: Optional[Sequence[Any]] = None):
+        self._cursor.execute(query.replace('%s', '?'), params or ())
+        return self
+
+    def executemany(self, query: str, seq_of_params):
+        self.connection.round_trips += 1
+        self._cursor.executemany(query.replace('%s', '?'), seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size: Optional[int] = None):
+        # A named cursor keeps its result on the server, so every fetch is another round trip
+        if self.name:
+            self.connection.round_trips += 1
+        return self._cursor.fetchmany(size or self.itersize)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class LocalConnection:
+    """sqlite3 connection behind the DB-API surface of the real drivers.
+
+    round_trips counts the statements sent through its cursors plus every fetch from a named
+    cursor; results of unnamed cursors are assumed to arrive with the statement.
+    """
+    cursor_class = LocalCursor
+
+    def __init__(self, database: str = ':memory:'):
+        self.round_trips = 0
+        # Autocommit at the sqlite level; callers open transactions with explicit BEGIN/COMMIT.
+        self.sqlite = sqlite3.connect(database, isolation_level=None)
+        self.sqlite.execute('PRAGMA journal_mode = WAL')
+        self.sqlite.execute('PRAGMA synchronous = OFF')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cursor(self, name: Optional[str] = None) -> LocalCursor:
+        return self.cursor_class(self, name=name)
+
+    def commit(self):
+        if self.sqlite.in_transaction:
+            self.sqlite.execute('COMMIT')
+
+    def rollback(self):
+        if self.sqlite.in_transaction:
+            self.sqlite.execute('ROLLBACK')
+
+    def close(self):
+        self.sqlite.close()
+
+
+def postgres_type(declared_type: str):
+    """Map a SQLite declared type to Postgres' (data_type, numeric_precision, numeric_scale)."""
+    match = re.match(r'\s*(\w+)\s*(?:\((\d+)\s*(?:,\s*(\d+))?\))?', declared_type or 'text')
+    base, precision, scale = match.group(1).lower(), match.group(2), match.group(3)
+    if base in ('integer', 'int', 'bigint', 'smallint'):
+        return base if base != 'int' else 'integer', 32 if base in ('integer', 'int') else 64, 0
+    if base in ('numeric', 'decimal'):
+        return 'numeric', int(precision) if precision else None, int(scale or 0) if precision else None
+    names = {
+        'varchar': 'character varying',
+        'char': 'character',
+        'timestamp': 'timestamp without time zone',
+        'real': 'real',
+        'double': 'double precision',
+        'boolean': 'boolean',
+        'date': 'date',
+    }
+    return names.get(base, 'text'), None, None
+
+
+class LocalPostgresConnection(LocalConnection):
+    """Source stand-in. Call refresh_catalog() after creating or altering tables."""
+
+    def __init__(self, database: str = ':memory:'):
+        super().__init__(database)
+        self.sqlite.execute("ATTACH DATABASE ':memory:' AS information_schema")
+        self.sqlite.execute(
+            'CREATE TABLE information_schema.columns (table_name TEXT, column_name TEXT, data_type TEXT, '
+            'numeric_precision INTEGER, numeric_scale INTEGER, ordinal_position INTEGER)'
+        )
+        self.sqlite.execute(
+            'CREATE TABLE information_schema.table_constraints '
+            '(constraint_name TEXT, table_name TEXT, constraint_type TEXT)'
+        )
+        self.sqlite.execute(
+            'CREATE TABLE information_schema.key_column_usage '
+            '(constraint_name TEXT, table_name TEXT, column_name TEXT, ordinal_position INTEGER)'
+        )
+        # Empty unless a benchmark inserts fake sessions to exercise throttling
+        self.sqlite.execute('CREATE TEMP TABLE pg_stat_activity (pid INTEGER, state TEXT, query TEXT)')
+        self.refresh_catalog()
+
+    def refresh_catalog(self):
+        for catalog_table in ('columns', 'table_constraints', 'key_column_usage'):
+            self.sqlite.execute(f'DELETE FROM information_schema.{catalog_table}')
+        tables = [row[0] for row in self.sqlite.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table'"
+        )]
+        for table_name in tables:
+            constraint_name = f'{table_name}_pkey'
+            self.sqlite.execute(
+                "INSERT INTO information_schema.table_constraints VALUES (?, ?, 'PRIMARY KEY')",
+                (constraint_name, table_name),
+            )
+            for cid, column_name, declared_type, _, _, pk in self.sqlite.execute(f'PRAGMA main.table_info({table_name})'):
+                self.sqlite.execute(
+                    'INSERT INTO information_schema.columns VALUES (?, ?, ?, ?, ?, ?)',
+                    (table_name, column_name, *postgres_type(declared_type), cid + 1),
+                )
+                if pk:
+                    self.sqlite.execute(
+                        'INSERT INTO information_schema.key_column_usage VALUES (?, ?, ?, ?)',
+                        (constraint_name, table_name, column_name, pk),
+                    )
+
+
+def _sqlite_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+class LocalSnowflakeCursor(LocalCursor):
+    def _execute(self, query: str, params: Optional[Sequence[Any]] = None):
+        put = PUT_PATTERN.match(query)
+        if put:
+            shutil.copy(put['file'], self.connection.table_stage(put['table'], put['path']))
+            return self
+
+        copy = COPY_PATTERN.match(query)
+        if copy:
+            stage_dir = self.connection.table_stage(copy['stage'], copy['path'])
+            files = re.findall(r"'([^']+)'", copy['files']) if copy['files'] else sorted(
+                f for f in os.listdir(stage_dir) if os.path.isfile(os.path.join(stage_dir, f))
+            )
+            for file_name in files:
+                self._copy_file(copy['table'], copy['columns'], os.path.join(stage_dir, file_name))
+                if 'PURGE = TRUE' in query.upper():
+                    os.remove(os.path.join(stage_dir, file_name))
+            return self
+
+        create_like = CREATE_LIKE_PATTERN.match(query)
+        if create_like:
+            self._cursor.execute(f"DROP TABLE IF EXISTS temp.{create_like['table']}")
+            self._cursor.execute(
+                f"CREATE TEMP TABLE {create_like['table']} AS SELECT * FROM {create_like['source']} WHERE 0"
+            )
+            return self
+
+        merge = MERGE_PATTERN.match(query)
+        if merge:
+            # The MERGE shape issued by snowflake_writers.merge_from_staging, as a SQLite upsert.
+            # Snowflake rejects a source with two rows for one key (nondeterministic merge).
+            duplicate = self._cursor.execute(
+                f"SELECT {merge['key']} FROM {merge['source']} GROUP BY {merge['key']} HAVING COUNT(*) > 1 LIMIT 1"
+            ).fetchone()
+            if duplicate:
+                raise sqlite3.IntegrityError(
+                    f"Duplicate row detected during DML action: {merge['source']}.{merge['key']} = {duplicate[0]}"
+                )
+            columns = [column.strip() for column in merge['columns'].split(',')]
+            update_set = ', '.join(f'{column} = excluded.{column}' for column in columns)
+            self._cursor.execute(
+                f"INSERT INTO {merge['table']} ({', '.join(columns)}) "
+                f"SELECT {', '.join(columns)} FROM {merge['source']} WHERE true "
+                f"ON CONFLICT ({merge['key']}) DO UPDATE SET {update_set}"
+            )
+            return self
+
+        return super()._execute(query, params)
+
+    def _copy_file(self, table_name: str, columns: str, path: str):
+        column_count = len(columns.split(','))
+        insert_query = f"INSERT INTO {table_name} ({columns}) VALUES ({', '.join(['?'] * column_count)})"
+        if path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches():
+                self._cursor.executemany(insert_query, (
+                    [_sqlite_value(value) for value in row.values()] for row in batch.to_pylist()
+                ))
+            return
+        with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+            rows = ([None if value == CSV_NULL else value for value in row] for row in csv.reader(f))
+            self._cursor.executemany(insert_query, rows)
+
+
+class LocalSnowflakeConnection(LocalConnection):
+    """Target stand-in. Table stages (@%table) live under stage_dir."""
+    cursor_class = LocalSnowflakeCursor
+
+    def __init__(self, database: str = ':memory:', stage_dir: Optional[str] = None):
+        super().__init__(database)
+        self.stage_dir = stage_dir or tempfile.mkdtemp(prefix='snowflake_stage_')
+
+    def table_stage(self, table_name: str, stage_path: Optional[str] = None) -> str:
+        path = os.path.join(self.stage_dir, table_name.lower(), (stage_path or '').strip('/'))
+        os.makedirs(path, exist_ok=True)
+        return path
@@ -0,0 +1,97 @@
+import logging
+from datetime import datetime
+from airflow.decorators import dag, task
+from airflow.models import DagRun
+from airflow.models.param import Param
+from airflow.operators.python import get_current_context
+from airflow.providers.postgres.hooks.postgres import PostgresHook
+from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+from airflow.utils.state import DagRunState
+from ingestion_config import TABLES, get_table_config
+from ingestion_metrics import LoadMetrics
+from schema_registry import SchemaRegistry
+from watermarks import AirflowVariableWatermarkStore
+import backfill
+import postgres_to_snowflake
+
+logger = logging.getLogger(__name__)
+
+# Same Variables as the incremental DAG: the finished backfill hands its watermark over to it
+watermarks = AirflowVariableWatermarkStore()
+schemas = SchemaRegistry(AirflowVariableWatermarkStore(prefix='postgres_to_snowflake_schema_'))
+
+
+def connect_snowflake():
+    return SnowflakeHook(snowflake_conn_id='snowflake').get_conn()
+
+
+@dag(
+    dag_id='postgres_to_snowflake_backfill',
+    description='Rebuild one table from Postgres in resumable chunks; trigger manually',
+    start_date=datetime(2024, 1, 1),
+    schedule_interval=None,
+    catchup=False,
+    max_active_runs=1,
+    params={
+        'table': Param('vendas', enum=[table.name for table in TABLES]),
+        'chunk_keys': Param(backfill.DEFAULT_CHUNK_KEYS, type='integer', minimum=1),
+        # Start a new backfill instead of resuming the unfinished (or finished) one
+        'restart': Param(False, type='boolean'),
+        # Source load limits; null disables the limit
+        'max_active_queries': Param(None, type=['null', 'integer']),
+        'max_rows_per_second': Param(None, type=['null', 'number']),
+    },
+)
+def postgres_to_snowflake_backfill():
+    # The two DAGs never load a table at the same time: a backfill only starts while no incremental
+    # run is in flight, and the incremental load tasks fail while its plan is open
+    # (backfill.check_no_backfill)
+    @task(task_id='plan_backfill')
+    def plan_backfill():
+        params = get_current_context()['params']
+        table = get_table_config(params['table'])
+        if DagRun.find(dag_id='postgres_to_snowflake', state=DagRunState.RUNNING):
+            raise RuntimeError("postgres_to_snowflake is running; trigger the backfill once its run is done")
+        with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+            postgres_to_snowflake.sync_schemas(pg_conn, connect_snowflake, schemas, [table])
+            with connect_snowflake() as sf_conn:
+                return backfill.plan_backfill(
+                    pg_conn, sf_conn, table, watermarks, params['chunk_keys'], params['restart']
+                )
+
+    # At most DEFAULT_CONCURRENCY chunks (and source queries) at a time; a failed chunk retries alone
+    @task(task_id='load_chunk', retries=2, max_active_tis_per_dag=backfill.DEFAULT_CONCURRENCY)
+    def load_chunk(chunk: dict):
+        context = get_current_context()
+        params = context['params']
+        table = get_table_config(params['table'])
+        throttle = backfill.SourceThrottle(params['max_active_queries'], params['max_rows_per_second'])
+        metrics = LoadMetrics(table.name, 'backfill_chunk')
+        loaded = False
+        try:
+            with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+                with connect_snowflake() as sf_conn:
+                    row_count = backfill.load_chunk(
+                        pg_conn, sf_conn, table, chunk, schemas.get(table.name), throttle, metrics
+                    )
+            loaded = True
+            return row_count
+        finally:
+            # A publish error is only logged when the chunk failed, so it doesn't hide the chunk's exception
+            try:
+                metrics.publish(context['ti'])
+            except Exception:
+                logger.exception(f"Could not publish the backfill_chunk metrics of {table.name}")
+                if loaded:
+                    raise
+
+    # none_failed: a resumed backfill with nothing left maps zero chunks, which must not skip this
+    @task(task_id='finish_backfill', trigger_rule='none_failed')
+    def finish_backfill():
+        table = get_table_config(get_current_context()['params']['table'])
+        with connect_snowflake() as sf_conn:
+            return backfill.finish_backfill(sf_conn, table, watermarks)
+
+    load_chunk.expand(chunk=plan_backfill()) >> finish_backfill()
+
+postgres_to_snowflake_backfill_dag = postgres_to_snowflake_backfill()
@@ -1,7 +1,49 @@
+import json
+import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from airflow.decorators import dag, task
+from airflow.operators.bash import BashOperator
+from airflow.operators.python import get_current_context
 from airflow.providers.postgres.hooks.postgres import PostgresHook
 from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+from ingestion_config import TABLES, get_table_config
+from ingestion_metrics import LoadMetrics
+from schema_registry import SchemaRegistry
+from scheduling import critical_path_report, dbt_selection, topological_order
+from watermarks import AirflowVariableWatermarkStore
+import backfill
+import postgres_to_snowflake
+
+logger = logging.getLogger(__name__)
+
+watermarks = AirflowVariableWatermarkStore()
+schemas = SchemaRegistry(AirflowVariableWatermarkStore(prefix='postgres_to_snowflake_schema_'))
+
+
+def connect_snowflake():
+    return SnowflakeHook(snowflake_conn_id='snowflake').get_conn()
+
+
+@contextmanager
+def load_metrics(table_name: str, task_name: str):
+    """Phase timings of the running task, published as a log line, XCom and StatsD even if the load fails.
+
+    A failure to publish them is logged; it only fails the task when the load itself succeeded, so
+    it never replaces the load's own exception.
+    """
+    metrics = LoadMetrics(table_name, task_name)
+    loaded = False
+    try:
+        yield metrics
+        loaded = True
+    finally:
+        try:
+            metrics.publish(get_current_context()['ti'])
+        except Exception:
+            logger.exception(f"Could not publish the {task_name} metrics of {table_name}")
+            if loaded:
+                raise
  
 default_args = {
     'owner': 'airflow',
@@ -21,49 +63,119 @@ default_args = {
     catchup=False
 )
 def postgres_to_snowflake_etl():
-    table_names = ['veiculos', 'estados', 'cidades', 'concessionarias', 'vendedores', 'clientes', 'vendas']
+    # Tables are wired in foreign-key order: a table's data only lands after the tables it references
+    # have landed, while unrelated branches (e.g. veiculos and estados) run at the same time.
+    load_tasks = {}
+    task_tables = {}
+
+    # One catalog query for every table; drift is resolved (or fails the run) before anything loads
+    @task(task_id='check_schemas')
+    def check_schemas():
+        with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+            return postgres_to_snowflake.sync_schemas(pg_conn, connect_snowflake, schemas, TABLES)
+
+    schemas_checked = check_schemas()
  
-    for table_name in table_names:
-        @task(task_id=f'get_max_id_{table_name}')
-        def get_max_primary_key(table_name: str):
-            with SnowflakeHook(snowflake_conn_id='snowflake').get_conn() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(f"SELECT MAX(ID_{table_name}) FROM {table_name}")
-                    max_id = cursor.fetchone()[0]
-                    return max_id if max_id is not None else 0
+    for table in topological_order(TABLES):
+        # Reads the watermark from an Airflow Variable; Snowflake is only queried on the first run
+        @task(task_id=f'get_max_id_{table.name}')
+        def get_watermark(table_name: str):
+            return postgres_to_snowflake.get_watermark(watermarks, get_table_config(table_name), connect_snowflake)
  
-        @task(task_id=f'load_data_{table_name}')
-        def load_incremental_data(table_name: str, max_id: int):
-            with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
-                with pg_conn.cursor() as pg_cursor:
-                    primary_key = f'ID_{table_name}'
-                    
-                    pg_cursor.execute(f"SELECT column_name FROM information_schema.columns WHERE table_name = '{table_name}'")
-                    columns = [row[0] for row in pg_cursor.fetchall()]
-                    columns_list_str = ', '.join(columns)
-                    placeholders = ', '.join(['%s'] * len(columns))
-                    
-                    # Special handling for 'clientes' table - only load customers with sales (cost optimization)
-                    if table_name == 'clientes':
-                        query = f"""
-                            SELECT DISTINCT c.* 
-                            FROM {table_name} c
-                            INNER JOIN vendas v ON c.id_clientes = v.id_clientes
-                            WHERE c.{primary_key} > {max_id}
-                        """
-                    else:
-                        query = f"SELECT {columns_list_str} FROM {table_name} WHERE {primary_key} > {max_id}"
-                    
-                    pg_cursor.execute(query)
-                    rows = pg_cursor.fetchall()
-                    
-                    with SnowflakeHook(snowflake_conn_id='snowflake').get_conn() as sf_conn:
-                        with sf_conn.cursor() as sf_cursor:
-                            insert_query = f"INSERT INTO {table_name} ({columns_list_str}) VALUES ({placeholders})"
-                            for row in rows:
-                                sf_cursor.execute(insert_query, row)
+        watermark = get_watermark(table.name)
+        schemas_checked >> watermark
  
-        max_id = get_max_primary_key(table_name)
-        load_incremental_data(table_name, max_id)
+        if table.partitions > 1:
+            # Large tables: one mapped task per primary-key range, each staging its own file, then a
+            # single COPY INTO (or MERGE of the changes) so the partitions land together. A failed
+            # partition retries alone.
+            @task(task_id=f'plan_partitions_{table.name}')
+            def plan_partitions(table_name: str, watermark):
+                backfill.check_no_backfill(watermarks, get_table_config(table_name))
+                with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+                    return postgres_to_snowflake.plan_partitions(
+                        pg_conn, get_table_config(table_name), watermark, watermarks
+                    )
  
-postgres_to_snowflake_etl_dag = postgres_to_snowflake_etl()
\ No newline at end of file
+            @task(task_id=f'load_partition_{table.name}', retries=2)
+            def load_partition(table_name: str, run_key: str, key_range: dict):
+                table = get_table_config(table_name)
+                with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+                    with connect_snowflake() as sf_conn, load_metrics(table_name, 'stage_partition') as metrics:
+                        return postgres_to_snowflake.stage_partition(
+                            pg_conn, sf_conn, table, key_range, run_key, schemas.get(table_name), metrics
+                        )
+ 
+            # none_failed: a run with nothing new maps zero partitions, which must not skip the commit
+            @task(task_id=f'load_data_{table.name}', trigger_rule='none_failed')
+            def commit_partitions(table_name: str, run_key: str, staged):
+                table = get_table_config(table_name)
+                backfill.check_no_backfill(watermarks, table)
+                with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+                    with connect_snowflake() as sf_conn, load_metrics(table_name, 'commit_partitions') as metrics:
+                        return postgres_to_snowflake.commit_partitions(
+                            pg_conn, sf_conn, table, run_key, list(staged or []), watermarks, schemas.get(table_name),
+                            metrics,
+                        )
+ 
+            key_ranges = plan_partitions(table.name, watermark)
+            staged = load_partition.partial(
+                table_name=table.name, run_key='{{ run_id }}'
+            ).expand(key_range=key_ranges)
+            # Partitions are staged while the parent tables load; only the COPY waits for them
+            load_tasks[table.name] = commit_partitions(table.name, '{{ run_id }}', staged)
+            task_tables.update({
+                f'plan_partitions_{table.name}': table.name,
+                f'load_partition_{table.name}': table.name,
+            })
+        else:
+            @task(task_id=f'load_data_{table.name}')
+            def load_incremental_data(table_name: str, watermark):
+                # watermark is a primary key, or a (change timestamp, id) pair for cdc_mode='updated_at'
+                table = get_table_config(table_name)
+                backfill.check_no_backfill(watermarks, table)
+                with PostgresHook(postgres_conn_id='postgres').get_conn() as pg_conn:
+                    with connect_snowflake() as sf_conn, load_metrics(table_name, 'load') as metrics:
+                        return postgres_to_snowflake.load_incremental_data(
+                            pg_conn, sf_conn, table, watermark, watermarks, schema=schemas.get(table_name),
+                            metrics=metrics,
+                        )
+ 
+            load_tasks[table.name] = load_incremental_data(table.name, watermark)
+ 
+        task_tables.update({
+            f'get_max_id_{table.name}': table.name,
+            f'load_data_{table.name}': table.name,
+        })
+        for parent in table.depends_on:
+            load_tasks[parent] >> load_tasks[table.name]
+ 
+    @task(task_id='report_critical_path', trigger_rule='all_done')
+    def report_critical_path(task_tables: dict):
+        dag_run = get_current_context()['dag_run']
+        report = critical_path_report(dag_run.get_task_instances(), TABLES, task_tables)
+        logger.info(f"Critical path report: {json.dumps(report)}")
+        return report
+ 
+    list(load_tasks.values()) >> report_critical_path(task_tables)
+ 
+    # Each load task returns the rows it loaded; only the models downstream of tables that got rows
+    # are built, and a run where nothing loaded skips dbt altogether
+    @task.short_circuit(task_id='dbt_selection')
+    def select_dbt_models(rows_loaded: dict):
+        selection = dbt_selection(rows_loaded)
+        logger.info(f"Rows loaded per table: {json.dumps(rows_loaded)}; dbt selection: {selection or '(none)'}")
+        return selection
+ 
+    dbt_build = BashOperator(
+        task_id='dbt_build',
+        bash_command='dbt build --project-dir "$DBT_PROJECT_DIR" --select $DBT_SELECT',
+        env={
+            'DBT_PROJECT_DIR': "{{ var.value.get('dbt_project_dir', '/opt/airflow/dbt') }}",
+            'DBT_SELECT': "{{ ti.xcom_pull(task_ids='dbt_selection') }}",
+        },
+        append_env=True,
+    )
+    select_dbt_models(load_tasks) >> dbt_build
+ 
+postgres_to_snowflake_etl_dag = postgres_to_snowflake_etl()
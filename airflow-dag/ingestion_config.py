@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Rows fetched per round trip from the server-side Postgres cursor; bounds the loader's memory
+DEFAULT_CHUNK_SIZE = 10_000
+# Rows per multi-row INSERT in load_mode='batch'
+DEFAULT_BATCH_SIZE = 1_000
+# load_mode='auto' stages and COPYs loads of at least this many rows, and batches smaller ones
+DEFAULT_COPY_THRESHOLD = 50_000
+
+
+@dataclass(frozen=True)
+class ReferenceFilter:
+    """Only extract the rows referenced by another table, e.g. customers with at least one sale."""
+    # Referencing table and its column holding this table's primary key
+    table: str
+    column: str
+    # 'exists' runs a correlated EXISTS semi-join. 'distinct_join' is the INNER JOIN + DISTINCT plan,
+    # which multiplies every row by its references before de-duplicating them.
+    strategy: str = 'exists'
+    # Only probe referencing rows added since the previous load, when that load recorded its position
+    new_references_only: bool = True
+    # Change timestamp columns of the referencing table, for referenced tables in 'updated_at' mode
+    updated_at_column: str = 'data_atualizacao'
+    created_at_column: str = 'data_inclusao'
+
+    def __post_init__(self):
+        if self.strategy not in ('exists', 'distinct_join'):
+            raise ValueError(f"Reference strategy {self.strategy} not supported. Use exists, distinct_join")
+
+    @property
+    def referencing_key(self) -> str:
+        return f'ID_{self.table}'
+
+    @property
+    def change_timestamp(self) -> str:
+        """When a referencing row last changed, as TableConfig.change_timestamp."""
+        return f'COALESCE({self.updated_at_column}, {self.created_at_column})'
+
+
+@dataclass(frozen=True)
+class TableConfig:
+    """Per-table settings for the postgres_to_snowflake DAG."""
+    name: str
+    # 'insert' keeps the row-by-row INSERT path, 'batch' sends multi-row INSERTs of batch_size rows,
+    # 'copy' stages a gzipped file and runs PUT + COPY INTO, 'auto' picks batch or copy per load
+    # from the number of rows (copy_threshold)
+    load_mode: str = 'insert'
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+    batch_size: int = DEFAULT_BATCH_SIZE
+    copy_threshold: int = DEFAULT_COPY_THRESHOLD
+    # Number of primary-key ranges extracted in parallel; partitioned tables are staged and loaded with COPY
+    # ('id' mode) or MERGE ('updated_at' mode, over the key range of the change set)
+    partitions: int = 1
+    # Tables referenced by foreign keys; they are loaded before this one
+    depends_on: Tuple[str, ...] = ()
+    # 'id' loads rows whose primary key is above the watermark (inserts only). 'updated_at' also picks
+    # up updated rows through a (change timestamp, id) watermark and applies them with a MERGE.
+    cdc_mode: str = 'id'
+    updated_at_column: str = 'data_atualizacao'
+    created_at_column: str = 'data_inclusao'
+    # File format staged by load_mode='copy': 'csv' (gzipped) or 'parquet' (typed, needs pyarrow)
+    staging_format: str = 'csv'
+    # What to do when the source columns change: 'fail', 'add_columns' (ALTER the target to add new
+    # columns; removed or retyped columns still fail) or 'ignore' (keep loading the known columns)
+    on_schema_drift: str = 'fail'
+    # Load only the rows another table references (see ReferenceFilter); None loads every row
+    referenced_by: Optional[ReferenceFilter] = None
+
+    def __post_init__(self):
+        if self.partitions > 1 and self.load_mode != 'copy':
+            raise ValueError(f"Table {self.name} has {self.partitions} partitions and needs load_mode='copy'")
+        if self.cdc_mode not in ('id', 'updated_at'):
+            raise ValueError(f"CDC mode {self.cdc_mode} of table {self.name} not supported. Use id, updated_at")
+
+    @property
+    def primary_key(self) -> str:
+        return f'ID_{self.name}'
+
+    @property
+    def change_timestamp(self) -> str:
+        """When a row last changed; rows never updated fall back to their insertion time."""
+        return f'COALESCE({self.updated_at_column}, {self.created_at_column})'
+
+
+TABLES = [
+    TableConfig('veiculos', load_mode='auto', cdc_mode='updated_at'),
+    TableConfig('estados', load_mode='auto', cdc_mode='updated_at'),
+    TableConfig('cidades', load_mode='auto', cdc_mode='updated_at', depends_on=('estados',)),
+    TableConfig('concessionarias', load_mode='auto', cdc_mode='updated_at', depends_on=('cidades',)),
+    TableConfig('vendedores', load_mode='auto', cdc_mode='updated_at', depends_on=('concessionarias',)),
+    # Only customers with at least one sale are loaded (cost optimization)
+    TableConfig(
+        'clientes', load_mode='copy', partitions=4, cdc_mode='updated_at', depends_on=('concessionarias',),
+        referenced_by=ReferenceFilter('vendas', 'id_clientes'),
+    ),
+    TableConfig(
+        'vendas', load_mode='copy', partitions=8, cdc_mode='updated_at',
+        depends_on=('veiculos', 'concessionarias', 'vendedores', 'clientes'),
+    ),
+]
+
+
+def get_table_config(table_name: str) -> TableConfig:
+    for table in TABLES:
+        if table.name == table_name:
+            return table
+    raise ValueError(f"Table {table_name} not configured. Use {', '.join(t.name for t in TABLES)}")
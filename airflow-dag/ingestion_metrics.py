@@ -0,0 +1,86 @@
+"""Where a table load spends its time, without a profiler.
+
+A LoadMetrics object is handed to the load functions and the writers. They time their phases with
+metrics.phase(...). Phases are exclusive: while rows are pulled from Postgres inside the stage
+or load phase, that time goes to extract and not to the enclosing phase.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# extract: waiting on the Postgres cursor; transform: Python row handling and file encoding;
+# stage: PUT to the table stage; load: INSERT / COPY INTO / MERGE; commit: COMMIT
+PHASES = ('extract', 'transform', 'stage', 'load', 'commit')
+
+
+class LoadMetrics:
+    def __init__(self, table_name: str = '', task: str = 'load'):
+        self.table_name = table_name
+        self.task = task
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self._open: List[List[Any]] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        now = time.perf_counter()
+        if self._open:
+            parent = self._open[-1]
+            self.seconds[parent[0]] += now - parent[1]
+        self._open.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            phase, started = self._open.pop()
+            self.seconds[phase] += now - started
+            if self._open:
+                self._open[-1][1] = now
+
+    def extracted(self, chunks: Iterable[List[Sequence[Any]]]) -> Iterator[List[Sequence[Any]]]:
+        """Pass chunks through, timing each fetch as extract and counting rows and batches."""
+        iterator = iter(chunks)
+        while True:
+            with self.phase('extract'):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            self.batches += 1
+            self.rows += len(chunk)
+            yield chunk
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = time.perf_counter() - self._started
+        return {
+            'table': self.table_name,
+            'task': self.task,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'batches': self.batches,
+            'seconds': {phase: round(seconds, 6) for phase, seconds in self.seconds.items()},
+            'total_seconds': round(total, 6),
+            'bottleneck': max(self.seconds, key=self.seconds.get) if any(self.seconds.values()) else None,
+        }
+
+    def publish(self, task_instance: Optional[Any] = None) -> Dict[str, Any]:
+        """Log the metrics as one JSON line; with a task instance, also push them to XCom and StatsD."""
+        record = self.to_dict()
+        logger.info(json.dumps({'event': 'ingestion_metrics', **record}))
+        if task_instance is not None:
+            from airflow.stats import Stats
+
+            task_instance.xcom_push(key='load_metrics', value=record)
+            prefix = f'postgres_to_snowflake.{self.table_name}.{self.task}'
+            for phase, seconds in self.seconds.items():
+                Stats.timing(f'{prefix}.{phase}', timedelta(seconds=seconds))
+            for counter in ('rows', 'bytes', 'batches'):
+                Stats.incr(f'{prefix}.{counter}', count=record[counter])
+        return record
@@ -0,0 +1,130 @@
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from ingestion_config import TableConfig
+
+logger = logging.getLogger(__name__)
+
+
+def build_extract_query(table: TableConfig, columns: List[str], lower: int, upper: Optional[int] = None,
+                        referenced_after: Optional[int] = None, referenced_upto: Optional[int] = None) -> str:
+    """SELECT the rows of table whose primary key is in (lower, upper], or above lower if upper is None.
+
+    Tables with a ReferenceFilter only return referenced rows. With new_references_only,
+    referenced_after limits the referencing rows probed to those whose key is above it. When both
+    referenced_after and referenced_upto are given, rows at or below lower whose first reference
+    is in (referenced_after, referenced_upto] are returned as well: the key watermark passed them
+    while nothing referenced them, so no earlier load picked them up.
+    """
+    primary_key = table.primary_key
+    key_filter = f"t.{primary_key} > {lower}"
+    if upper is not None:
+        key_filter += f" AND t.{primary_key} <= {upper}"
+    columns_list_str = ', '.join(f't.{column}' for column in columns)
+
+    reference = table.referenced_by
+    if reference is None:
+        return f"SELECT {columns_list_str} FROM {table.name} t WHERE {key_filter}"
+
+    reference_filter = f"r.{reference.column} = t.{primary_key}"
+    if referenced_after is not None and reference.new_references_only:
+        reference_filter += f" AND r.{reference.referencing_key} > {referenced_after}"
+
+    if reference.strategy == 'distinct_join':
+        query = (
+            f"SELECT DISTINCT {columns_list_str} FROM {table.name} t "
+            f"INNER JOIN {reference.table} r ON {reference_filter} WHERE {key_filter}"
+        )
+    else:
+        query = (
+            f"SELECT {columns_list_str} FROM {table.name} t "
+            f"WHERE {key_filter} AND EXISTS (SELECT 1 FROM {reference.table} r WHERE {reference_filter})"
+        )
+    if referenced_after is None or referenced_upto is None:
+        return query
+    return (
+        f"{query} UNION ALL "
+        f"SELECT {columns_list_str} FROM {table.name} t WHERE t.{primary_key} <= {lower} "
+        f"AND EXISTS (SELECT 1 FROM {reference.table} r WHERE r.{reference.column} = t.{primary_key} "
+        f"AND r.{reference.referencing_key} > {referenced_after} AND r.{reference.referencing_key} <= {referenced_upto}) "
+        f"AND NOT EXISTS (SELECT 1 FROM {reference.table} r WHERE r.{reference.column} = t.{primary_key} "
+        f"AND r.{reference.referencing_key} <= {referenced_after})"
+    )
+
+
+def build_change_query(table: TableConfig, columns: List[str], watermark: Optional[Sequence[Any]],
+                       upto: Optional[Sequence[Any]] = None, lower: Optional[int] = None,
+                       upper: Optional[int] = None, ordered: bool = True,
+                       referenced_after: Optional[str] = None) -> Tuple[str, Tuple[Any, ...]]:
+    """SELECT the rows changed after the (change timestamp, id) watermark, in watermark order.
+
+    upto keeps only the changes at or before a second watermark, and lower/upper only the primary
+    keys in (lower, upper]; partitioned loads use both to split one change set into key ranges.
+    Tables with a ReferenceFilter only return referenced rows (by any referencing row: an update
+    matters whether the reference is new or not). They also return the rows referenced by a
+    referencing row changed since referenced_after (the referencing table's latest change timestamp
+    at the previous load, or every referencing row when None): a row the watermark passed before
+    anything referenced it was never loaded. Returns the query and its parameters. A None
+    watermark selects the whole table; ordered=False leaves out the ORDER BY, for aggregates.
+    """
+    change_timestamp = f'COALESCE(t.{table.updated_at_column}, t.{table.created_at_column})'
+    primary_key = f't.{table.primary_key}'
+    filters: List[str] = []
+    params: Tuple[Any, ...] = ()
+    reference = table.referenced_by
+    if watermark is not None:
+        changed = f"({change_timestamp}, {primary_key}) > (%s, %s)"
+        params += tuple(watermark)
+        if reference is not None:
+            referenced = f"SELECT r.{reference.column} FROM {reference.table} r"
+            if referenced_after is not None:
+                referenced += f" WHERE COALESCE(r.{reference.updated_at_column}, r.{reference.created_at_column}) > %s"
+                params += (referenced_after,)
+            changed = f"({changed} OR {primary_key} IN ({referenced}))"
+        filters.append(changed)
+    if upto is not None:
+        filters.append(f"({change_timestamp}, {primary_key}) <= (%s, %s)")
+        params += tuple(upto)
+    if lower is not None:
+        filters.append(f"{primary_key} > {lower}")
+    if upper is not None:
+        filters.append(f"{primary_key} <= {upper}")
+    if reference is not None:
+        filters.append(f"EXISTS (SELECT 1 FROM {reference.table} r WHERE r.{reference.column} = {primary_key})")
+
+    query = f"SELECT {', '.join(f't.{column}' for column in columns)} FROM {table.name} t"
+    if filters:
+        query += f" WHERE {' AND '.join(filters)}"
+    if ordered:
+        query += f" ORDER BY {change_timestamp}, {primary_key}"
+    return query, params
+
+
+def split_key_range(lower: int, upper: int, partitions: int) -> List[Dict[str, int]]:
+    """Split the key range (lower, upper] into at most `partitions` contiguous ranges."""
+    if upper <= lower:
+        return []
+    size = -(-(upper - lower) // partitions)
+    return [
+        {'lower': start, 'upper': min(start + size, upper)}
+        for start in range(lower, upper, size)
+    ]
+
+
+def stream_chunks(pg_conn, query: str, chunk_size: int, cursor_name: str,
+                  params: Sequence[Any] = ()) -> Iterator[List[Sequence[Any]]]:
+    """Run query on a named (server-side) cursor and yield the result in chunks of chunk_size rows.
+
+    Only one chunk is held in memory at a time, so peak memory depends on chunk_size and not on
+    how many rows the query returns.
+    """
+    with pg_conn.cursor(name=cursor_name) as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params or None)
+        chunk_count = 0
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            chunk_count += 1
+            yield chunk
+        logger.info(f"Cursor {cursor_name} streamed {chunk_count} chunks of up to {chunk_size} rows")
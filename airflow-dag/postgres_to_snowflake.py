@@ -0,0 +1,629 @@
+"""Task logic of the postgres_to_snowflake DAG.
+
+The functions take open DB-API connections instead of Airflow hooks, so the DAG only wires
+hooks in and the load path can run offline against the stand-ins in benchmarks/local_hooks.py.
+"""
+import logging
+import re
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from ingestion_config import TableConfig
+from ingestion_metrics import LoadMetrics
+from postgres_extract import build_change_query, build_extract_query, split_key_range, stream_chunks
+from schema_registry import SchemaDriftError, SchemaRegistry, TableSchema, fetch_columns, snowflake_type
+from snowflake_writers import SnowflakeWriter, WriterFactory, create_staging_table, merge_from_staging
+from watermarks import SnowflakeWatermarkTable, WatermarkStore
+
+logger = logging.getLogger(__name__)
+
+watermark_table = SnowflakeWatermarkTable()
+
+
+def get_max_primary_key(sf_conn, table: TableConfig) -> int:
+    with sf_conn.cursor() as cursor:
+        cursor.execute(f"SELECT MAX({table.primary_key}) FROM {table.name}")
+        max_id = cursor.fetchone()[0]
+        return max_id if max_id is not None else 0
+
+
+def get_last_change(sf_conn, table: TableConfig) -> Optional[List[Any]]:
+    """The (change timestamp, id) watermark of the newest row already in the target."""
+    with sf_conn.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {table.change_timestamp}, {table.primary_key} FROM {table.name} "
+            f"ORDER BY 1 DESC, 2 DESC LIMIT 1"
+        )
+        row = cursor.fetchone()
+        return [json_timestamp(row[0]), row[1]] if row else None
+
+
+def json_timestamp(value: Any) -> Any:
+    return value.isoformat(sep=' ') if hasattr(value, 'isoformat') else value
+
+
+def matches_cdc_mode(table: TableConfig, watermark: Any) -> bool:
+    """Whether a stored watermark has the shape of the table's cdc_mode: a (change timestamp, id) pair or a key.
+
+    A table switched to another cdc_mode still has the old mode's watermark stored; it doesn't apply.
+    """
+    return watermark is None or isinstance(watermark, list) == (table.cdc_mode == 'updated_at')
+
+
+def read_committed(cursor, table: TableConfig) -> Any:
+    """The watermark committed in Snowflake, or None when there is none for the table's cdc_mode."""
+    committed = watermark_table.read(cursor, table.name)
+    return committed if matches_cdc_mode(table, committed) else None
+
+
+def get_watermark(watermarks: WatermarkStore, table: TableConfig, connect_snowflake: Callable) -> Any:
+    """Where the last load of table stopped: a primary key, or a (change timestamp, id) pair in 'updated_at' mode.
+
+    Reads the watermark store, which needs no Snowflake compute. Only when the store has no
+    entry yet for the table's cdc_mode (first run) does it fall back to the watermark table and
+    then to the target table.
+    """
+    max_id = watermarks.get(table.name)
+    if max_id is not None and matches_cdc_mode(table, max_id):
+        return max_id
+
+    logger.info(f"No stored watermark for {table.name} in '{table.cdc_mode}' mode, reading it from Snowflake")
+    with connect_snowflake() as sf_conn:
+        with sf_conn.cursor() as cursor:
+            watermark_table.create_if_missing(cursor)
+            max_id = read_committed(cursor, table)
+        if max_id is None:
+            if table.cdc_mode == 'updated_at':
+                max_id = get_last_change(sf_conn, table)
+            else:
+                max_id = get_max_primary_key(sf_conn, table)
+    watermarks.set(table.name, max_id)
+    return max_id
+
+
+def sync_schemas(pg_conn, connect_snowflake: Callable, schemas: SchemaRegistry, tables: List[TableConfig]) -> Dict[str, str]:
+    """Check every table's columns against the registry with one catalog query and resolve drift.
+
+    Each drifted table is handled according to its on_schema_drift policy. Returns a
+    description of what changed per table.
+    """
+    by_name = {table.name: table for table in tables}
+    changes = schemas.check(pg_conn, list(by_name))
+    report: Dict[str, str] = {}
+    failures = []
+    for table_name, drift in changes.items():
+        if drift is None:
+            report[table_name] = 'registered'
+            continue
+
+        policy = by_name[table_name].on_schema_drift
+        logger.warning(f"Schema drift in {drift} (policy '{policy}')")
+        if policy == 'ignore':
+            cached = schemas.get(table_name)
+            current_names = set(drift.current.column_names)
+            known = TableSchema(
+                table_name, [c for c in cached.columns if c.name in current_names], drift.current.primary_key
+            )
+            schemas.register(known, source_fingerprint=drift.current.fingerprint)
+            report[table_name] = f'ignored ({drift})'
+        elif policy == 'add_columns' and drift.added and not drift.removed and not drift.retyped:
+            with connect_snowflake() as sf_conn:
+                with sf_conn.cursor() as sf_cursor:
+                    for column in drift.added:
+                        sf_cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {snowflake_type(column)}")
+            schemas.register(drift.current)
+            report[table_name] = f'columns added ({drift})'
+        else:
+            failures.append(str(drift))
+
+    if failures:
+        raise SchemaDriftError(f"Source schema changed: {'; '.join(failures)}")
+    return report
+
+
+def resolve_schema(pg_conn, table: TableConfig, schema: Optional[TableSchema]) -> TableSchema:
+    """The cached schema when the caller has one; otherwise read it from the catalog."""
+    return schema if schema is not None else fetch_columns(pg_conn, [table.name])[table.name]
+
+
+def make_writer(table: TableConfig, schema: TableSchema, metrics: Optional[LoadMetrics] = None,
+                load_mode: Optional[str] = None) -> SnowflakeWriter:
+    load_mode = load_mode or table.load_mode
+    if load_mode == 'copy':
+        return WriterFactory.create('copy', file_format=table.staging_format, columns=schema.columns, metrics=metrics)
+    if load_mode == 'batch':
+        return WriterFactory.create('batch', batch_size=table.batch_size, metrics=metrics)
+    if load_mode == 'auto':
+        return WriterFactory.create(
+            'auto',
+            small=make_writer(table, schema, metrics, load_mode='batch'),
+            large=make_writer(table, schema, metrics, load_mode='copy'),
+            threshold=table.copy_threshold,
+            metrics=metrics,
+        )
+    return WriterFactory.create(load_mode, metrics=metrics)
+
+
+def has_rows(pg_conn, query: str, params: Sequence[Any] = ()) -> bool:
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"SELECT EXISTS ({query})", params or None)
+        return bool(pg_cursor.fetchone()[0])
+
+
+def reference_snapshot_key(table: TableConfig) -> str:
+    return f'{table.name}_referenced_by_{table.referenced_by.table}'
+
+
+def reference_bounds(pg_conn, table: TableConfig,
+                     watermarks: Optional[WatermarkStore]) -> Tuple[Optional[Any], Optional[Any]]:
+    """Bounds on the referencing rows for a table loaded with a ReferenceFilter.
+
+    Returns (referenced_after, snapshot). snapshot is the referencing table's largest key (its
+    latest change timestamp for tables in 'updated_at' mode), read before extracting; it is stored
+    once the load commits. Every referencing row at or below it existed during that load, so its
+    target row was loaded then, and the next load only needs to probe referencing rows above it:
+    for new referenced rows (with new_references_only) and for rows the watermark already passed
+    that got their first reference since. referenced_after is None on the first load, or without a store.
+    """
+    reference = table.referenced_by
+    if reference is None or watermarks is None:
+        return None, None
+    with pg_conn.cursor() as pg_cursor:
+        if table.cdc_mode == 'updated_at':
+            pg_cursor.execute(f"SELECT MAX({reference.change_timestamp}) FROM {reference.table}")
+            snapshot = json_timestamp(pg_cursor.fetchone()[0])
+        else:
+            pg_cursor.execute(f"SELECT MAX({reference.referencing_key}) FROM {reference.table}")
+            snapshot = pg_cursor.fetchone()[0] or 0
+    referenced_after = watermarks.get(reference_snapshot_key(table))
+    # A table switched to another cdc_mode still has the other kind of snapshot stored
+    if isinstance(referenced_after, str) != (table.cdc_mode == 'updated_at'):
+        referenced_after = None
+    return referenced_after, snapshot
+
+
+def committed_reference_after(cursor, table: TableConfig, referenced_after: Optional[int]) -> Optional[int]:
+    """The reference snapshot committed in Snowflake with the last load, when it is past referenced_after.
+
+    The store can lag the committed snapshot like it lags the watermark; probing from the older
+    one would load the rows first referenced in between a second time.
+    """
+    committed = watermark_table.read(cursor, reference_snapshot_key(table))
+    if isinstance(committed, int) and (referenced_after is None or committed > referenced_after):
+        return committed
+    return referenced_after
+
+
+class KeyTracker:
+    """Pass chunks through unchanged while recording the largest primary key seen."""
+
+    def __init__(self, columns: List[str], table: TableConfig, start: int):
+        self.key_index = [column.lower() for column in columns].index(table.primary_key.lower())
+        self.max_id = start
+
+    def track(self, chunks: Iterable[List[Sequence[Any]]]) -> Iterator[List[Sequence[Any]]]:
+        for chunk in chunks:
+            self.max_id = max(self.max_id, max(row[self.key_index] for row in chunk))
+            yield chunk
+
+
+class ChangeTracker:
+    """Pass chunks through unchanged while recording the (change timestamp, id) of the last row.
+
+    Rows arrive ordered by that pair (see build_change_query), so the last row holds the new watermark.
+    Rows of a table with a ReferenceFilter can also be older than the start watermark (first
+    referenced since the last load), so the watermark never moves back.
+    """
+
+    def __init__(self, columns: List[str], table: TableConfig, start: Optional[List[Any]]):
+        names = [column.lower() for column in columns]
+        self.key_index = names.index(table.primary_key.lower())
+        self.updated_index = names.index(table.updated_at_column.lower())
+        self.created_index = names.index(table.created_at_column.lower())
+        self.watermark = start
+
+    def track(self, chunks: Iterable[List[Sequence[Any]]]) -> Iterator[List[Sequence[Any]]]:
+        for chunk in chunks:
+            last = chunk[-1]
+            changed_at = last[self.updated_index] if last[self.updated_index] is not None else last[self.created_index]
+            watermark = [json_timestamp(changed_at), last[self.key_index]]
+            if self.watermark is None or watermark > self.watermark:
+                self.watermark = watermark
+            yield chunk
+
+
+@contextmanager
+def transaction(cursor, metrics: Optional[LoadMetrics] = None):
+    cursor.execute("BEGIN")
+    try:
+        yield
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+    with metrics.phase('commit') if metrics is not None else nullcontext():
+        cursor.execute("COMMIT")
+
+
+def load_incremental_data(pg_conn, sf_conn, table: TableConfig, max_id: int,
+                          watermarks: Optional[WatermarkStore] = None, chunk_size: Optional[int] = None,
+                          schema: Optional[TableSchema] = None, metrics: Optional[LoadMetrics] = None) -> int:
+    """Load the rows above max_id and advance the watermark in the same Snowflake transaction.
+
+    A retry after a committed attempt finds the advanced watermark in Snowflake and does not
+    load the same rows twice. Tables in 'updated_at' mode go through load_changed_data.
+    Phase timings and volumes are recorded in metrics.
+    """
+    metrics = metrics if metrics is not None else LoadMetrics(table.name)
+    if table.cdc_mode == 'updated_at':
+        return load_changed_data(pg_conn, sf_conn, table, max_id, watermarks, chunk_size, schema, metrics)
+
+    referenced_after, snapshot = reference_bounds(pg_conn, table, watermarks)
+    if not has_rows(pg_conn, build_extract_query(
+        table, [table.primary_key], max_id, referenced_after=referenced_after, referenced_upto=snapshot
+    )):
+        logger.info(f"No new rows in {table.name} after {max_id}")
+        return 0
+
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    writer = make_writer(table, schema, metrics)
+    with sf_conn.cursor() as sf_cursor:
+        watermark_table.create_if_missing(sf_cursor)
+        with transaction(sf_cursor, metrics):
+            committed = read_committed(sf_cursor, table)
+            if committed is not None and committed > max_id:
+                logger.info(f"{table.name} was already loaded up to {committed}, resuming from there")
+                max_id = committed
+            if snapshot is not None:
+                referenced_after = committed_reference_after(sf_cursor, table, referenced_after)
+
+            query = build_extract_query(
+                table, columns, max_id, referenced_after=referenced_after, referenced_upto=snapshot
+            )
+            chunks = metrics.extracted(
+                stream_chunks(pg_conn, query, chunk_size or table.chunk_size, cursor_name=f'extract_{table.name}')
+            )
+            keys = KeyTracker(columns, table, max_id)
+            row_count = writer.write(sf_cursor, table.name, columns, keys.track(chunks))
+            watermark_table.advance(sf_cursor, table.name, keys.max_id)
+            if snapshot is not None:
+                watermark_table.advance(sf_cursor, reference_snapshot_key(table), snapshot)
+
+    if watermarks is not None:
+        watermarks.set(table.name, keys.max_id)
+        if snapshot is not None:
+            watermarks.set(reference_snapshot_key(table), snapshot)
+    logger.info(f"Loaded {row_count} rows into {table.name} using '{table.load_mode}' mode, watermark {keys.max_id}")
+    return row_count
+
+
+def load_changed_data(pg_conn, sf_conn, table: TableConfig, watermark: Optional[List[Any]],
+                      watermarks: Optional[WatermarkStore] = None, chunk_size: Optional[int] = None,
+                      schema: Optional[TableSchema] = None, metrics: Optional[LoadMetrics] = None) -> int:
+    """Apply the rows inserted or updated after the (change timestamp, id) watermark.
+
+    The changes are written to a temporary staging table with the table's writer and applied
+    with a single MERGE, in the same transaction that advances the watermark. Tables with a
+    ReferenceFilter also apply the rows referenced since the last load (see build_change_query).
+    """
+    metrics = metrics if metrics is not None else LoadMetrics(table.name)
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    referenced_after, snapshot = reference_bounds(pg_conn, table, watermarks)
+    if not has_rows(pg_conn, *build_change_query(table, columns, watermark, referenced_after=referenced_after)):
+        logger.info(f"No changes in {table.name} after {watermark}")
+        return 0
+
+    writer = make_writer(table, schema, metrics)
+    with sf_conn.cursor() as sf_cursor:
+        watermark_table.create_if_missing(sf_cursor)
+        staging_table = create_staging_table(sf_cursor, table.name)
+        with transaction(sf_cursor, metrics):
+            committed = read_committed(sf_cursor, table)
+            if committed is not None and (watermark is None or committed > watermark):
+                logger.info(f"{table.name} changes were already applied up to {committed}, resuming from there")
+                watermark = committed
+
+            query, params = build_change_query(table, columns, watermark, referenced_after=referenced_after)
+            chunks = metrics.extracted(stream_chunks(
+                pg_conn, query, chunk_size or table.chunk_size, cursor_name=f'changes_{table.name}', params=params
+            ))
+            changes = ChangeTracker(columns, table, watermark)
+            row_count = writer.write(sf_cursor, staging_table, columns, changes.track(chunks))
+            if row_count:
+                with metrics.phase('load'):
+                    merge_from_staging(sf_cursor, table.name, staging_table, columns, table.primary_key)
+            watermark_table.advance(sf_cursor, table.name, changes.watermark)
+        sf_cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+
+    if watermarks is not None:
+        watermarks.set(table.name, changes.watermark)
+        if snapshot is not None:
+            watermarks.set(reference_snapshot_key(table), snapshot)
+    logger.info(f"Merged {row_count} changed rows into {table.name}, watermark {changes.watermark}")
+    return row_count
+
+
+def plan_partitions(pg_conn, table: TableConfig, max_id: Any,
+                    watermarks: Optional[WatermarkStore] = None) -> List[Dict[str, Any]]:
+    """Split the keys not loaded yet, (max_id, MAX(primary key) in Postgres], into table.partitions ranges.
+
+    For tables with a ReferenceFilter, every range also carries the referencing-key bounds, so all
+    partitions of the run probe the same referencing rows. The first range also loads the rows at
+    or below max_id first referenced since the last load (an empty key range when no key is new).
+    Tables in 'updated_at' mode split their change set instead (see plan_change_partitions).
+    """
+    if table.cdc_mode == 'updated_at':
+        return plan_change_partitions(pg_conn, table, max_id, watermarks)
+
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(f"SELECT MAX({table.primary_key}) FROM {table.name}")
+        current_max = pg_cursor.fetchone()[0] or 0
+
+    key_ranges = split_key_range(max_id, current_max, table.partitions)
+    referenced_after, snapshot = reference_bounds(pg_conn, table, watermarks)
+    if snapshot is not None:
+        if referenced_after is not None and not key_ranges:
+            key_ranges = [{'lower': max_id, 'upper': max_id}]
+        for key_range in key_ranges:
+            key_range.update({'referenced_after': referenced_after, 'referenced_upto': snapshot})
+        key_ranges[0]['new_references'] = referenced_after is not None
+    logger.info(f"Split {table.name} keys ({max_id}, {current_max}] into {len(key_ranges)} partitions")
+    return key_ranges
+
+
+def plan_change_partitions(pg_conn, table: TableConfig, watermark: Optional[List[Any]],
+                           watermarks: Optional[WatermarkStore] = None) -> List[Dict[str, Any]]:
+    """Split the rows changed after watermark into table.partitions primary-key ranges.
+
+    The change set is fixed when planning: every range carries the plan's watermark and, as its
+    upper bound, the latest change timestamp and largest key of the change set. Rows changed
+    while the partitions run are left for the next load. Tables with a ReferenceFilter also carry
+    the referencing-table bounds, so all partitions probe the same referencing rows.
+    """
+    columns = [table.primary_key, table.updated_at_column, table.created_at_column]
+    referenced_after, snapshot = reference_bounds(pg_conn, table, watermarks)
+    query, params = build_change_query(table, columns, watermark, ordered=False, referenced_after=referenced_after)
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"SELECT MIN({table.primary_key}), MAX({table.primary_key}), "
+            f"MAX(COALESCE({table.updated_at_column}, {table.created_at_column})) FROM ({query}) c",
+            params or None,
+        )
+        first_key, last_key, last_change = pg_cursor.fetchone()
+    if last_key is None:
+        logger.info(f"No changes in {table.name} after {watermark}")
+        return []
+
+    changed_upto = [json_timestamp(last_change), last_key]
+    # A change set of rows first referenced since the last load only holds rows below the watermark
+    if watermark is not None and changed_upto < watermark:
+        changed_upto = watermark
+    key_ranges = split_key_range(first_key - 1, last_key, table.partitions)
+    for key_range in key_ranges:
+        key_range.update({'changed_after': watermark, 'changed_upto': changed_upto})
+        if snapshot is not None:
+            key_range.update({'referenced_after': referenced_after, 'referenced_upto': snapshot})
+    logger.info(
+        f"Split {table.name} changes ({watermark}, {changed_upto}] over keys [{first_key}, {last_key}] "
+        f"into {len(key_ranges)} partitions"
+    )
+    return key_ranges
+
+
+def partition_stage_path(run_key: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_]', '_', run_key)
+
+
+def stage_partition(pg_conn, sf_conn, table: TableConfig, key_range: Dict[str, Any], run_key: str,
+                    schema: Optional[TableSchema] = None, metrics: Optional[LoadMetrics] = None) -> Dict[str, Any]:
+    """Extract one key range and PUT it under the run's stage path, without loading it.
+
+    In 'updated_at' mode the range's rows changed within the plan's bounds are extracted.
+    The file name depends only on the range, so a retried partition overwrites its own file.
+    Returns the staged row count, the file name (None when nothing was staged) and the largest key
+    staged, plus the bounds commit_partitions needs.
+    """
+    metrics = metrics if metrics is not None else LoadMetrics(table.name, task='stage_partition')
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    lower, upper = key_range['lower'], key_range['upper']
+    if table.cdc_mode == 'updated_at':
+        query, params = build_change_query(
+            table, columns, key_range['changed_after'], key_range['changed_upto'], lower, upper,
+            referenced_after=key_range.get('referenced_after'),
+        )
+    else:
+        query = build_extract_query(
+            table, columns, lower, upper, referenced_after=key_range.get('referenced_after'),
+            referenced_upto=key_range['referenced_upto'] if key_range.get('new_references') else None,
+        )
+        params = ()
+
+    chunks = metrics.extracted(stream_chunks(
+        pg_conn, query, table.chunk_size, cursor_name=f'extract_{table.name}_{lower}_{upper}', params=params
+    ))
+    keys = KeyTracker(columns, table, lower)
+    writer = make_writer(table, schema, metrics)
+    file_name = f'part_{lower}_{upper}.{writer.file_extension}'
+    with sf_conn.cursor() as sf_cursor:
+        row_count = writer.stage(
+            sf_cursor, table.name, keys.track(chunks), file_name=file_name, stage_path=partition_stage_path(run_key),
+        )
+    return {
+        'rows': row_count, 'file': file_name if row_count else None, 'lower': lower, 'max_id': keys.max_id,
+        'referenced_after': key_range.get('referenced_after'), 'referenced_upto': key_range.get('referenced_upto'),
+        'changed_after': key_range.get('changed_after'), 'changed_upto': key_range.get('changed_upto'),
+    }
+
+
+def staged_files(staged: List[Dict[str, Any]]) -> List[str]:
+    return [partition['file'] for partition in staged if partition['file']]
+
+
+def commit_partitions(pg_conn, sf_conn, table: TableConfig, run_key: str, staged: List[Dict[str, int]],
+                      watermarks: Optional[WatermarkStore] = None, schema: Optional[TableSchema] = None,
+                      metrics: Optional[LoadMetrics] = None) -> int:
+    """Load every partition staged for the run with a single COPY INTO and advance the watermark with it.
+
+    Only the files staged by these partitions are copied: the run's stage path can also hold
+    files of an earlier plan of the same run (e.g. after its tasks were cleared).
+
+    The plan started from the watermark store, which can lag the watermark committed in Snowflake
+    (e.g. a worker died between COMMIT and updating the store, and the run was retried). When the
+    committed watermark is inside the staged key range, the files are copied into a temporary
+    table and only the keys above it are inserted, so no row is loaded twice. For tables with a
+    ReferenceFilter, the staged rows include rows below the watermark, so when any load committed
+    since the plan, only the rows whose key is not in the table yet are inserted.
+    """
+    metrics = metrics if metrics is not None else LoadMetrics(table.name, task='commit_partitions')
+    if table.cdc_mode == 'updated_at':
+        return commit_change_partitions(pg_conn, sf_conn, table, run_key, staged, watermarks, schema, metrics)
+    row_count = sum(partition['rows'] for partition in staged)
+    if not row_count:
+        logger.info(f"No partitions staged for {table.name}")
+        return 0
+    lower = min(partition['lower'] for partition in staged)
+    max_id = max(partition['max_id'] for partition in staged)
+    referenced_after = staged[0].get('referenced_after')
+    snapshots = [partition['referenced_upto'] for partition in staged if partition.get('referenced_upto') is not None]
+    snapshot = min(snapshots) if snapshots else None
+
+    def committed_since_plan(sf_cursor) -> bool:
+        committed = read_committed(sf_cursor, table)
+        if committed is not None and committed > lower:
+            return True
+        return snapshot is not None and committed_reference_after(sf_cursor, table, referenced_after) != referenced_after
+
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    writer = make_writer(table, schema, metrics)
+    stage_path = partition_stage_path(run_key)
+    files = staged_files(staged)
+    staging_table = None
+    with sf_conn.cursor() as sf_cursor:
+        watermark_table.create_if_missing(sf_cursor)
+        # DDL commits the open transaction in Snowflake, so the temporary table is created up front
+        # when a load committed after the plan: its watermark overlaps the staged keys, or its
+        # reference snapshot is past the plan's
+        if committed_since_plan(sf_cursor):
+            staging_table = create_staging_table(sf_cursor, table.name)
+
+        with transaction(sf_cursor, metrics):
+            committed = read_committed(sf_cursor, table)
+            # Rows first referenced since the last load sit below the key watermark, so only tables
+            # without a reference snapshot can tell from the watermark alone that nothing is left
+            if committed is not None and committed >= max_id and snapshot is None:
+                logger.info(f"{table.name} partitions of {run_key} were already committed up to {committed}")
+                row_count = 0
+                max_id = committed
+            elif committed_since_plan(sf_cursor):
+                if staging_table is None:
+                    raise RuntimeError(
+                        f"{table.name} was committed up to {committed} while the partitions of {run_key} were "
+                        f"being committed; retry the task"
+                    )
+                logger.info(
+                    f"A load of {table.name} committed up to {committed} after the partitions of {run_key} were "
+                    f"planned from {lower}, loading only the rows not in the table yet"
+                )
+                writer.copy_staged(
+                    sf_cursor, staging_table, columns, stage_path=stage_path, files=files, stage_table=table.name
+                )
+                columns_list_str = ', '.join(columns)
+                if snapshot is None:
+                    sf_cursor.execute(
+                        f"INSERT INTO {table.name} ({columns_list_str}) SELECT {columns_list_str} FROM {staging_table} "
+                        f"WHERE {table.primary_key} > %s",
+                        (committed,),
+                    )
+                else:
+                    sf_cursor.execute(
+                        f"INSERT INTO {table.name} ({columns_list_str}) SELECT {columns_list_str} FROM {staging_table} s "
+                        f"WHERE NOT EXISTS (SELECT 1 FROM {table.name} t WHERE t.{table.primary_key} = s.{table.primary_key})"
+                    )
+                row_count = sf_cursor.rowcount
+                metrics.rows += row_count
+                max_id = max(max_id, committed or 0)
+                watermark_table.advance(sf_cursor, table.name, max_id)
+            else:
+                writer.copy_staged(sf_cursor, table.name, columns, stage_path=stage_path, files=files)
+                metrics.rows += row_count
+                watermark_table.advance(sf_cursor, table.name, max_id)
+            if snapshot is not None:
+                snapshot = committed_reference_after(sf_cursor, table, snapshot)
+                watermark_table.advance(sf_cursor, reference_snapshot_key(table), snapshot)
+        if staging_table is not None:
+            sf_cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+
+    if watermarks is not None:
+        watermarks.set(table.name, max_id)
+        if snapshot is not None:
+            watermarks.set(reference_snapshot_key(table), snapshot)
+    logger.info(f"Loaded {row_count} rows into {table.name} from {len(staged)} partitions, watermark {max_id}")
+    return row_count
+
+
+def commit_change_partitions(pg_conn, sf_conn, table: TableConfig, run_key: str, staged: List[Dict[str, Any]],
+                             watermarks: Optional[WatermarkStore] = None, schema: Optional[TableSchema] = None,
+                             metrics: Optional[LoadMetrics] = None) -> int:
+    """Apply every partition of a change set staged for the run with one MERGE, advancing the watermark with it.
+
+    The files staged by these partitions are copied into the temporary <table>_CHANGES table first. When the watermark
+    committed in Snowflake is past the one the plan started from (a lagging watermark store),
+    the rows the target already holds at the same or a later version are dropped from that table
+    before the MERGE. The version is compared rather than the watermark, which rows first
+    referenced since the last load are below.
+    """
+    metrics = metrics if metrics is not None else LoadMetrics(table.name, task='commit_partitions')
+    row_count = sum(partition['rows'] for partition in staged)
+    if not row_count:
+        logger.info(f"No partitions staged for {table.name}")
+        return 0
+    changed_after, changed_upto = staged[0]['changed_after'], staged[0]['changed_upto']
+
+    schema = resolve_schema(pg_conn, table, schema)
+    columns = schema.column_names
+    writer = make_writer(table, schema, metrics)
+    with sf_conn.cursor() as sf_cursor:
+        watermark_table.create_if_missing(sf_cursor)
+        staging_table = create_staging_table(sf_cursor, table.name)
+        with transaction(sf_cursor, metrics):
+            committed = read_committed(sf_cursor, table)
+            # Rows first referenced since the last load sit below the watermark, so only tables
+            # without a reference snapshot can tell from the watermark alone that nothing is left
+            if committed is not None and committed >= changed_upto and staged[0].get('referenced_upto') is None:
+                logger.info(f"{table.name} changes of {run_key} were already committed up to {committed}")
+                row_count = 0
+                changed_upto = committed
+            else:
+                writer.copy_staged(
+                    sf_cursor, staging_table, columns, stage_path=partition_stage_path(run_key),
+                    files=staged_files(staged), stage_table=table.name,
+                )
+                if committed is not None and (changed_after is None or committed > changed_after):
+                    logger.info(
+                        f"{table.name} changes of {run_key} start after {changed_after} but {committed} is "
+                        f"already committed, applying only the rows the target doesn't hold yet"
+                    )
+                    sf_cursor.execute(
+                        f"DELETE FROM {staging_table} WHERE EXISTS (SELECT 1 FROM {table.name} t "
+                        f"WHERE t.{table.primary_key} = {staging_table}.{table.primary_key} "
+                        f"AND COALESCE(t.{table.updated_at_column}, t.{table.created_at_column}) >= "
+                        f"COALESCE({staging_table}.{table.updated_at_column}, {staging_table}.{table.created_at_column}))"
+                    )
+                    row_count -= sf_cursor.rowcount
+                with metrics.phase('load'):
+                    merge_from_staging(sf_cursor, table.name, staging_table, columns, table.primary_key)
+                metrics.rows += row_count
+                if committed is not None and committed > changed_upto:
+                    changed_upto = committed
+                watermark_table.advance(sf_cursor, table.name, changed_upto)
+        sf_cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+
+    if watermarks is not None:
+        watermarks.set(table.name, changed_upto)
+        if staged[0].get('referenced_upto') is not None:
+            watermarks.set(reference_snapshot_key(table), staged[0]['referenced_upto'])
+    logger.info(f"Merged {row_count} changed rows into {table.name} from {len(staged)} partitions, "
+                f"watermark {changed_upto}")
+    return row_count
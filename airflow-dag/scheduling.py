@@ -0,0 +1,104 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from ingestion_config import TableConfig
+
+
+def topological_order(tables: Sequence[TableConfig]) -> List[TableConfig]:
+    """Order tables so every table comes after the tables it depends on.
+
+    Raises ValueError on unknown dependencies or cycles.
+    """
+    by_name = {table.name: table for table in tables}
+    for table in tables:
+        unknown = set(table.depends_on) - set(by_name)
+        if unknown:
+            raise ValueError(f"Table {table.name} depends on unconfigured tables: {', '.join(sorted(unknown))}")
+
+    ordered: List[TableConfig] = []
+    visiting, done = set(), set()
+
+    def visit(name: str, path: Tuple[str, ...]):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle between tables: {' -> '.join(path + (name,))}")
+        visiting.add(name)
+        for parent in by_name[name].depends_on:
+            visit(parent, path + (name,))
+        visiting.discard(name)
+        done.add(name)
+        ordered.append(by_name[name])
+
+    for table in tables:
+        visit(table.name, ())
+    return ordered
+
+
+def critical_path(durations: Dict[str, float], dependencies: Dict[str, Sequence[str]]) -> Tuple[List[str], float]:
+    """Longest chain of dependent tables, weighted by each table's duration in seconds.
+
+    dbt/scripts/analyze_run_results.py keeps a copy for dbt models; change both together.
+    """
+    finish: Dict[str, float] = {}
+    previous: Dict[str, str] = {}
+
+    def finish_time(name: str) -> float:
+        if name not in finish:
+            parents = [p for p in dependencies.get(name, ()) if p in durations]
+            start = 0.0
+            for parent in parents:
+                if finish_time(parent) > start:
+                    start = finish_time(parent)
+                    previous[name] = parent
+            finish[name] = start + durations[name]
+        return finish[name]
+
+    if not durations:
+        return [], 0.0
+    last = max(durations, key=finish_time)
+    path = [last]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    return list(reversed(path)), finish[last]
+
+
+def table_spans(task_instances, task_tables: Dict[str, str]) -> Dict[str, Tuple[datetime, datetime]]:
+    """Wall-clock (start, end) of each table's tasks, from task instances that have both dates."""
+    spans: Dict[str, Tuple[datetime, datetime]] = {}
+    for ti in task_instances:
+        table_name = task_tables.get(ti.task_id)
+        if table_name is None or ti.start_date is None or ti.end_date is None:
+            continue
+        start, end = spans.get(table_name, (ti.start_date, ti.end_date))
+        spans[table_name] = (min(start, ti.start_date), max(end, ti.end_date))
+    return spans
+
+
+def critical_path_report(task_instances, tables: Sequence[TableConfig], task_tables: Dict[str, str]) -> Dict:
+    """Per-table timings of a DAG run plus the chain of dependent tables that bounded it."""
+    spans = table_spans(task_instances, task_tables)
+    durations = {name: (end - start).total_seconds() for name, (start, end) in spans.items()}
+    path, path_seconds = critical_path(durations, {table.name: table.depends_on for table in tables})
+
+    run_seconds = 0.0
+    if spans:
+        run_seconds = (max(end for _, end in spans.values()) - min(start for start, _ in spans.values())).total_seconds()
+
+    return {
+        'tables': {
+            name: {'start': start.isoformat(), 'end': end.isoformat(), 'seconds': durations[name]}
+            for name, (start, end) in spans.items()
+        },
+        'critical_path': path,
+        'critical_path_seconds': path_seconds,
+        'run_seconds': run_seconds,
+    }
+
+
+def dbt_selection(rows_loaded: Dict[str, Optional[int]], source_name: str = 'sources') -> str:
+    """dbt --select value covering every model downstream of a table that loaded rows.
+
+    Tables that loaded nothing are left out, so an empty string means there is nothing to build.
+    """
+    changed = sorted(name for name, rows in rows_loaded.items() if rows)
+    return ' '.join(f'source:{source_name}.{name}+' for name in changed)
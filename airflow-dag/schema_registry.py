@@ -0,0 +1,187 @@
+"""Column metadata of the source tables, cached across runs.
+
+Each table's columns (in ordinal order), types and primary key are kept in a store together with
+a fingerprint of the column list. One catalog query per run is enough to tell which tables
+changed; load tasks read the cached schema and never query information_schema themselves.
+"""
+import hashlib
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaDriftError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    name: str
+    data_type: str
+    numeric_precision: Optional[int] = None
+    numeric_scale: Optional[int] = None
+
+
+@dataclass
+class TableSchema:
+    table_name: str
+    columns: List[ColumnSpec]
+    primary_key: List[str] = field(default_factory=list)
+
+    @property
+    def column_names(self) -> List[str]:
+        return [column.name for column in self.columns]
+
+    @property
+    def fingerprint(self) -> str:
+        signature = ','.join(
+            f'{c.name}:{c.data_type}:{c.numeric_precision}:{c.numeric_scale}' for c in self.columns
+        )
+        return hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), 'fingerprint': self.fingerprint}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TableSchema':
+        return cls(
+            table_name=data['table_name'],
+            columns=[ColumnSpec(**column) for column in data['columns']],
+            primary_key=list(data.get('primary_key', [])),
+        )
+
+
+@dataclass
+class SchemaDrift:
+    table_name: str
+    added: List[ColumnSpec]
+    removed: List[str]
+    retyped: List[str]
+    current: TableSchema
+
+    def __str__(self) -> str:
+        parts = []
+        if self.added:
+            parts.append(f"added {', '.join(c.name for c in self.added)}")
+        if self.removed:
+            parts.append(f"removed {', '.join(self.removed)}")
+        if self.retyped:
+            parts.append(f"changed type of {', '.join(self.retyped)}")
+        return f"{self.table_name}: {'; '.join(parts)}"
+
+
+def fetch_columns(pg_conn, table_names: Sequence[str]) -> Dict[str, TableSchema]:
+    """Columns of every table in table_names, in ordinal order, with a single catalog query."""
+    names = ', '.join(f"'{name}'" for name in table_names)
+    schemas = {name: TableSchema(name, []) for name in table_names}
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"SELECT table_name, column_name, data_type, numeric_precision, numeric_scale "
+            f"FROM information_schema.columns WHERE table_name IN ({names}) "
+            f"ORDER BY table_name, ordinal_position"
+        )
+        for table_name, column_name, data_type, precision, scale in pg_cursor.fetchall():
+            schemas[table_name].columns.append(ColumnSpec(column_name, data_type, precision, scale))
+    return schemas
+
+
+def fetch_primary_keys(pg_conn, table_names: Sequence[str]) -> Dict[str, List[str]]:
+    names = ', '.join(f"'{name}'" for name in table_names)
+    primary_keys: Dict[str, List[str]] = {name: [] for name in table_names}
+    with pg_conn.cursor() as pg_cursor:
+        pg_cursor.execute(
+            f"SELECT kcu.table_name, kcu.column_name "
+            f"FROM information_schema.table_constraints tc "
+            f"JOIN information_schema.key_column_usage kcu "
+            f"ON tc.constraint_name = kcu.constraint_name AND tc.table_name = kcu.table_name "
+            f"WHERE tc.constraint_type = 'PRIMARY KEY' AND tc.table_name IN ({names}) "
+            f"ORDER BY kcu.table_name, kcu.ordinal_position"
+        )
+        for table_name, column_name in pg_cursor.fetchall():
+            primary_keys[table_name].append(column_name)
+    return primary_keys
+
+
+def snowflake_type(column: ColumnSpec) -> str:
+    """Snowflake column type for a Postgres column, used when new source columns are added to the target."""
+    data_type = column.data_type.lower()
+    if data_type in ('smallint', 'integer', 'bigint'):
+        return 'NUMBER(38,0)'
+    if data_type == 'numeric':
+        return f'NUMBER({column.numeric_precision},{column.numeric_scale or 0})' if column.numeric_precision else 'FLOAT'
+    if data_type in ('real', 'double precision'):
+        return 'FLOAT'
+    if data_type == 'boolean':
+        return 'BOOLEAN'
+    if data_type == 'date':
+        return 'DATE'
+    if data_type.startswith('timestamp'):
+        return 'TIMESTAMP_TZ' if 'with time zone' in data_type else 'TIMESTAMP_NTZ'
+    return 'VARCHAR'
+
+
+def diff_schemas(cached: TableSchema, current: TableSchema) -> SchemaDrift:
+    cached_columns = {c.name: c for c in cached.columns}
+    current_columns = {c.name: c for c in current.columns}
+    return SchemaDrift(
+        table_name=current.table_name,
+        added=[c for c in current.columns if c.name not in cached_columns],
+        removed=[name for name in cached_columns if name not in current_columns],
+        retyped=[
+            name for name, column in current_columns.items()
+            if name in cached_columns and cached_columns[name] != column
+        ],
+        current=current,
+    )
+
+
+class SchemaRegistry:
+    """Cached TableSchema per table, kept in a key-value store such as the ones in watermarks.py."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, table_name: str) -> TableSchema:
+        data = self.store.get(table_name)
+        if data is None:
+            raise ValueError(f"No cached schema for {table_name}. Run the schema check first.")
+        return TableSchema.from_dict(data)
+
+    def register(self, schema: TableSchema, source_fingerprint: Optional[str] = None):
+        """Cache schema as the columns to load.
+
+        source_fingerprint is the fingerprint of the live source when it differs from the loaded
+        columns (drift that was ignored), so the same drift is not reported again on every run.
+        """
+        data = schema.to_dict()
+        if source_fingerprint is not None:
+            data['source_fingerprint'] = source_fingerprint
+        self.store.set(schema.table_name, data)
+
+    def check(self, pg_conn, table_names: Sequence[str]) -> Dict[str, Optional[SchemaDrift]]:
+        """Compare the live catalog with the cache in one round trip.
+
+        Tables seen for the first time are registered right away and reported with a None drift.
+        Tables whose fingerprint changed are reported with their drift and left for the caller to
+        resolve. Unchanged tables are not reported.
+        """
+        current = fetch_columns(pg_conn, table_names)
+        changed: Dict[str, Optional[SchemaDrift]] = {}
+        new_tables = []
+        for table_name in table_names:
+            cached = self.store.get(table_name)
+            if cached is None:
+                new_tables.append(table_name)
+            elif cached.get('source_fingerprint', cached.get('fingerprint')) != current[table_name].fingerprint:
+                changed[table_name] = diff_schemas(TableSchema.from_dict(cached), current[table_name])
+
+        if new_tables or changed:
+            primary_keys = fetch_primary_keys(pg_conn, new_tables + list(changed))
+            for table_name, primary_key in primary_keys.items():
+                current[table_name].primary_key = primary_key
+            for table_name in new_tables:
+                self.register(current[table_name])
+                changed[table_name] = None
+        return changed
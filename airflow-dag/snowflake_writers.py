@@ -0,0 +1,280 @@
+import csv
+import gzip
+import itertools
+import logging
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional, Sequence
+from ingestion_metrics import LoadMetrics
+from schema_registry import ColumnSpec
+
+logger = logging.getLogger(__name__)
+
+# Marker written for NULLs in staged CSV files, so empty strings survive the round trip
+CSV_NULL = '\\N'
+
+
+class SnowflakeWriter(ABC):
+    def __init__(self, metrics: Optional[LoadMetrics] = None):
+        self.metrics = metrics if metrics is not None else LoadMetrics()
+
+    @abstractmethod
+    def write(self, cursor, table_name: str, columns: List[str], chunks: Iterable[List[Sequence[Any]]]) -> int:
+        """Write chunks of rows into table_name and return how many rows were written."""
+        pass
+
+
+class InsertWriter(SnowflakeWriter):
+    """Row-by-row INSERT, one statement per row."""
+
+    def write(self, cursor, table_name: str, columns: List[str], chunks: Iterable[List[Sequence[Any]]]) -> int:
+        columns_list_str = ', '.join(columns)
+        placeholders = ', '.join(['%s'] * len(columns))
+        insert_query = f"INSERT INTO {table_name} ({columns_list_str}) VALUES ({placeholders})"
+
+        row_count = 0
+        with self.metrics.phase('load'):
+            for chunk in chunks:
+                for row in chunk:
+                    cursor.execute(insert_query, row)
+                row_count += len(chunk)
+        return row_count
+
+
+class BatchWriter(SnowflakeWriter):
+    """Multi-row INSERTs: one executemany per batch_size rows.
+
+    The Snowflake connector rewrites an executemany INSERT into a single multi-row VALUES statement,
+    so a table of N rows costs N / batch_size round trips instead of N, without staging a file.
+    """
+
+    def __init__(self, batch_size: int = 1_000, metrics: Optional[LoadMetrics] = None):
+        super().__init__(metrics)
+        self.batch_size = batch_size
+
+    def write(self, cursor, table_name: str, columns: List[str], chunks: Iterable[List[Sequence[Any]]]) -> int:
+        columns_list_str = ', '.join(columns)
+        placeholders = ', '.join(['%s'] * len(columns))
+        insert_query = f"INSERT INTO {table_name} ({columns_list_str}) VALUES ({placeholders})"
+
+        row_count = 0
+        with self.metrics.phase('load'):
+            for chunk in chunks:
+                for start in range(0, len(chunk), self.batch_size):
+                    cursor.executemany(insert_query, chunk[start:start + self.batch_size])
+                row_count += len(chunk)
+        return row_count
+
+
+def write_csv_gz(path: str, chunks: Iterable[List[Sequence[Any]]]) -> int:
+    """Write chunks of rows to a gzipped CSV file and return the row count."""
+    row_count = 0
+    with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        for chunk in chunks:
+            writer.writerows([CSV_NULL if value is None else value for value in row] for row in chunk)
+            row_count += len(chunk)
+    return row_count
+
+
+def arrow_type(column: ColumnSpec):
+    import pyarrow as pa
+    data_type = column.data_type.lower()
+    if data_type in ('smallint', 'integer', 'bigint'):
+        return pa.int64()
+    if data_type == 'numeric':
+        return pa.decimal128(column.numeric_precision or 38, column.numeric_scale or 0) \
+            if column.numeric_precision else pa.float64()
+    if data_type in ('real', 'double precision'):
+        return pa.float64()
+    if data_type == 'boolean':
+        return pa.bool_()
+    if data_type == 'date':
+        return pa.date32()
+    if data_type.startswith('timestamp'):
+        return pa.timestamp('us', tz='UTC' if 'with time zone' in data_type else None)
+    return pa.string()
+
+
+def _arrow_value(value: Any, column: ColumnSpec) -> Any:
+    """Coerce driver values (or the strings SQLite returns) to what the column's Arrow type accepts."""
+    if value is None:
+        return None
+    data_type = column.data_type.lower()
+    if data_type == 'numeric' and column.numeric_precision and not isinstance(value, Decimal):
+        return Decimal(str(value)).quantize(Decimal(1).scaleb(-(column.numeric_scale or 0)))
+    if data_type.startswith('timestamp') and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if data_type == 'date' and isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def write_parquet(path: str, chunks: Iterable[List[Sequence[Any]]], columns: List[ColumnSpec]) -> int:
+    """Write chunks of rows to a Parquet file typed from the cached column specs; returns the row count."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(column.name, arrow_type(column)) for column in columns])
+    row_count = 0
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            arrays = [
+                pa.array([_arrow_value(row[i], column) for row in chunk], type=schema.field(i).type)
+                for i, column in enumerate(columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            row_count += len(chunk)
+    return row_count
+
+
+class CopyWriter(SnowflakeWriter):
+    """Stage rows as a gzipped CSV (or typed Parquet) in the table stage and load them with one PUT + COPY INTO.
+
+    Parquet needs the column specs from the schema registry and the optional pyarrow package.
+    """
+
+    def __init__(self, staging_dir: Optional[str] = None, file_format: str = 'csv',
+                 columns: Optional[List[ColumnSpec]] = None, metrics: Optional[LoadMetrics] = None):
+        super().__init__(metrics)
+        if file_format not in ('csv', 'parquet'):
+            raise ValueError(f"Staging format {file_format} not supported. Use csv, parquet")
+        if file_format == 'parquet' and not columns:
+            raise ValueError("Parquet staging needs the column specs of the table")
+        self.staging_dir = staging_dir
+        self.file_format = file_format
+        self.columns = columns
+
+    @property
+    def file_extension(self) -> str:
+        return 'parquet' if self.file_format == 'parquet' else 'csv.gz'
+
+    def write(self, cursor, table_name: str, columns: List[str], chunks: Iterable[List[Sequence[Any]]]) -> int:
+        file_name = f'{table_name}_{uuid.uuid4().hex}.{self.file_extension}'
+        row_count = self.stage(cursor, table_name, chunks, file_name)
+        if row_count:
+            self.copy_staged(cursor, table_name, columns, files=[file_name])
+        return row_count
+
+    def stage(self, cursor, table_name: str, chunks: Iterable[List[Sequence[Any]]],
+              file_name: str, stage_path: str = '') -> int:
+        """PUT the rows as file_name under @%table_name/stage_path without loading them."""
+        with tempfile.TemporaryDirectory(dir=self.staging_dir) as tmp_dir:
+            path = os.path.join(tmp_dir, file_name)
+            with self.metrics.phase('transform'):
+                if self.file_format == 'parquet':
+                    row_count = write_parquet(path, chunks, self.columns)
+                else:
+                    row_count = write_csv_gz(path, chunks)
+            if not row_count:
+                return 0
+
+            logger.info(f"Staging {row_count} rows of {table_name} in {file_name}")
+            self.metrics.bytes += os.path.getsize(path)
+            with self.metrics.phase('stage'):
+                cursor.execute(
+                    f"PUT 'file://{path}' {self.stage_location(table_name, stage_path)} "
+                    f"AUTO_COMPRESS=FALSE OVERWRITE=TRUE"
+                )
+            return row_count
+
+    def copy_staged(self, cursor, table_name: str, columns: List[str],
+                    stage_path: str = '', files: Optional[List[str]] = None, stage_table: Optional[str] = None):
+        """COPY INTO table_name every file staged under stage_path (or only `files`) and purge them.
+
+        Files are read from the stage of stage_table when given (e.g. to load another table's
+        staged files into a temporary table), otherwise from table_name's own stage.
+        """
+        columns_list_str = ', '.join(columns)
+        files_clause = f"FILES = ({', '.join(repr(f) for f in files)}) " if files else ''
+        if self.file_format == 'parquet':
+            file_columns = ', '.join(f'$1:{column}' for column in columns)
+            file_format = "FILE_FORMAT = (TYPE = PARQUET) "
+        else:
+            file_columns = ', '.join(f'${i}' for i in range(1, len(columns) + 1))
+            file_format = (
+                "FILE_FORMAT = (TYPE = CSV COMPRESSION = GZIP FIELD_OPTIONALLY_ENCLOSED_BY = '\"' "
+                "NULL_IF = ('\\\\N') EMPTY_FIELD_AS_NULL = FALSE) "
+            )
+        with self.metrics.phase('load'):
+            cursor.execute(
+                f"COPY INTO {table_name} ({columns_list_str}) "
+                f"FROM (SELECT {file_columns} FROM {self.stage_location(stage_table or table_name, stage_path)}) "
+                f"{files_clause}"
+                f"{file_format}"
+                f"PURGE = TRUE"
+            )
+
+    @staticmethod
+    def stage_location(table_name: str, stage_path: str = '') -> str:
+        return f"@%{table_name}/{stage_path.strip('/')}/" if stage_path else f"@%{table_name}"
+
+
+class AutoWriter(SnowflakeWriter):
+    """Pick the writer from the size of the load: batched INSERTs below threshold rows, PUT + COPY INTO above.
+
+    Up to threshold rows are buffered to decide, so the choice costs no extra COUNT query.
+    """
+
+    def __init__(self, small: SnowflakeWriter, large: SnowflakeWriter, threshold: int = 50_000,
+                 metrics: Optional[LoadMetrics] = None):
+        super().__init__(metrics)
+        self.small = small
+        self.large = large
+        self.threshold = threshold
+
+    def write(self, cursor, table_name: str, columns: List[str], chunks: Iterable[List[Sequence[Any]]]) -> int:
+        chunks = iter(chunks)
+        peeked, peeked_rows = [], 0
+        for chunk in chunks:
+            peeked.append(chunk)
+            peeked_rows += len(chunk)
+            if peeked_rows >= self.threshold:
+                break
+
+        writer = self.large if peeked_rows >= self.threshold else self.small
+        logger.info(
+            f"{'At least' if writer is self.large else 'Only'} {peeked_rows} rows for {table_name}, "
+            f"writing them with {type(writer).__name__}"
+        )
+        return writer.write(cursor, table_name, columns, itertools.chain(peeked, chunks))
+
+
+def create_staging_table(cursor, table_name: str) -> str:
+    """Create an empty temporary copy of table_name for a set-based MERGE and return its name.
+
+    DDL commits the open transaction in Snowflake, so call it before BEGIN.
+    """
+    staging_table = f'{table_name}_CHANGES'
+    cursor.execute(f"CREATE OR REPLACE TEMPORARY TABLE {staging_table} LIKE {table_name}")
+    return staging_table
+
+
+def merge_from_staging(cursor, table_name: str, staging_table: str, columns: List[str], primary_key: str):
+    """Upsert every row of staging_table into table_name with one MERGE statement."""
+    update_set = ', '.join(f'{column} = s.{column}' for column in columns if column.lower() != primary_key.lower())
+    cursor.execute(
+        f"MERGE INTO {table_name} t USING {staging_table} s ON t.{primary_key} = s.{primary_key} "
+        f"WHEN MATCHED THEN UPDATE SET {update_set} "
+        f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) VALUES ({', '.join(f's.{c}' for c in columns)})"
+    )
+
+
+class WriterFactory:
+    _writers = {
+        'insert': InsertWriter,
+        'batch': BatchWriter,
+        'copy': CopyWriter,
+        'auto': AutoWriter,
+    }
+
+    @classmethod
+    def create(cls, load_mode: str, **kwargs) -> SnowflakeWriter:
+        load_mode = load_mode.lower()
+        if load_mode not in cls._writers:
+            raise ValueError(f"Load mode {load_mode} not supported. Use {', '.join(cls._writers.keys())}")
+        return cls._writers[load_mode](**kwargs)
@@ -0,0 +1,79 @@
+"""High-water marks of the postgres_to_snowflake loads.
+
+The authoritative copy lives in a small Snowflake table and is advanced in the same transaction
+as the load, so a load and its watermark commit or roll back together. A mirror in Airflow
+Variables lets the DAG find where the last run stopped without running a query on a warehouse.
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_TABLE = 'INGESTION_WATERMARKS'
+
+
+class WatermarkStore(ABC):
+    @abstractmethod
+    def get(self, table_name: str) -> Optional[Any]:
+        pass
+
+    @abstractmethod
+    def set(self, table_name: str, value: Any):
+        pass
+
+
+class AirflowVariableWatermarkStore(WatermarkStore):
+    """Watermarks kept as JSON Airflow Variables; reading them only touches the Airflow metadata DB."""
+
+    def __init__(self, prefix: str = 'postgres_to_snowflake_watermark_'):
+        self.prefix = prefix
+
+    def get(self, table_name: str) -> Optional[Any]:
+        from airflow.models import Variable
+        return Variable.get(f'{self.prefix}{table_name}', default_var=None, deserialize_json=True)
+
+    def set(self, table_name: str, value: Any):
+        from airflow.models import Variable
+        Variable.set(f'{self.prefix}{table_name}', value, serialize_json=True)
+
+
+class InMemoryWatermarkStore(WatermarkStore):
+    """Process-local watermarks for offline runs against the local stand-ins."""
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None):
+        self.values = dict(values or {})
+
+    def get(self, table_name: str) -> Optional[Any]:
+        return self.values.get(table_name)
+
+    def set(self, table_name: str, value: Any):
+        self.values[table_name] = value
+
+
+class SnowflakeWatermarkTable:
+    """Watermark table in Snowflake, read and written on the load's own cursor and transaction."""
+
+    def __init__(self, table_name: str = WATERMARK_TABLE):
+        self.table_name = table_name
+
+    def create_if_missing(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table_name} ("
+            f"TABLE_NAME VARCHAR PRIMARY KEY, HIGH_WATER_MARK VARCHAR, UPDATED_AT TIMESTAMP_NTZ)"
+        )
+
+    def read(self, cursor, table_name: str) -> Optional[Any]:
+        cursor.execute(f"SELECT HIGH_WATER_MARK FROM {self.table_name} WHERE TABLE_NAME = %s", (table_name,))
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    def advance(self, cursor, table_name: str, value: Any):
+        """Replace the table's watermark. Call inside the load's transaction."""
+        cursor.execute(f"DELETE FROM {self.table_name} WHERE TABLE_NAME = %s", (table_name,))
+        cursor.execute(
+            f"INSERT INTO {self.table_name} (TABLE_NAME, HIGH_WATER_MARK, UPDATED_AT) "
+            f"VALUES (%s, %s, CURRENT_TIMESTAMP)",
+            (table_name, json.dumps(value)),
+        )
@@ -0,0 +1,13 @@
+{% macro incremental_cutoff(column, lookback_days) %}
+    {#- MAX(column) of the model being built, minus lookback_days, rendered as a timestamp literal.
+        A literal (rather than a subquery) lets Snowflake prune micro-partitions at compile time. -#}
+    {%- set query -%}
+        SELECT DATEADD(day, -{{ lookback_days }}, MAX({{ column }})) FROM {{ this }}
+    {%- endset -%}
+    {%- set cutoff = run_query(query).columns[0].values()[0] if execute else none -%}
+    {%- if cutoff is none -%}
+        '1900-01-01'::TIMESTAMP_NTZ
+    {%- else -%}
+        '{{ cutoff }}'::TIMESTAMP_NTZ
+    {%- endif -%}
+{% endmacro %}
@@ -0,0 +1,16 @@
+{% macro snowflake__set_query_tag() -%}
+    {#- Tag every model's queries with dbt:<model name> (or its query_tag config), so they can be
+        found in QUERY_HISTORY by report_pruning. Returns the session's previous tag. -#}
+    {%- set new_query_tag = config.get('query_tag') or 'dbt:' ~ model.name -%}
+    {%- set original_query_tag = get_current_query_tag() -%}
+    {%- do run_query("alter session set query_tag = '{}'".format(new_query_tag)) -%}
+    {{ return(original_query_tag) }}
+{%- endmacro %}
+
+{% macro snowflake__unset_query_tag(original_query_tag) -%}
+    {%- if original_query_tag -%}
+        {%- do run_query("alter session set query_tag = '{}'".format(original_query_tag)) -%}
+    {%- else -%}
+        {%- do run_query("alter session unset query_tag") -%}
+    {%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,42 @@
+{% macro report_pruning(days=1, models='analise_vendas_%,agg_vendas_%,mart_vendas,fct_vendas') %}
+    {#- Partition pruning of the queries dbt ran for the given models over the last `days` days,
+        from their dbt:<model> query tags. A low scanned / total ratio means clustering pays off.
+        ACCOUNT_USAGE lags by up to 45 minutes, so very recent runs may be missing.
+
+        dbt run-operation report_pruning --args '{days: 7, models: "analise_vendas_%"}'
+    -#}
+    {%- set tag_filters = [] -%}
+    {%- for pattern in models.split(',') -%}
+        {%- do tag_filters.append("query_tag ILIKE 'dbt:" ~ pattern | trim ~ "'") -%}
+    {%- endfor -%}
+    {%- set query -%}
+        SELECT
+            SUBSTR(query_tag, 5) AS model,
+            COUNT(*) AS queries,
+            SUM(partitions_scanned) AS partitions_scanned,
+            SUM(partitions_total) AS partitions_total,
+            SUM(partitions_scanned) / NULLIF(SUM(partitions_total), 0) AS scanned_ratio,
+            SUM(bytes_scanned) AS bytes_scanned,
+            SUM(total_elapsed_time) / 1000 AS seconds
+        FROM snowflake.account_usage.query_history
+        WHERE start_time >= DATEADD(day, -{{ days }}, CURRENT_TIMESTAMP())
+          AND query_type IN ('SELECT', 'INSERT', 'MERGE', 'DELETE', 'CREATE_TABLE_AS_SELECT')
+          AND ({{ tag_filters | join(' OR ') }})
+        GROUP BY model
+        ORDER BY partitions_scanned DESC
+    {%- endset -%}
+    {%- if execute -%}
+        {%- set results = run_query(query) -%}
+        {{ log('model                          queries    scanned      total   ratio        bytes   seconds', info=True) }}
+        {%- for row in results.rows -%}
+            {{ log('%-30s %7d %10d %10d %7s %12d %9.1f' | format(
+                row[0], row[1], row[2] or 0, row[3] or 0,
+                '-' if row[4] is none else '%.1f%%' | format(row[4] * 100),
+                row[5] or 0, row[6] or 0
+            ), info=True) }}
+        {%- endfor -%}
+        {%- if not results.rows -%}
+            {{ log('No tagged queries found; query tags are set from the run after this macro was added', info=True) }}
+        {%- endif -%}
+    {%- endif -%}
+{% endmacro %}
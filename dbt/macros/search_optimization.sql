@@ -0,0 +1,8 @@
+{% macro add_search_optimization(columns) %}
+    {#- Post-hook: equality search optimization on the given columns of the model just built.
+        Rendered empty (and skipped) unless var('search_optimization') is true, since the feature
+        needs Enterprise Edition. Run on every build, as a full refresh recreates the table. -#}
+    {%- if var('search_optimization', false) -%}
+        ALTER TABLE {{ this }} ADD SEARCH OPTIMIZATION ON EQUALITY({{ columns | join(', ') }})
+    {%- endif -%}
+{% endmacro %}
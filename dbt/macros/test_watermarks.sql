@@ -0,0 +1,67 @@
+{% macro test_watermarks_relation() %}
+    {#- Where incremental data tests keep their state: one row per test with the watermark it last
+        passed at and when it last passed a full sweep. -#}
+    {{ return(api.Relation.create(database=target.database, schema=target.schema, identifier='DBT_TEST_WATERMARKS')) }}
+{% endmacro %}
+
+
+{% macro test_cutoff(test_name) %}
+    {#- Timestamp from which test_name should check rows: its stored watermark less
+        test_watermark_lookback_days. none means a full sweep: no watermark yet, no full sweep in the
+        last test_full_sweep_days days, or var('test_full_sweep') set. -#}
+    {%- if not execute or var('test_full_sweep', false) -%}
+        {{ return(none) }}
+    {%- endif -%}
+    {%- set relation = test_watermarks_relation() -%}
+    {%- if adapter.get_relation(relation.database, relation.schema, relation.identifier) is none -%}
+        {{ return(none) }}
+    {%- endif -%}
+    {%- set query -%}
+        SELECT DATEADD(day, -{{ var('test_watermark_lookback_days', 3) }}, watermark)
+        FROM {{ relation }}
+        WHERE test_name = '{{ test_name }}'
+          AND watermark IS NOT NULL
+          AND full_sweep_at >= DATEADD(day, -{{ var('test_full_sweep_days', 7) }}, CURRENT_TIMESTAMP())
+    {%- endset -%}
+    {%- set rows = run_query(query).rows -%}
+    {{ return(rows[0][0] if rows else none) }}
+{% endmacro %}
+
+
+{% macro store_test_watermarks(results, tests) %}
+    {#- on-run-end: advance the watermark of every incremental test that passed in this run to the
+        current MAX(column) of its model. tests maps a test name to [model name, column]. A failing
+        test keeps its watermark, so its rows are checked again next run. -#}
+    {%- if not execute -%}
+        {{ return('') }}
+    {%- endif -%}
+    {%- set relation = test_watermarks_relation() -%}
+    {%- for result in results if result.node.resource_type == 'test' and result.status == 'pass'
+                                 and result.node.name in tests -%}
+        {%- set model_name, column = tests[result.node.name] -%}
+        {%- set model = graph.nodes.values() | selectattr('resource_type', 'equalto', 'model')
+                                             | selectattr('name', 'equalto', model_name) | first -%}
+        {%- set full_sweep = test_cutoff(result.node.name) is none -%}
+        {%- do run_query(
+            "CREATE TABLE IF NOT EXISTS " ~ relation ~ " (TEST_NAME VARCHAR, WATERMARK TIMESTAMP_NTZ, "
+            ~ "FULL_SWEEP_AT TIMESTAMP_NTZ, TESTED_AT TIMESTAMP_NTZ)"
+        ) -%}
+        {%- set merge -%}
+            MERGE INTO {{ relation }} t
+            USING (
+                SELECT '{{ result.node.name }}' AS test_name, MAX({{ column }}) AS watermark
+                FROM {{ model.database }}.{{ model.schema }}.{{ model.alias }}
+            ) s
+            ON t.test_name = s.test_name
+            WHEN MATCHED THEN UPDATE SET
+                watermark = s.watermark,
+                {% if full_sweep %}full_sweep_at = CURRENT_TIMESTAMP(),{% endif %}
+                tested_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN INSERT (test_name, watermark, full_sweep_at, tested_at)
+                VALUES (s.test_name, s.watermark, {{ 'CURRENT_TIMESTAMP()' if full_sweep else 'NULL' }}, CURRENT_TIMESTAMP())
+        {%- endset -%}
+        {%- do run_query(merge) -%}
+        {{ log('Stored the watermark of ' ~ result.node.name ~ (' after a full sweep' if full_sweep else ''), info=True) }}
+    {%- endfor -%}
+    {{ return('') }}
+{% endmacro %}
@@ -0,0 +1,45 @@
+{{ config(materialized='incremental', unique_key='mes_venda', incremental_strategy='delete+insert') }}
+{% set lookback_days = var('analise_vendas_lookback_days', 3) %}
+-- Mergeable SUM/COUNT state behind the per-dealer, per-vehicle and per-seller rollups: one row per
+-- month, dimension and key. Each run rebuilds only the months that contain a sale inserted or
+-- updated since the last run (less a lookback window), and the months such a sale moved out of
+-- (mart_vendas.mes_venda_anterior); delete+insert replaces those months whole.
+WITH vendas AS (
+    SELECT
+        DATE_TRUNC('month', v.data_venda) AS mes_venda,
+        v.veiculo_id,
+        v.concessionaria_id,
+        v.vendedor_id,
+        v.valor_venda,
+        v.data_atualizacao,
+        v.data_inclusao
+    FROM {{ ref('mart_vendas') }} v
+    {% if is_incremental() %}
+    WHERE DATE_TRUNC('month', v.data_venda) IN (
+        SELECT DATE_TRUNC('month', data_venda)
+        FROM {{ ref('mart_vendas') }}
+        WHERE data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+           OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }}
+        UNION
+        SELECT mes_venda_anterior
+        FROM {{ ref('mart_vendas') }}
+        WHERE mes_venda_anterior IS NOT NULL
+          AND (data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+               OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }})
+    )
+    {% endif %}
+)
+
+{% for dimensao in ['veiculo', 'concessionaria', 'vendedor'] %}
+SELECT
+    mes_venda,
+    '{{ dimensao }}' AS dimensao,
+    {{ dimensao }}_id AS chave,
+    COUNT(*) AS quantidade,
+    SUM(valor_venda) AS total,
+    MAX(data_atualizacao) AS data_atualizacao,
+    MAX(data_inclusao) AS data_inclusao
+FROM vendas
+GROUP BY mes_venda, {{ dimensao }}_id
+{% if not loop.last %}UNION ALL{% endif %}
+{% endfor %}
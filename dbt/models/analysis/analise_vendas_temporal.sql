@@ -1,9 +1,32 @@
-{{ config(materialized='table') }}
+{{ config(materialized='incremental', unique_key='mes_venda', incremental_strategy='delete+insert') }}
+{% set lookback_days = var('analise_vendas_lookback_days', 3) %}
+-- Each run recomputes only the months that contain a sale inserted or updated since the last
+-- run (less a lookback window), plus the months such a sale moved out of, and replaces them
+WITH vendas AS (
+    SELECT v.venda_id, v.valor_venda, v.data_venda, v.data_atualizacao, v.data_inclusao
+    FROM {{ ref('mart_vendas') }} v
+    {% if is_incremental() %}
+    WHERE DATE_TRUNC('month', v.data_venda) IN (
+        SELECT DATE_TRUNC('month', data_venda)
+        FROM {{ ref('mart_vendas') }}
+        WHERE data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+           OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }}
+        UNION
+        SELECT mes_venda_anterior
+        FROM {{ ref('mart_vendas') }}
+        WHERE mes_venda_anterior IS NOT NULL
+          AND (data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+               OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }})
+    )
+    {% endif %}
+)
+
 SELECT
-    DATE_TRUNC('month', v.data_venda) AS mes_venda,
-    COUNT(v.venda_id) AS numero_vendas,
-    SUM(v.valor_venda) AS total_vendas,
-    AVG(v.valor_venda) AS valor_medio_venda
-FROM {{ ref('fct_vendas') }} v
-GROUP BY DATE_TRUNC('month', v.data_venda)
-ORDER BY mes_venda
+    DATE_TRUNC('month', data_venda) AS mes_venda,
+    COUNT(venda_id) AS numero_vendas,
+    SUM(valor_venda) AS total_vendas,
+    SUM(valor_venda) / COUNT(venda_id) AS valor_medio_venda,
+    MAX(data_atualizacao) AS data_atualizacao,
+    MAX(data_inclusao) AS data_inclusao
+FROM vendas
+GROUP BY DATE_TRUNC('month', data_venda)
@@ -1,13 +1,20 @@
 {{ config(materialized='table') }}
+-- Rolled up from the monthly state in agg_vendas_mensal (one row per vehicle and month), not from mart_vendas
+WITH vendas AS (
+    SELECT chave AS veiculo_id, SUM(quantidade) AS quantidade, SUM(total) AS total
+    FROM {{ ref('agg_vendas_mensal') }}
+    WHERE dimensao = 'veiculo'
+    GROUP BY chave
+)
+
 SELECT
     vei.veiculo_id AS id,
     vei.nome_veiculo AS veiculo,
     vei.tipo AS tipo,
     vei.valor_sugerido AS valor_sugerido,
-    COUNT(v.venda_id) AS quantidade,
-    SUM(v.valor_venda) AS total,
-    AVG(v.valor_venda) AS valor_medio
-FROM {{ ref('fct_vendas') }} v
+    v.quantidade,
+    v.total,
+    v.total / v.quantidade AS valor_medio
+FROM vendas v
 JOIN {{ ref('dim_veiculos') }} vei ON v.veiculo_id = vei.veiculo_id
-GROUP BY vei.veiculo_id, vei.nome_veiculo, vei.tipo, vei.valor_sugerido
 ORDER BY quantidade desc
@@ -1,13 +1,20 @@
 {{ config(materialized='table') }}
+-- Rolled up from the monthly state in agg_vendas_mensal (one row per seller and month), not from mart_vendas
+WITH vendas AS (
+    SELECT chave AS vendedor_id, SUM(quantidade) AS quantidade, SUM(total) AS total
+    FROM {{ ref('agg_vendas_mensal') }}
+    WHERE dimensao = 'vendedor'
+    GROUP BY chave
+)
+
 SELECT
     ven.vendedor_id AS id,
     ven.nome_vendedor AS vendedor,
     nome_concessionaria AS concessionaria,
-    COUNT(v.venda_id) AS quantidade,
-    SUM(v.valor_venda) AS total,
-    AVG(v.valor_venda) AS valor_medio
-FROM {{ ref('fct_vendas') }} v
+    v.quantidade,
+    v.total,
+    v.total / v.quantidade AS valor_medio
+FROM vendas v
 JOIN {{ ref('dim_vendedores') }} ven ON v.vendedor_id = ven.vendedor_id
 JOIN {{ ref('dim_concessionarias') }} c ON c.concessionaria_id = ven.concessionaria_id
-GROUP BY ven.vendedor_id, ven.nome_vendedor,  c.nome_concessionaria
 ORDER BY total DESC 
@@ -1,5 +1,17 @@
-{{ config(materialized='incremental', unique_key='venda_id') }}
-WITH vendas AS (
+{{ config(materialized='incremental', unique_key='venda_id', incremental_strategy='merge') }}
+{% set lookback_days = var('fct_vendas_lookback_days', 3) %}
+-- Only sales inserted or updated since the last run (less a lookback window for late-arriving
+-- rows) are read, before joining the dimensions; MERGE on venda_id applies updates in place
+WITH stg_vendas AS (
+    SELECT *
+    FROM {{ ref('stg_vendas') }}
+    {% if is_incremental() %}
+    WHERE data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+       OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }}
+    {% endif %}
+),
+
+vendas AS (
     SELECT
         v.id_vendas AS venda_id,
         v.id_veiculos AS veiculo_id,
@@ -10,7 +22,7 @@ WITH vendas AS (
         v.data_venda,
         v.data_inclusao,
         v.data_atualizacao
-    FROM {{ ref('stg_vendas') }} v
+    FROM stg_vendas v
     JOIN {{ ref('dim_veiculos') }} vei ON v.id_veiculos = vei.veiculo_id
     JOIN {{ ref('dim_concessionarias') }} con ON v.id_concessionarias = con.concessionaria_id
     JOIN {{ ref('dim_vendedores') }} ven ON v.id_vendedores = ven.vendedor_id
@@ -28,6 +40,3 @@ SELECT
     data_inclusao,
     data_atualizacao
 FROM vendas
-{% if is_incremental() %}
-    WHERE venda_id > (SELECT MAX(venda_id) FROM {{ this }})
-{% endif %}
\ No newline at end of file
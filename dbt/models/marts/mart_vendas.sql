@@ -0,0 +1,85 @@
+{{ config(materialized='incremental', unique_key='venda_id', incremental_strategy='merge', on_schema_change='append_new_columns') }}
+{% set lookback_days = var('mart_vendas_lookback_days', 3) %}
+-- fct_vendas joined once with every dimension attribute, for the analysis models and the SQL agent.
+-- data_atualizacao_mart is the latest change among the sale and the dimension rows it joins. A run
+-- re-merges the sales changed since the last one, and the sales of every vehicle, dealership (or its
+-- city or state), salesperson or customer changed since then, so renamed attributes reach old sales.
+-- mes_venda_anterior is the month a sale was in before its data_venda moved to another month, so the
+-- monthly analysis models can rebuild the month it left as well.
+{% if is_incremental() %}
+{% set cutoff = incremental_cutoff('data_atualizacao_mart', lookback_days) %}
+{#- Tables built before mes_venda_anterior existed get it appended (on_schema_change) by this run -#}
+{% set existing_columns = adapter.get_columns_in_relation(this) | map(attribute='name') | map('lower') | list %}
+{% set carried_month = 'prev.mes_venda_anterior' if 'mes_venda_anterior' in existing_columns else 'NULL' %}
+{% endif %}
+WITH vendas AS (
+    SELECT *
+    FROM {{ ref('fct_vendas') }}
+    {% if is_incremental() %}
+    WHERE data_atualizacao >= {{ cutoff }}
+       OR data_inclusao >= {{ cutoff }}
+       OR veiculo_id IN (SELECT veiculo_id FROM {{ ref('dim_veiculos') }} WHERE data_atualizacao >= {{ cutoff }})
+       OR vendedor_id IN (SELECT vendedor_id FROM {{ ref('dim_vendedores') }} WHERE data_atualizacao >= {{ cutoff }})
+       OR cliente_id IN (SELECT cliente_id FROM {{ ref('dim_clientes') }} WHERE data_atualizacao >= {{ cutoff }})
+       OR concessionaria_id IN (
+           SELECT con.concessionaria_id
+           FROM {{ ref('dim_concessionarias') }} con
+           JOIN {{ ref('dim_cidades') }} cid ON con.cidade_id = cid.cidade_id
+           JOIN {{ ref('dim_estados') }} est ON cid.estado_id = est.estado_id
+           WHERE con.data_atualizacao >= {{ cutoff }}
+              OR cid.data_atualizacao >= {{ cutoff }}
+              OR COALESCE(est.data_atualizacao, est.data_inclusao) >= {{ cutoff }}
+       )
+    {% endif %}
+)
+
+SELECT
+    v.venda_id,
+    v.data_venda,
+    v.valor_venda,
+    v.veiculo_id,
+    vei.nome_veiculo,
+    vei.tipo,
+    vei.valor_sugerido,
+    v.concessionaria_id,
+    con.nome_concessionaria,
+    cid.cidade_id,
+    cid.nome_cidade,
+    est.estado_id,
+    est.nome_estado,
+    est.sigla,
+    v.vendedor_id,
+    ven.nome_vendedor,
+    v.cliente_id,
+    cli.nome_cliente,
+    v.data_inclusao,
+    v.data_atualizacao,
+    GREATEST(
+        v.data_atualizacao,
+        COALESCE(v.data_inclusao, v.data_atualizacao),
+        vei.data_atualizacao,
+        con.data_atualizacao,
+        cid.data_atualizacao,
+        COALESCE(est.data_atualizacao, est.data_inclusao),
+        ven.data_atualizacao,
+        cli.data_atualizacao
+    ) AS data_atualizacao_mart,
+    {% if is_incremental() %}
+    CASE
+        WHEN DATE_TRUNC('month', prev.data_venda) <> DATE_TRUNC('month', v.data_venda)
+            THEN DATE_TRUNC('month', prev.data_venda)
+        ELSE {{ carried_month }}
+    END AS mes_venda_anterior
+    {% else %}
+    NULL::TIMESTAMP_NTZ AS mes_venda_anterior
+    {% endif %}
+FROM vendas v
+JOIN {{ ref('dim_veiculos') }} vei ON v.veiculo_id = vei.veiculo_id
+JOIN {{ ref('dim_concessionarias') }} con ON v.concessionaria_id = con.concessionaria_id
+JOIN {{ ref('dim_cidades') }} cid ON con.cidade_id = cid.cidade_id
+JOIN {{ ref('dim_estados') }} est ON cid.estado_id = est.estado_id
+JOIN {{ ref('dim_vendedores') }} ven ON v.vendedor_id = ven.vendedor_id
+JOIN {{ ref('dim_clientes') }} cli ON v.cliente_id = cli.cliente_id
+{% if is_incremental() %}
+LEFT JOIN {{ this }} prev ON v.venda_id = prev.venda_id
+{% endif %}
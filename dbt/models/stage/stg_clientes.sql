@@ -1,4 +1,6 @@
-{{ config(materialized='view') }}
+{{ config(materialized='incremental', unique_key='id_clientes', incremental_strategy='merge') }}
+{% set lookback_days = var('stage_lookback_days', 3) %}
+-- Materialized so INITCAP and TRIM run once per changed customer, not in every downstream query
 WITH source AS (
     SELECT
         id_clientes,
@@ -18,3 +20,7 @@ SELECT
     data_inclusao,
     data_atualizacao
 FROM source
+{% if is_incremental() %}
+WHERE data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+   OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }}
+{% endif %}
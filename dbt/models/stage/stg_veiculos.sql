@@ -5,7 +5,7 @@ WITH source AS (
         nome,
         tipo,
         valor::DECIMAL(10,2) AS valor,
-        COALESCE(data_atualizacao, CURRENT_TIMESTAMP()) AS data_atualizacao,
+        COALESCE(data_atualizacao, data_inclusao) AS data_atualizacao,
         data_inclusao
     FROM {{ source('sources', 'veiculos') }}
 )
@@ -1,4 +1,6 @@
-{{ config(materialized='view') }}
+{{ config(materialized='incremental', unique_key='id_vendas', incremental_strategy='merge') }}
+{% set lookback_days = var('stage_lookback_days', 3) %}
+-- Materialized so the casts and COALESCE run once per changed sale, not in every downstream query
 WITH source AS (
     SELECT
         id_vendas,
@@ -24,3 +26,7 @@ SELECT
     data_inclusao,
     data_atualizacao
 FROM source
+{% if is_incremental() %}
+WHERE data_atualizacao >= {{ incremental_cutoff('data_atualizacao', lookback_days) }}
+   OR data_inclusao >= {{ incremental_cutoff('data_inclusao', lookback_days) }}
+{% endif %}
@@ -0,0 +1,189 @@
+"""Where a dbt run spent its time: per-model duration, rows affected, bytes scanned and the critical path.
+
+Usage (from dbt/, after `dbt run` or `dbt build`):
+    python scripts/analyze_run_results.py
+    python scripts/analyze_run_results.py --target-dir target --bytes-scanned --json report.json
+
+Reads target/run_results.json (timings and adapter responses) and target/manifest.json (the
+model DAG). The critical path is the chain of dependent nodes with the largest total execution
+time: no amount of parallelism (threads) makes the run shorter than it. With --bytes-scanned, the
+bytes each model's query scanned are looked up in Snowflake's INFORMATION_SCHEMA.QUERY_HISTORY by
+query id (needs snowflake-connector-python and the SNOWFLAKE_* environment variables used by the
+sql-agent); otherwise that column is left empty.
+"""
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+def load_json(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def execute_span(result: Dict[str, Any]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """(start, end) of a result's execute step."""
+    for step in result.get('timing', []):
+        if step.get('name') == 'execute':
+            return parse_time(step.get('started_at')), parse_time(step.get('completed_at'))
+    return None, None
+
+
+def model_rows(run_results: Dict[str, Any], manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One row per executed node, with its layer (folder under models/) and materialization."""
+    rows = []
+    for result in run_results['results']:
+        node = manifest['nodes'].get(result['unique_id'], {})
+        response = result.get('adapter_response') or {}
+        fqn = node.get('fqn', [])
+        rows.append({
+            'unique_id': result['unique_id'],
+            'name': node.get('name', result['unique_id'].split('.')[-1]),
+            'resource_type': node.get('resource_type', result['unique_id'].split('.')[0]),
+            'layer': fqn[1] if len(fqn) > 2 else '',
+            'materialized': node.get('config', {}).get('materialized', ''),
+            'status': result['status'],
+            'seconds': result.get('execution_time') or 0.0,
+            'rows_affected': response.get('rows_affected'),
+            'query_id': response.get('query_id'),
+            'bytes_scanned': None,
+        })
+    return rows
+
+
+# Mirrors critical_path in airflow-dag/scheduling.py, which reports the ingestion DAG's critical path.
+# dbt is deployed without airflow-dag, so the script keeps its own copy; change both together.
+def critical_path(durations: Dict[str, float], dependencies: Dict[str, Sequence[str]]) -> Tuple[List[str], float]:
+    """Longest chain of dependent nodes, weighted by each node's execution time."""
+    finish: Dict[str, float] = {}
+    previous: Dict[str, str] = {}
+
+    def finish_time(name: str) -> float:
+        if name not in finish:
+            parents = [p for p in dependencies.get(name, ()) if p in durations]
+            start = 0.0
+            for parent in parents:
+                if finish_time(parent) > start:
+                    start = finish_time(parent)
+                    previous[name] = parent
+            finish[name] = start + durations[name]
+        return finish[name]
+
+    if not durations:
+        return [], 0.0
+    last = max(durations, key=finish_time)
+    path = [last]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    return list(reversed(path)), finish[last]
+
+
+def fetch_bytes_scanned(query_ids: Sequence[str]) -> Dict[str, int]:
+    """BYTES_SCANNED of each query id, from the last 7 days of INFORMATION_SCHEMA.QUERY_HISTORY."""
+    import snowflake.connector
+
+    if not query_ids:
+        return {}
+    with snowflake.connector.connect(
+        account=os.environ['SNOWFLAKE_ACCOUNT'],
+        user=os.environ['SNOWFLAKE_USER'],
+        password=os.environ['SNOWFLAKE_PASSWORD'],
+        database=os.environ.get('SNOWFLAKE_DATABASE'),
+        warehouse=os.environ.get('SNOWFLAKE_WAREHOUSE'),
+        role=os.environ.get('SNOWFLAKE_ROLE'),
+    ) as conn, conn.cursor() as cursor:
+        placeholders = ', '.join(['%s'] * len(query_ids))
+        cursor.execute(
+            f"SELECT query_id, bytes_scanned FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY(RESULT_LIMIT => 10000)) "
+            f"WHERE query_id IN ({placeholders})",
+            list(query_ids),
+        )
+        return {query_id: bytes_scanned for query_id, bytes_scanned in cursor.fetchall()}
+
+
+def analyze(run_results: Dict[str, Any], manifest: Dict[str, Any],
+            bytes_scanned: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    rows = model_rows(run_results, manifest)
+    for row in rows:
+        if bytes_scanned and row['query_id'] in bytes_scanned:
+            row['bytes_scanned'] = bytes_scanned[row['query_id']]
+
+    durations = {row['unique_id']: row['seconds'] for row in rows}
+    dependencies = {
+        unique_id: manifest['nodes'].get(unique_id, {}).get('depends_on', {}).get('nodes', [])
+        for unique_id in durations
+    }
+    path, path_seconds = critical_path(durations, dependencies)
+
+    spans = [execute_span(result) for result in run_results['results']]
+    starts = [start for start, _ in spans if start]
+    ends = [end for _, end in spans if end]
+    layers: Dict[str, float] = {}
+    for row in rows:
+        layers[row['layer']] = layers.get(row['layer'], 0.0) + row['seconds']
+
+    return {
+        'models': sorted(rows, key=lambda row: row['seconds'], reverse=True),
+        'layers': dict(sorted(layers.items(), key=lambda item: item[1], reverse=True)),
+        'critical_path': path,
+        'critical_path_seconds': path_seconds,
+        'node_seconds': sum(durations.values()),
+        'run_seconds': (max(ends) - min(starts)).total_seconds() if starts and ends else None,
+        'elapsed_time': run_results.get('elapsed_time'),
+    }
+
+
+def print_report(report: Dict[str, Any], top: int):
+    node_seconds = report['node_seconds'] or 1.0
+    print(f"{'node':<36} {'layer':<12} {'materialized':<12} {'status':<8} {'seconds':>8} {'share':>6} "
+          f"{'rows':>10} {'bytes scanned':>14}")
+    for row in report['models'][:top]:
+        rows = '' if row['rows_affected'] is None else row['rows_affected']
+        scanned = '' if row['bytes_scanned'] is None else row['bytes_scanned']
+        print(f"{row['name']:<36} {row['layer']:<12} {row['materialized']:<12} {row['status']:<8} "
+              f"{row['seconds']:>8.2f} {row['seconds'] / node_seconds:>6.1%} {rows:>10} {scanned:>14}")
+
+    print()
+    print('Seconds per layer:')
+    for layer, seconds in report['layers'].items():
+        print(f"  {layer or '(root)':<12} {seconds:>8.2f} {seconds / node_seconds:>6.1%}")
+
+    print()
+    run_seconds = report['run_seconds']
+    print(f"Critical path ({report['critical_path_seconds']:.2f}s"
+          + (f" of a {run_seconds:.2f}s run" if run_seconds is not None else '') + '):')
+    print('  ' + ' -> '.join(unique_id.split('.')[-1] for unique_id in report['critical_path']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target-dir', default='target')
+    parser.add_argument('--top', type=int, default=20, help='nodes listed, slowest first')
+    parser.add_argument('--bytes-scanned', action='store_true', help='look up bytes scanned in Snowflake')
+    parser.add_argument('--json', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    run_results = load_json(os.path.join(args.target_dir, 'run_results.json'))
+    manifest = load_json(os.path.join(args.target_dir, 'manifest.json'))
+    bytes_scanned = None
+    if args.bytes_scanned:
+        query_ids = [row['query_id'] for row in model_rows(run_results, manifest) if row['query_id']]
+        bytes_scanned = fetch_bytes_scanned(query_ids)
+
+    report = analyze(run_results, manifest, bytes_scanned)
+    print_report(report, args.top)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+-- dbt test
+-- Sales priced outside 95%-100% of the vehicle's suggested price, counted per vehicle. Only sales
+-- loaded or changed (including a changed suggested price) since the last passing run are checked;
+-- a full sweep runs every test_full_sweep_days days or with --vars '{test_full_sweep: true}'.
+{{ config(fail_calc='COALESCE(SUM(violacoes), 0)') }}
+{% set cutoff = test_cutoff('test_vendas_preco') %}
+WITH vendas AS (
+    SELECT veiculo_id, nome_veiculo, valor_sugerido, valor_venda
+    FROM {{ ref('mart_vendas') }}
+    {% if cutoff is not none %}
+    WHERE data_atualizacao_mart >= '{{ cutoff }}'::TIMESTAMP_NTZ
+    {% endif %}
+)
+
+SELECT
+    veiculo_id,
+    nome_veiculo,
+    valor_sugerido,
+    COUNT(*) AS violacoes,
+    COUNT_IF(valor_venda > valor_sugerido) AS acima_do_sugerido,
+    COUNT_IF(valor_venda < valor_sugerido * 0.95) AS abaixo_do_minimo,
+    MIN(valor_venda) AS menor_valor_venda,
+    MAX(valor_venda) AS maior_valor_venda
+FROM vendas
+WHERE NOT COALESCE(valor_venda BETWEEN valor_sugerido * 0.95 AND valor_sugerido, FALSE)
+GROUP BY veiculo_id, nome_veiculo, valor_sugerido
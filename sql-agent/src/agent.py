@@ -6,8 +6,23 @@ from database_manager import DatabaseManager
 from llm_factory import LLMFactory
 from config import settings
 from workflow_nodes import create_workflow as create_workflow_graph
+from question_cache import QuestionCache
+from workflow_registry import WorkflowRegistry
 
-db_manager = DatabaseManager(settings.database.connection_url)
+db_manager = DatabaseManager(
+    settings.database.connection_url,
+    schema_ttl_seconds=settings.schema_cache_ttl_seconds,
+    result_cache_max_entries=settings.result_cache_max_entries,
+    result_cache_ttl_seconds=settings.result_cache_ttl_seconds,
+    fingerprint_interval_seconds=settings.result_cache_fingerprint_interval_seconds,
+)
+
+# Outlives workflow rebuilds: cached SQL depends on the data model, not on the LLM settings
+question_cache = QuestionCache(
+    threshold=settings.question_cache_similarity,
+    max_entries=settings.question_cache_max_entries,
+    ttl_seconds=settings.question_cache_ttl_seconds,
+) if settings.question_cache_max_entries else None
 
 class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
@@ -62,11 +77,20 @@ def create_workflow():
             "list_tables": list_tables_tool,
             "get_schema": get_schema_tool,
             "execute_query": db_query_tool
-        }
+        },
+        schema_tables=settings.schema_fast_path_tables,
+        question_cache=question_cache,
     )
 
+# Built on the first question and reused by every later one (and every Streamlit session);
+# workflow_registry.invalidate() forces a rebuild
+workflow_registry = WorkflowRegistry(create_workflow)
+
 def main():
-    agent = create_workflow()
+    cold = workflow_registry.lease()
+    warm = workflow_registry.lease()
+    print(f"\nWorkflow cold start: {cold.seconds * 1000:.1f} ms, warm start: {warm.seconds * 1000:.1f} ms")
+    agent = warm.workflow
     question = "As 5 concessionárias que mais vendem, e de que estado são?"
     
     print("\nPERGUNTA:")
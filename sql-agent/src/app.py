@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from agent import create_workflow
+from agent import db_manager, workflow_registry
 import re
 
 def extract_sql(content: str) -> str:
@@ -114,8 +114,9 @@ def main():
     if submitted and question:
         with st.spinner("🤔 Analisando sua pergunta..."):
             try:
-                # Create and run workflow
-                agent = create_workflow()
+                # Compiled once per process; later questions reuse it
+                lease = workflow_registry.lease()
+                agent = lease.workflow
                 state = agent.invoke({
                     "messages": [("user", question)]
                 })
@@ -155,6 +156,21 @@ def main():
                             else:
                                 st.code(state["execution_result"])
                 
+                    st.caption(
+                        f"Workflow: {'cold' if lease.cold else 'warm'} start, {lease.seconds * 1000:.1f} ms"
+                    )
+                    if state.get("cached_question"):
+                        match = state["cached_question"]
+                        st.caption(
+                            f"SQL reutilizado da pergunta \"{match.question}\" (similaridade {match.similarity:.2f})"
+                        )
+                    if db_manager.result_cache:
+                        metrics = db_manager.result_cache.metrics()
+                        st.caption(
+                            f"Cache de resultados: {metrics['hits']} acertos, {metrics['misses']} falhas "
+                            f"({metrics['hit_rate']:.0%}), {metrics['saved_seconds']:.1f} s de warehouse economizados"
+                        )
+                
                 # Show any errors
                 if state.get("error"):
                     st.error(f"❌ Erro: {state['error']}")
@@ -0,0 +1,131 @@
+"""Latency of a question cache hit against the full workflow.
+
+Usage (from sql-agent/src, with the .env used by the agent):
+    python benchmark_question_cache.py
+    python benchmark_question_cache.py --rounds 3 --cold-results
+    python benchmark_question_cache.py --lookup-only --entries 1000
+
+For each pair below, the first question runs the full workflow (schema, query_gen, query_check,
+execution, answer) and stores its SQL; the paraphrase should then hit the cache and only run
+execution and the answer. With --cold-results the result cache is cleared before each
+paraphrase, so the hit also pays the warehouse. --lookup-only needs no credentials: it times
+QuestionCache.lookup alone against a cache of synthetic questions, each lookup a paraphrase that
+has to be scored against every entry.
+"""
+import argparse
+import statistics
+import time
+from typing import List, Tuple
+
+from question_cache import QuestionCache
+
+QUESTION_PAIRS: List[Tuple[str, str]] = [
+    (
+        "As 5 concessionárias que mais vendem, e de que estado são?",
+        "Quais as 5 concessionarias que mais vendem e de que estado elas sao?",
+    ),
+    (
+        "Qual o valor total vendido por mês em 2024?",
+        "Qual é o valor total vendido por mês em 2024",
+    ),
+    (
+        "Quais os 10 veículos mais vendidos?",
+        "quais são os 10 veiculos mais vendidos",
+    ),
+    (
+        "Qual vendedor teve o maior valor médio de venda?",
+        "Qual vendedor tem o maior valor médio de venda?",
+    ),
+]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def summary(label: str, seconds: List[float]):
+    if seconds:
+        milliseconds = [value * 1000 for value in seconds]
+        print(f"{label:<16} n={len(milliseconds):<4} median {statistics.median(milliseconds):10.2f} ms  "
+              f"mean {statistics.mean(milliseconds):10.2f} ms  min {min(milliseconds):10.2f} ms  "
+              f"max {max(milliseconds):10.2f} ms")
+
+
+def benchmark_workflow(rounds: int, cold_results: bool):
+    from agent import db_manager, question_cache, workflow_registry
+
+    if question_cache is None:
+        raise SystemExit("The question cache is disabled (QUESTION_CACHE_MAX_ENTRIES=0)")
+    agent = workflow_registry.get()
+    full, hits, misses = [], [], []
+    for _ in range(rounds):
+        for question, paraphrase in QUESTION_PAIRS:
+            question_cache.clear()
+            if db_manager.result_cache:
+                db_manager.result_cache.clear()
+            state, seconds = timed(agent.invoke, {"messages": [("user", question)]})
+            full.append(seconds)
+            print(f"full  {seconds:8.3f}s  {question}")
+
+            if cold_results and db_manager.result_cache:
+                db_manager.result_cache.clear()
+            state, seconds = timed(agent.invoke, {"messages": [("user", paraphrase)]})
+            match = state.get("cached_question")
+            (hits if match else misses).append(seconds)
+            path = f"hit ({match.similarity:.2f})" if match else "miss"
+            print(f"{path:<12} {seconds:8.3f}s  {paraphrase}")
+
+    print()
+    summary("full workflow", full)
+    summary("cache hit", hits)
+    summary("cache miss", misses)
+    if full and hits:
+        print(f"\nMedian speedup of a hit: {statistics.median(full) / statistics.median(hits):.1f}x")
+    print(f"Question cache: {question_cache.metrics()}")
+    if db_manager.result_cache:
+        print(f"Result cache: {db_manager.result_cache.metrics()}")
+
+
+def synthetic_name(i: int) -> str:
+    """Letters only: numbers would let the cache skip entries without comparing them."""
+    name = ""
+    while True:
+        name += "abcdefghijklmnopqrstuvwxyz"[i % 26]
+        i //= 26
+        if not i:
+            return name.capitalize()
+
+
+def benchmark_lookup(entries: int, lookups: int):
+    cache = QuestionCache(max_entries=entries)
+    for i in range(entries):
+        cache.store(f"Qual o total vendido pela concessionária {synthetic_name(i)} no último mês?", f"SELECT {i}")
+    seconds = []
+    for i in range(lookups):
+        # Worded differently from the stored question, so every lookup scores all entries
+        question = f"qual foi o total vendido pela concessionaria {synthetic_name(i % entries)} no ultimo mes"
+        _, elapsed = timed(cache.lookup, question)
+        seconds.append(elapsed)
+    summary(f"lookup ({entries})", seconds)
+    print(f"Question cache: {cache.metrics()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=1, help="times every question pair is asked")
+    parser.add_argument("--cold-results", action="store_true", help="clear the result cache before each hit")
+    parser.add_argument("--lookup-only", action="store_true", help="time cache lookups only, no LLM or database")
+    parser.add_argument("--entries", type=int, default=256, help="cached questions for --lookup-only")
+    parser.add_argument("--lookups", type=int, default=1000, help="lookups timed by --lookup-only")
+    args = parser.parse_args()
+
+    if args.lookup_only:
+        benchmark_lookup(args.entries, args.lookups)
+    else:
+        benchmark_workflow(args.rounds, args.cold_results)
+
+
+if __name__ == "__main__":
+    main()
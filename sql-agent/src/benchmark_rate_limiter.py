@@ -0,0 +1,154 @@
+"""Check the LLM rate limiter against a fake clock, with no provider calls and no waiting.
+
+Usage (from sql-agent/src):
+    python benchmark_rate_limiter.py
+    python benchmark_rate_limiter.py --requests-per-minute 30 --tokens-per-minute 6000
+
+TokenBucket and RateLimiter take their clock and sleep as arguments; here both are a fake clock
+that only moves when the limiter sleeps, so every wait is exact. The scenarios cover:
+
+- requests per minute: a full bucket of calls goes through at once, the next one waits for the
+  refill, and calls spread over time stay under the limit
+- tokens per minute: acquire() reserves the estimate, record_usage() gives back what a call did
+  not use and charges what it used on top of the estimate
+- backoff: a 429's Retry-After (in seconds or as an HTTP date) holds every call back
+
+Every check is printed; the run exits with status 1 when any of them fails.
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+from typing import List
+
+from config import RateLimitConfig
+from rate_limiter import RateLimiter, RateLimiterRegistry, TokenBucket, retry_after_seconds
+
+
+class FakeClock:
+    """A monotonic clock that only moves when sleep() is called."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class Checks:
+    def __init__(self):
+        self.failures = 0
+
+    def expect(self, label: str, actual: float, expected: float, tolerance: float = 1e-6):
+        ok = abs(actual - expected) <= tolerance
+        self.failures += not ok
+        print(f"{'ok' if ok else 'FAIL':<5} {label:<64} {actual:10.3f} (expected {expected:.3f})")
+
+
+def check_requests_per_minute(checks: Checks, requests_per_minute: int):
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimitConfig(requests_per_minute=requests_per_minute), clock, clock.sleep)
+    interval = 60.0 / requests_per_minute
+
+    burst = sum(limiter.acquire() for _ in range(requests_per_minute))
+    checks.expect(f"rpm: {requests_per_minute} calls from a full bucket wait", burst, 0.0)
+    checks.expect("rpm: the next call waits for one request to refill", limiter.acquire(), interval)
+
+    clock.sleep(30.0)
+    refilled = int(30.0 / interval)
+    waited = sum(limiter.acquire() for _ in range(refilled))
+    checks.expect(f"rpm: {refilled} calls after a 30s pause wait", waited, 0.0)
+
+    started = clock()
+    for _ in range(2 * requests_per_minute):
+        limiter.acquire()
+    checks.expect(f"rpm: {2 * requests_per_minute} more calls take (seconds)", clock() - started,
+                  2 * requests_per_minute * interval)
+
+    bucket = TokenBucket(requests_per_minute, clock)
+    bucket.take(requests_per_minute)
+    checks.expect("bucket: a request larger than the bucket waits for a full one",
+                  bucket.wait_time(10 * requests_per_minute), 60.0)
+
+
+def check_tokens_per_minute(checks: Checks, tokens_per_minute: int):
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimitConfig(tokens_per_minute=tokens_per_minute), clock, clock.sleep)
+    per_second = tokens_per_minute / 60.0
+    estimate = int(tokens_per_minute * 0.8)
+
+    checks.expect("tpm: the first call reserves its estimate without waiting", limiter.acquire(estimate), 0.0)
+    checks.expect("tpm: a second reservation waits for the refill", limiter.acquire(estimate),
+                  (estimate - (tokens_per_minute - estimate)) / per_second)
+
+    # The second call used a quarter of its estimate: the rest goes back to the bucket
+    used = estimate // 4
+    limiter.record_usage(estimate, used)
+    checks.expect("tpm: the unused part of the estimate is available again", limiter.acquire(estimate - used), 0.0)
+
+    # A call used a full minute of tokens more than it reserved: the bucket goes below zero by the
+    # estimate, and the next call waits to refill that debt plus its own estimate
+    clock = FakeClock()
+    limiter = RateLimiter(RateLimitConfig(tokens_per_minute=tokens_per_minute), clock, clock.sleep)
+    limiter.acquire(estimate)
+    limiter.record_usage(estimate, tokens_per_minute + estimate)
+    checks.expect("tpm: usage above the estimate delays the next call", limiter.acquire(estimate),
+                  2 * estimate / per_second)
+
+
+def check_backoff(checks: Checks, requests_per_minute: int):
+    clock = FakeClock()
+    limiters = RateLimiterRegistry(
+        {'groq': RateLimitConfig(requests_per_minute=requests_per_minute)}, clock, clock.sleep
+    )
+    limiter = limiters.get('Groq')
+    checks.expect("registry: one limiter per provider", float(limiters.get('groq') is limiter), 1.0)
+
+    def rate_limited(headers: dict, status_code: int = 429) -> Exception:
+        error = Exception("rate limited")
+        error.response = SimpleNamespace(status_code=status_code, headers=headers)
+        return error
+
+    retry_after = retry_after_seconds(rate_limited({'retry-after': '7'}))
+    checks.expect("backoff: Retry-After in seconds", retry_after, 7.0)
+    limiter.backoff(retry_after)
+    checks.expect("backoff: the next call waits for Retry-After", limiter.acquire(), 7.0)
+    checks.expect("backoff: the call after it does not wait", limiter.acquire(), 0.0)
+
+    wall_clock = datetime(2025, 1, 1, 12, 0, 0, tzinfo=timezone.utc).timestamp()
+    retry_date = format_datetime(datetime(2025, 1, 1, 12, 0, 12, tzinfo=timezone.utc), usegmt=True)
+    retry_after = retry_after_seconds(rate_limited({'retry-after': retry_date}), wall_clock=lambda: wall_clock)
+    checks.expect("backoff: Retry-After as an HTTP date", retry_after, 12.0)
+    limiter.backoff(retry_after)
+    limiter.backoff(3.0)
+    checks.expect("backoff: a shorter backoff does not cut a longer one", limiter.acquire(), 12.0)
+
+    checks.expect("backoff: a 429 without Retry-After waits 1s", retry_after_seconds(rate_limited({})), 1.0)
+    checks.expect("backoff: other errors are not retried",
+                  float(retry_after_seconds(rate_limited({}, status_code=500)) is None), 1.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests-per-minute", type=int, default=60)
+    parser.add_argument("--tokens-per-minute", type=int, default=6000)
+    args = parser.parse_args()
+
+    checks = Checks()
+    check_requests_per_minute(checks, args.requests_per_minute)
+    check_tokens_per_minute(checks, args.tokens_per_minute)
+    check_backoff(checks, args.requests_per_minute)
+    if checks.failures:
+        print(f"{checks.failures} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 # Load environment variables from a .env file
 load_dotenv()
@@ -26,6 +26,12 @@ class DatabaseConfig:
             f"role={self.role}"
         )
 
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Provider quota; None means no limit."""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+
 @dataclass
 class Settings:
     snowflake_account: str
@@ -41,6 +47,39 @@ class Settings:
     llm_provider: str = "mistral"
     llm_model: Optional[str] = None
 
+    mistral_requests_per_minute: Optional[int] = 60
+    mistral_tokens_per_minute: Optional[int] = 500_000
+    groq_requests_per_minute: Optional[int] = 30
+    groq_tokens_per_minute: Optional[int] = 6_000
+    # Tokens reserved for a call before its real usage is known
+    llm_estimated_tokens_per_call: int = 1_500
+    # Retries of a call rejected with 429, after waiting for its Retry-After
+    llm_rate_limit_retries: int = 3
+
+    # Seconds a cached table DDL is used before its LAST_ALTERED fingerprint is checked again
+    schema_cache_ttl_seconds: int = 3600
+    # Tables whose cached DDL is given to query generation directly, skipping table discovery and
+    # the schema LLM call; empty to always discover
+    schema_fast_path_tables: Tuple[str, ...] = (
+        "mart_vendas",
+        "analise_vendas_concessionaria",
+        "analise_vendas_temporal",
+        "analise_vendas_veiculo",
+        "analise_vendas_vendedor",
+    )
+
+    # Query results kept by DatabaseManager (0 disables the cache), how long at most, and how
+    # often the schema's LAST_ALTERED fingerprint is re-read to notice dbt rebuilds
+    result_cache_max_entries: int = 256
+    result_cache_ttl_seconds: int = 900
+    result_cache_fingerprint_interval_seconds: int = 60
+
+    # Validated SQL of answered questions, reused for questions at least this similar (character
+    # trigram cosine, 0-1); 0 entries disables the question cache
+    question_cache_similarity: float = 0.85
+    question_cache_max_entries: int = 256
+    question_cache_ttl_seconds: int = 86400
+
     @property
     def database(self) -> DatabaseConfig:
         return DatabaseConfig(
@@ -53,6 +92,22 @@ class Settings:
             role=self.snowflake_role
         )
 
+    @property
+    def rate_limits(self) -> Dict[str, RateLimitConfig]:
+        return {
+            "mistral": RateLimitConfig(self.mistral_requests_per_minute, self.mistral_tokens_per_minute),
+            "groq": RateLimitConfig(self.groq_requests_per_minute, self.groq_tokens_per_minute),
+        }
+
+def optional_int(name: str, default: Optional[int]) -> Optional[int]:
+    """Integer environment variable; empty or 0 disables the limit."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    if not value.strip():
+        return None
+    return int(value) or None
+
 settings = Settings(
     snowflake_account=os.getenv("SNOWFLAKE_ACCOUNT"),
     snowflake_user=os.getenv("SNOWFLAKE_USER"),
@@ -63,5 +118,20 @@ settings = Settings(
     snowflake_role=os.getenv("SNOWFLAKE_ROLE"),
     mistral_api_key=os.getenv("MISTRAL_API_KEY"),
     groq_api_key=os.getenv("GROQ_API_KEY"),
+    mistral_requests_per_minute=optional_int("MISTRAL_REQUESTS_PER_MINUTE", 60),
+    mistral_tokens_per_minute=optional_int("MISTRAL_TOKENS_PER_MINUTE", 500_000),
+    groq_requests_per_minute=optional_int("GROQ_REQUESTS_PER_MINUTE", 30),
+    groq_tokens_per_minute=optional_int("GROQ_TOKENS_PER_MINUTE", 6_000),
+    schema_cache_ttl_seconds=int(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "3600")),
+    result_cache_max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256")),
+    result_cache_ttl_seconds=int(os.getenv("RESULT_CACHE_TTL_SECONDS", "900")),
+    result_cache_fingerprint_interval_seconds=int(os.getenv("RESULT_CACHE_FINGERPRINT_INTERVAL_SECONDS", "60")),
+    question_cache_similarity=float(os.getenv("QUESTION_CACHE_SIMILARITY", "0.85")),
+    question_cache_max_entries=int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "256")),
+    question_cache_ttl_seconds=int(os.getenv("QUESTION_CACHE_TTL_SECONDS", "86400")),
+    schema_fast_path_tables=tuple(
+        name.strip() for name in os.getenv("SCHEMA_FAST_PATH_TABLES", ",".join(Settings.schema_fast_path_tables)).split(",")
+        if name.strip()
+    ),
 )
 
@@ -1,15 +1,41 @@
+import hashlib
 import logging
+import threading
+import time
+from dataclasses import dataclass
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
-from typing import Optional, Any
+from sqlalchemy import bindparam, text
+from typing import Optional, Any, Callable, Dict, Sequence, Tuple
+from result_cache import ResultCache, is_cacheable, normalize_sql
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class SchemaCacheEntry:
+    ddl: str
+    fingerprint: str
+    checked_at: float
+
 class DatabaseManager:
-    def __init__(self, connection_url: str):
+    def __init__(self, connection_url: str, schema_ttl_seconds: float = 3600,
+                 result_cache_max_entries: int = 256, result_cache_ttl_seconds: float = 900,
+                 fingerprint_interval_seconds: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
         self.connection_url = connection_url
         self._db: Optional[SQLDatabase] = None
         self._toolkit: Optional[SQLDatabaseToolkit] = None
+        self.schema_ttl_seconds = schema_ttl_seconds
+        self.clock = clock
+        self.schema_cache_hits = 0
+        self.schema_cache_misses = 0
+        self._schema_cache: Dict[Tuple[str, ...], SchemaCacheEntry] = {}
+        self._schema_lock = threading.Lock()
+        # max_entries 0 disables result caching
+        self.result_cache = ResultCache(result_cache_max_entries, result_cache_ttl_seconds, clock) \
+            if result_cache_max_entries else None
+        self.fingerprint_interval_seconds = fingerprint_interval_seconds
+        self._data_fingerprint: Optional[Tuple[str, float]] = None
 
     @property
     def db(self) -> SQLDatabase:
@@ -33,22 +59,116 @@ class DatabaseManager:
         return self._toolkit
 
     def execute_query(self, query: str) -> str:
-        """Execute a SQL query and return the results."""
+        """Execute a SQL query and return the results.
+
+        Read-only queries are answered from the result cache while the schema's data is
+        unchanged; see data_fingerprint.
+        """
         
         logger.info(f"\n{'='*50}\nExecuting Query:\n{'-'*50}\n{query}\n{'-'*50}")
+        key = normalize_sql(query)
+        fingerprint = None
+        if self.result_cache and is_cacheable(key):
+            try:
+                fingerprint = self.data_fingerprint()
+            except Exception as e:
+                logger.warning(f"Data fingerprint unavailable, not using the result cache: {str(e)}")
+        if fingerprint:
+            result = self.result_cache.get(key, fingerprint)
+            if result is not None:
+                logger.info(f"\nQuery Results (cached):\n{'-'*50}\n{result}\n{'='*50}")
+                logger.info(f"Result cache: {self.result_cache.metrics()}")
+                return result
+
+        started = time.perf_counter()
         result = self.db.run_no_throw(query)
         
         if not result:
             logger.warning("Query execution failed")
             return "Error: Query failed. Please rewrite your query and try again."
         
+        if fingerprint and not result.startswith("Error"):
+            self.result_cache.put(key, result, fingerprint, time.perf_counter() - started)
+            logger.info(f"Result cache: {self.result_cache.metrics()}")
         logger.info(f"\nQuery Results:\n{'-'*50}\n{result}\n{'='*50}")
         return result
 
+    def data_fingerprint(self) -> str:
+        """Fingerprint of every table in the schema, re-read at most every fingerprint_interval_seconds.
+
+        dbt rebuilds and incremental merges update a table's LAST_ALTERED, so any run that
+        changed data changes this value and with it every cached result.
+        """
+        now = self.clock()
+        if self._data_fingerprint and now - self._data_fingerprint[1] < self.fingerprint_interval_seconds:
+            return self._data_fingerprint[0]
+        fingerprint = self.schema_fingerprint()
+        self._data_fingerprint = (fingerprint, now)
+        return fingerprint
+
+    def invalidate_result_cache(self):
+        """Drop cached results, e.g. right after a dbt run, instead of waiting for the next fingerprint check."""
+        self._data_fingerprint = None
+        if self.result_cache:
+            self.result_cache.clear()
+
     def get_table_info(self) -> str:
         """Get information about all tables."""
         return self.db.get_table_info()
 
     def get_schema(self, table_name: str) -> str:
         """Get schema information for a specific table."""
-        return self.db.get_table_info(table_name)
\ No newline at end of file
+        return self.get_schema_cached([table_name])
+
+    def schema_fingerprint(self, table_names: Optional[Sequence[str]] = None) -> str:
+        """Hash of the tables' LAST_ALTERED timestamps: one INFORMATION_SCHEMA query, no reflection.
+
+        Without table_names, covers every table in the current schema.
+        """
+        if table_names is None:
+            query = text(
+                "SELECT LOWER(table_name), last_altered FROM information_schema.tables "
+                "WHERE table_schema = CURRENT_SCHEMA() ORDER BY 1"
+            )
+            params = {}
+        else:
+            query = text(
+                "SELECT LOWER(table_name), last_altered FROM information_schema.tables "
+                "WHERE table_schema = CURRENT_SCHEMA() AND LOWER(table_name) IN :table_names "
+                "ORDER BY 1"
+            ).bindparams(bindparam("table_names", expanding=True))
+            params = {"table_names": [name.lower() for name in table_names]}
+        with self.db._engine.connect() as connection:
+            rows = connection.execute(query, params).fetchall()
+        return hashlib.sha256(repr([tuple(row) for row in rows]).encode()).hexdigest()
+
+    def get_schema_cached(self, table_names: Sequence[str]) -> str:
+        """DDL of the tables, reflected once and reused.
+
+        For schema_ttl_seconds an entry is served as is. After that, the tables' fingerprint is
+        checked: if nothing was altered the entry is kept for another TTL, otherwise the tables
+        are reflected again.
+        """
+        key = tuple(sorted(name.strip().lower() for name in table_names))
+        with self._schema_lock:
+            entry = self._schema_cache.get(key)
+        if entry and self.clock() - entry.checked_at < self.schema_ttl_seconds:
+            self.schema_cache_hits += 1
+            return entry.ddl
+
+        fingerprint = self.schema_fingerprint(key)
+        if entry and entry.fingerprint == fingerprint:
+            entry.checked_at = self.clock()
+            self.schema_cache_hits += 1
+            return entry.ddl
+
+        logger.info(f"Reflecting schema of {', '.join(key)}")
+        ddl = self.db.get_table_info(list(key))
+        with self._schema_lock:
+            self._schema_cache[key] = SchemaCacheEntry(ddl, fingerprint, self.clock())
+        self.schema_cache_misses += 1
+        return ddl
+
+    def invalidate_schema_cache(self):
+        with self._schema_lock:
+            self._schema_cache.clear()
\ No newline at end of file
@@ -34,6 +34,7 @@ Output the SQL query that answers the input question without a tool call.
 Unless the user specifies a specific number of examples they wish to obtain, always limit your query to at most 5 results.
 You can order the results by a relevant column to return the most interesting examples in the database.
 Never query for all the columns from a specific table, only ask for the relevant columns given the question.
+For sales questions, prefer the mart_vendas table: it already has each sale joined with its vehicle, dealership, city, state, salesperson and customer, so there is no need to join fct_vendas with the dim_ tables.
 
 If you get an error while executing a query, rewrite the query and try again.
 
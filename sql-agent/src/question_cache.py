@@ -0,0 +1,225 @@
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+from langchain_core.messages import HumanMessage
+
+logger = logging.getLogger(__name__)
+
+# Words (after normalize_question) that don't change which SQL answers a question
+STOP_WORDS = frozenset("""
+a o as os um uma uns umas de da do das dos em no na nos nas por pelo pela pelos pelas para pra
+com e ou que qual quais quem me mostre liste diga sao foi foram tem teve tiveram ser esta estao
+ele ela eles elas seu sua seus suas the of what which who is are was were show list
+""".split())
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cased, accents and punctuation removed, whitespace collapsed."""
+    text = unicodedata.normalize("NFKD", question.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w]+", " ", text).split())
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """Character n-grams of the text, padded so that short words still count."""
+    padded = f" {text} "
+    return Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+
+
+def vector_norm(ngrams: Counter) -> float:
+    return math.sqrt(sum(count * count for count in ngrams.values()))
+
+
+def cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b[gram] for gram, count in a.items()) / (a_norm * b_norm)
+
+
+def content_words(key: str) -> FrozenSet[str]:
+    return frozenset(word for word in key.split() if word not in STOP_WORDS and not word.isdigit())
+
+
+def words_correspond(a: FrozenSet[str], b: FrozenSet[str], threshold: float = 0.6) -> bool:
+    """Every word of each set has a similar one (spelling, plural, accent) in the other.
+
+    Whole-question similarity barely moves when one word changes meaning ("maior" and "menor");
+    this check rejects that.
+    """
+    vectors = {word: char_ngrams(word) for word in a | b}
+    norms = {word: vector_norm(vector) for word, vector in vectors.items()}
+
+    def covered(words, others):
+        return all(
+            word in others or any(
+                cosine(vectors[word], norms[word], vectors[other], norms[other]) >= threshold for other in others
+            )
+            for word in words
+        )
+
+    return covered(a, b) and covered(b, a)
+
+
+@dataclass
+class CachedQuestion:
+    question: str
+    sql: str
+    ngrams: Counter
+    norm: float
+    numbers: Tuple[str, ...]
+    words: FrozenSet[str]
+    stored_at: float
+
+
+@dataclass(frozen=True)
+class QuestionMatch:
+    key: str
+    question: str
+    sql: str
+    similarity: float
+
+
+class QuestionCache:
+    """Validated SQL of answered questions, found again for the same or a similar question.
+
+    Questions are compared by cosine similarity of their character trigrams, after
+    normalize_question. A match needs at least `threshold` similarity, the same numbers as the new
+    question (so "top 5" never reuses the SQL of "top 10") and corresponding content words (see
+    words_correspond). Entries are evicted least recently used beyond `max_entries` and expire
+    after `ttl_seconds`.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 256, ttl_seconds: float = 86400,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedQuestion]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, question: str) -> Optional[QuestionMatch]:
+        key = normalize_question(question)
+        ngrams = char_ngrams(key)
+        norm = vector_norm(ngrams)
+        numbers = tuple(re.findall(r"\d+", key))
+        words = content_words(key)
+        with self._lock:
+            now = self.clock()
+            for expired in [k for k, entry in self._entries.items() if now - entry.stored_at >= self.ttl_seconds]:
+                del self._entries[expired]
+
+            candidates = []
+            if key in self._entries:
+                candidates.append((1.0, key))
+            else:
+                for candidate, entry in self._entries.items():
+                    if entry.numbers != numbers:
+                        continue
+                    similarity = cosine(ngrams, norm, entry.ngrams, entry.norm)
+                    if similarity >= self.threshold:
+                        candidates.append((similarity, candidate))
+                candidates.sort(reverse=True)
+            best = next(
+                (
+                    (similarity, candidate) for similarity, candidate in candidates
+                    if words_correspond(words, self._entries[candidate].words)
+                ),
+                None,
+            )
+
+            if best is None:
+                self.misses += 1
+                return None
+            best_similarity, best = best
+            self._entries.move_to_end(best)
+            self.hits += 1
+            entry = self._entries[best]
+            return QuestionMatch(best, entry.question, entry.sql, best_similarity)
+
+    def store(self, question: str, sql: str):
+        key = normalize_question(question)
+        ngrams = char_ngrams(key)
+        with self._lock:
+            self._entries[key] = CachedQuestion(
+                question=question,
+                sql=sql,
+                ngrams=ngrams,
+                norm=vector_norm(ngrams),
+                numbers=tuple(re.findall(r"\d+", key)),
+                words=content_words(key),
+                stored_at=self.clock(),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def question_text(messages) -> Optional[str]:
+    """The last user question in graph input messages (("user", text) tuples or HumanMessages)."""
+    for message in reversed(messages):
+        if isinstance(message, tuple) and message[0] in ("user", "human"):
+            return message[1]
+        if isinstance(message, HumanMessage):
+            return message.content
+    return None
+
+
+class CachedWorkflow:
+    """The compiled workflow behind a QuestionCache; invoked the same way.
+
+    On a hit the cached validated SQL goes to `replay`, a graph that only executes it against
+    current data and generates the answer, skipping schema discovery, query_gen and query_check.
+    If the cached SQL fails, the entry is dropped and the full workflow answers instead. SQL of
+    every question the full workflow answers without error is stored.
+    """
+
+    def __init__(self, workflow: Any, replay: Any, cache: QuestionCache):
+        self.workflow = workflow
+        self.replay = replay
+        self.cache = cache
+
+    def invoke(self, inputs: Dict[str, Any], *args, **kwargs) -> Dict[str, Any]:
+        question = question_text(inputs.get("messages", []))
+        match = self.cache.lookup(question) if question else None
+        if match:
+            logger.info(f"Question cache hit ({match.similarity:.2f}): {match.question}")
+            state = self.replay.invoke({**inputs, "sql_query": match.sql}, *args, **kwargs)
+            if not state.get("error") and state.get("execution_result"):
+                return {**state, "cached_question": match}
+            logger.warning(f"Cached SQL failed, running the full workflow: {state.get('error')}")
+            self.cache.discard(match.key)
+
+        state = self.workflow.invoke(inputs, *args, **kwargs)
+        if question and state.get("sql_query") and state.get("execution_result") and not state.get("error"):
+            self.cache.store(question, state["sql_query"])
+        return state
@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from config import RateLimitConfig, settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Holds up to `capacity` units, refilled continuously at `capacity` per minute."""
+
+    def __init__(self, capacity: float, clock: Callable[[], float]):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.clock = clock
+        self.level = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        # A request larger than the bucket waits for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        """Remove `amount` units; the level may go negative when usage exceeded the estimate."""
+        self._refill()
+        self.level -= amount
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits of one LLM provider, shared by all threads.
+
+    acquire() blocks only when a call now would exceed a limit. Token usage is not known until the
+    response arrives, so acquire() takes an estimate and record_usage() settles the difference.
+    backoff() blocks every caller until a 429's Retry-After has passed.
+    """
+
+    def __init__(self, limits: RateLimitConfig, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(limits.requests_per_minute, clock) if limits.requests_per_minute else None
+        self._tokens = TokenBucket(limits.tokens_per_minute, clock) if limits.tokens_per_minute else None
+        self._blocked_until = 0.0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = max(0.0, self._blocked_until - self.clock())
+        if self._requests:
+            wait = max(wait, self._requests.wait_time(1))
+        if self._tokens:
+            wait = max(wait, self._tokens.wait_time(tokens))
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Wait until one request of about `tokens` tokens fits the limits, then count it.
+
+        Returns the seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                wait = self._wait_time(tokens)
+                if wait <= 0:
+                    if self._requests:
+                        self._requests.take(1)
+                    if self._tokens:
+                        self._tokens.take(tokens)
+                    return waited
+            logger.info(f"Rate limit reached, waiting {wait:.2f}s")
+            self.sleep(wait)
+            waited += wait
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once a call's real usage is known."""
+        if self._tokens:
+            with self._lock:
+                self._tokens.take(actual_tokens - estimated_tokens)
+
+    def backoff(self, seconds: float):
+        """Hold every caller back for `seconds`, e.g. from a 429 response's Retry-After."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self.clock() + seconds)
+
+
+class RateLimiterRegistry:
+    """One RateLimiter per provider, created on first use."""
+
+    def __init__(self, limits: Dict[str, RateLimitConfig], clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.clock = clock
+        self.sleep = sleep
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str) -> RateLimiter:
+        provider = provider.lower()
+        with self._lock:
+            if provider not in self._limiters:
+                limits = self.limits.get(provider, RateLimitConfig())
+                self._limiters[provider] = RateLimiter(limits, self.clock, self.sleep)
+            return self._limiters[provider]
+
+
+def retry_after_seconds(error: Exception, wall_clock: Callable[[], float] = time.time) -> Optional[float]:
+    """Seconds to wait from a 429 error's Retry-After header, or None if it is not a 429.
+
+    Works with the httpx / requests style errors raised by the provider clients, which carry the
+    HTTP response as `error.response`. A 429 without a usable header waits 1 second.
+    """
+    response = getattr(error, "response", None)
+    if response is None or getattr(response, "status_code", None) != 429:
+        return None
+    value = (getattr(response, "headers", None) or {}).get("retry-after")
+    if value is None:
+        return 1.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - wall_clock())
+    except (TypeError, ValueError):
+        return 1.0
+
+
+rate_limiters = RateLimiterRegistry(settings.rate_limits)
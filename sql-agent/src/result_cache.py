@@ -0,0 +1,111 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+# Quoted strings and identifiers, comments, whitespace, punctuation, and words
+_TOKEN = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r"|(?P<identifier>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+    r"|(?P<space>\s+)"
+    r"|(?P<punctuation>[(),;=<>+*/!:|%.-])"
+    r"|(?P<word>[^'\"\s(),;=<>+*/!:|%.-]+)",
+    re.DOTALL,
+)
+
+
+def normalize_sql(query: str) -> str:
+    """Cache key of a query: the same text up to whitespace, comments, case and a trailing ';'.
+
+    Unquoted words are upper-cased (Snowflake resolves unquoted identifiers case-insensitively)
+    and whitespace is kept only between two words. String literals and quoted identifiers are
+    kept exactly: they change the result, so they must change the key.
+    """
+    parts = []
+    separated = False
+    for match in _TOKEN.finditer(query):
+        kind, value = match.lastgroup, match.group()
+        if kind in ("comment", "space"):
+            separated = True
+            continue
+        if separated and parts and kind == "word" and parts[-1][0] == "word":
+            parts.append(("space", " "))
+        parts.append((kind, value.upper() if kind == "word" else value))
+        separated = False
+    while parts and parts[-1][1] == ";":
+        parts.pop()
+    return "".join(value for _, value in parts)
+
+
+def is_cacheable(normalized: str) -> bool:
+    """Only read-only queries are cached."""
+    return normalized.startswith(("SELECT", "WITH"))
+
+
+@dataclass
+class CachedResult:
+    result: str
+    fingerprint: str
+    stored_at: float
+    seconds: float
+
+
+class ResultCache:
+    """LRU cache of query results, bounded in entries and age.
+
+    Each entry remembers the data fingerprint it was computed under; a lookup with a different
+    fingerprint (the tables were rebuilt or loaded since) drops it. Hits, misses and the warehouse
+    seconds the hits saved are kept as metrics.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 900,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, fingerprint: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry.fingerprint != fingerprint or self.clock() - entry.stored_at >= self.ttl_seconds
+            ):
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.seconds
+            return entry.result
+
+    def put(self, key: str, result: str, fingerprint: str, seconds: float):
+        with self._lock:
+            self._entries[key] = CachedResult(result, fingerprint, self.clock(), seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
@@ -1,7 +1,10 @@
 
-import time
 import logging
 from functools import wraps
+from typing import Any, Optional
+
+from config import settings
+from rate_limiter import rate_limiters, retry_after_seconds
 
 logging.basicConfig(
     level=logging.INFO,
@@ -9,20 +12,62 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def llm_call(func):
-    """Decorator to handle LLM calls with rate limiting and logging."""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        logger.info(f"Starting LLM call: {func.__name__}")
-        try:
-            result = func(*args, **kwargs)
-            time.sleep(1.5) 
-            logger.info(f"Completed LLM call: {func.__name__}")
-            return result
-        except Exception as e:
-            logger.error(f"Error in LLM call {func.__name__}: {str(e)}")
-            raise
-    return wrapper
+def llm_call(llm_attr: str):
+    """Decorator for workflow nodes that call the LLM stored in self.<llm_attr>.
+
+    Waits on that provider's shared rate limiter only when a limit would be exceeded, settles
+    the real token usage after the call, and on a 429 waits for Retry-After and tries again.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            provider = get_provider_name(getattr(self, llm_attr))
+            limiter = rate_limiters.get(provider)
+            estimated = settings.llm_estimated_tokens_per_call
+            logger.info(f"Starting LLM call: {func.__name__}")
+            for attempt in range(settings.llm_rate_limit_retries + 1):
+                waited = limiter.acquire(estimated)
+                if waited:
+                    logger.info(f"Waited {waited:.2f}s for the {provider} rate limit")
+                try:
+                    result = func(self, *args, **kwargs)
+                except Exception as e:
+                    retry_after = retry_after_seconds(e)
+                    if retry_after is not None and attempt < settings.llm_rate_limit_retries:
+                        logger.warning(f"{provider} rate limited {func.__name__}, retrying in {retry_after:.2f}s")
+                        limiter.backoff(retry_after)
+                        continue
+                    logger.error(f"Error in LLM call {func.__name__}: {str(e)}")
+                    raise
+                used = token_usage(result)
+                if used is not None:
+                    limiter.record_usage(estimated, used)
+                logger.info(f"Completed LLM call: {func.__name__}")
+                return result
+        return wrapper
+    return decorator
+
+
+def token_usage(result: Any) -> Optional[int]:
+    """Total tokens reported for the last message a node returned, if the provider reported them."""
+    messages = result.get("messages") if isinstance(result, dict) else None
+    if not messages:
+        return None
+    message = messages[-1]
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("total_tokens") is not None:
+        return usage["total_tokens"]
+    metadata = getattr(message, "response_metadata", None) or {}
+    return (metadata.get("token_usage") or {}).get("total_tokens")
+
+
+def get_provider_name(llm) -> str:
+    """Provider of a chat model instance, e.g. 'mistral' for ChatMistralAI."""
+    name = type(llm).__name__.lower()
+    for provider in ("mistral", "groq"):
+        if provider in name:
+            return provider
+    return name
 
 
 def get_model_name(llm) -> str:
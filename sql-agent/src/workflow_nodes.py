@@ -9,6 +9,7 @@ from langgraph.graph import END, StateGraph, START
 from typing_extensions import TypedDict
 from langgraph.graph.message import add_messages
 from prompts import Prompts
+from question_cache import CachedWorkflow
 from utils import llm_call, get_model_name
 
 logger = logging.getLogger(__name__)
@@ -53,13 +54,41 @@ def log_llm_message(message: Any, step: str) -> None:
     logger.info(f"{'='*50}\n")
 
 class WorkflowNodes:
-    def __init__(self, llm_query_gen, llm_query_check, llm_answer, db_manager, tools):
+    def __init__(self, llm_query_gen, llm_query_check, llm_answer, db_manager, tools, schema_tables=()):
         """Initialize with different LLMs for each task."""
         self.llm_query_gen = llm_query_gen  # Codestral for query generation
         self.llm_query_check = llm_query_check  # Llama for query validation
         self.llm_answer = llm_answer  # Mixtral for answer generation
         self.db_manager = db_manager
         self.tools = tools
+        self.schema_tables = list(schema_tables)
+
+    def cached_schema(self, state: State) -> Dict[str, List[AnyMessage]]:
+        """Fast path: the schema tool call and its result, answered from the schema cache.
+
+        Replaces first_tool_call, list_tables_tool, model_get_schema and get_schema_tool with
+        the same messages query generation would have seen. If the cache can't be read, falls
+        back to first_tool_call and the discovery path.
+        """
+        try:
+            ddl = self.db_manager.get_schema_cached(self.schema_tables)
+        except Exception as e:
+            logger.warning(f"Schema cache unavailable, discovering tables instead: {str(e)}")
+            return self.first_tool_call(state)
+
+        return {
+            "messages": [
+                AIMessage(
+                    content="",
+                    tool_calls=[{
+                        "name": "sql_db_schema",
+                        "args": {"table_names": ", ".join(self.schema_tables)},
+                        "id": "tool_schema_cached",
+                    }]
+                ),
+                ToolMessage(content=ddl, tool_call_id="tool_schema_cached"),
+            ]
+        }
 
     def first_tool_call(self, state: State) -> Dict[str, List[AIMessage]]:
         """Initial node to list available tables."""
@@ -76,7 +105,7 @@ class WorkflowNodes:
             ]
         }
 
-    @llm_call
+    @llm_call("llm_query_gen")
     def model_get_schema(self, state: Dict) -> Dict[str, List[AIMessage]]:
         """Get schema for relevant tables."""
         logger.info("Getting schema information")
@@ -87,7 +116,7 @@ class WorkflowNodes:
         return {"messages": [result]}
 
 
-    @llm_call
+    @llm_call("llm_query_gen")
     def query_gen_node(self, state: State) -> Dict:
         """Generate SQL query using Codestral."""
         logger.info(f"Generating SQL query with {get_model_name(self.llm_query_gen)}")
@@ -113,7 +142,7 @@ class WorkflowNodes:
             "error": "No SQL query generated"
         }
 
-    @llm_call
+    @llm_call("llm_query_check")
     def query_check_node(self, state: State) -> Dict:
         """Validate SQL query using Llama."""
         logger.info(f"Validating SQL query with {get_model_name(self.llm_query_check)}")
@@ -139,7 +168,7 @@ class WorkflowNodes:
             "error": "Query validation failed"
         }
 
-    @llm_call
+    @llm_call("llm_answer")
     def generate_answer_node(self, state: State) -> Dict:
         """Generate final answer using Mixtral."""
         logger.info(f"Generating answer with {get_model_name(self.llm_answer)}")
@@ -194,19 +223,19 @@ class WorkflowNodes:
             }
 
 class WorkflowBuilder:
-    def __init__(self, llm_query_gen, llm_query_check, llm_answer, db_manager, tools):
+    def __init__(self, llm_query_gen, llm_query_check, llm_answer, db_manager, tools, schema_tables=()):
         self.llm_query_gen = llm_query_gen
         self.llm_query_check = llm_query_check
         self.llm_answer = llm_answer
         self.db_manager = db_manager
         self.tools = tools
-        self.nodes = WorkflowNodes(llm_query_gen, llm_query_check, llm_answer, db_manager, tools)
+        self.schema_tables = list(schema_tables)
+        self.nodes = WorkflowNodes(llm_query_gen, llm_query_check, llm_answer, db_manager, tools, schema_tables)
         self.workflow = StateGraph(State)
         self._build_workflow()
 
     def _build_workflow(self):
         # Add nodes
-        self.workflow.add_node("first_tool_call", self.nodes.first_tool_call)
         self.workflow.add_node("list_tables_tool", 
                              create_tool_node_with_fallback([self.tools["list_tables"]]))
         self.workflow.add_node("get_schema_tool", 
@@ -225,8 +254,18 @@ class WorkflowBuilder:
             return END
 
         # Define linear flow
-        self.workflow.add_edge(START, "first_tool_call")
-        self.workflow.add_edge("first_tool_call", "list_tables_tool")
+        if self.schema_tables:
+            # Fast path: cached DDL straight to query generation; table discovery only as a fallback
+            self.workflow.add_node("cached_schema", self.nodes.cached_schema)
+            self.workflow.add_edge(START, "cached_schema")
+            self.workflow.add_conditional_edges(
+                "cached_schema",
+                lambda state: "query_gen" if isinstance(state["messages"][-1], ToolMessage) else "list_tables_tool",
+            )
+        else:
+            self.workflow.add_node("first_tool_call", self.nodes.first_tool_call)
+            self.workflow.add_edge(START, "first_tool_call")
+            self.workflow.add_edge("first_tool_call", "list_tables_tool")
         self.workflow.add_edge("list_tables_tool", "model_get_schema")
         self.workflow.add_edge("model_get_schema", "get_schema_tool")
         self.workflow.add_edge("get_schema_tool", "query_gen")
@@ -240,7 +279,24 @@ class WorkflowBuilder:
     def compile(self):
         return self.workflow.compile()
 
-def create_workflow(llm_query_gen, llm_query_check, llm_answer, db_manager, tools):
-    """Factory function to create and compile the workflow."""
-    workflow_builder = WorkflowBuilder(llm_query_gen, llm_query_check, llm_answer, db_manager, tools)
-    return workflow_builder.compile()
\ No newline at end of file
+    def compile_replay(self):
+        """Graph that runs an already validated `sql_query` and answers from its result, with no retries."""
+        replay = StateGraph(State)
+        replay.add_node("execute_query", self.nodes.execute_query_wrapper)
+        replay.add_node("generate_answer", self.nodes.generate_answer_node)
+        replay.add_edge(START, "execute_query")
+        replay.add_edge("execute_query", "generate_answer")
+        replay.add_edge("generate_answer", END)
+        return replay.compile()
+
+def create_workflow(llm_query_gen, llm_query_check, llm_answer, db_manager, tools, schema_tables=(),
+                    question_cache=None):
+    """Factory function to create and compile the workflow.
+
+    With a question_cache, the workflow is wrapped in a CachedWorkflow that answers questions
+    similar to earlier ones by re-running their SQL.
+    """
+    workflow_builder = WorkflowBuilder(llm_query_gen, llm_query_check, llm_answer, db_manager, tools, schema_tables)
+    if question_cache is None:
+        return workflow_builder.compile()
+    return CachedWorkflow(workflow_builder.compile(), workflow_builder.compile_replay(), question_cache)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class WorkflowLease:
+    """A compiled workflow and how long it took to get it."""
+    workflow: Any
+    cold: bool
+    seconds: float
+
+class WorkflowRegistry:
+    """Process-wide compiled workflow, built on first use and shared by every session.
+
+    The workflow is only rebuilt after invalidate(), e.g. once the factory's inputs were changed
+    in place; settings are read once at import, so a changed .env needs a restart. Concurrent
+    callers wait for a single build instead of each building their own.
+    """
+
+    def __init__(self, factory: Callable[[], Any], clock: Callable[[], float] = time.perf_counter):
+        self.factory = factory
+        self.clock = clock
+        self.builds = 0
+        self.last_build_seconds: Optional[float] = None
+        self._workflow = None
+        self._lock = threading.Lock()
+
+    def lease(self) -> WorkflowLease:
+        started = self.clock()
+        with self._lock:
+            cold = self._workflow is None
+            if cold:
+                self._workflow = self.factory()
+                self.builds += 1
+            workflow = self._workflow
+        seconds = self.clock() - started
+        if cold:
+            self.last_build_seconds = seconds
+        logger.info(f"Workflow {'cold' if cold else 'warm'} start: {seconds * 1000:.1f} ms")
+        return WorkflowLease(workflow, cold, seconds)
+
+    def get(self) -> Any:
+        return self.lease().workflow
+
+    def invalidate(self):
+        """Drop the compiled workflow; the next get() builds a new one."""
+        with self._lock:
+            self._workflow = None